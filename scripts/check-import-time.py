@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: MIT
+"""
+Check the import cost of the windmill/f/terraform scripts against a budget
+
+Windmill jobs are short, so interpreter start-up and imports are a real share
+of their runtime. This script:
+1. Imports each script in a fresh interpreter with `python -X importtime`
+2. Fails if a script's cumulative import time exceeds its budget
+3. Fails if a script eagerly imports a heavy dependency (boto3, botocore,
+   requests, wmill, yaml) it should only load in the code path that uses it
+
+The eager-import check is deterministic; the time budget is a coarse guard
+against regressions, measured as the best of --runs attempts.
+
+Requirements: the script dependencies (boto3, requests, wmill, pyyaml)
+
+Usage:
+    ./check-import-time.py
+    ./check-import-time.py --budget-ms 150 --runs 5 terraform_plan terraform_apply
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+WINDMILL_DIR = REPO_ROOT / "windmill"
+SCRIPTS_DIR = WINDMILL_DIR / "f" / "terraform"
+
+DEFAULT_BUDGET_MS = 100
+# Scripts in EAGER_ALLOWED load their dependencies up front and get a larger budget
+DEFAULT_EAGER_BUDGET_MS = 300
+DEFAULT_RUNS = 3
+HEAVY_MODULES = ("boto3", "botocore", "requests", "wmill", "yaml")
+# Scripts whose every run needs these dependencies, so importing them eagerly costs nothing extra
+EAGER_ALLOWED = {
+    "deploy_modules": {"yaml"},
+    "detect_drift": {"botocore", "requests", "yaml"},
+    "gc_artifacts": {"botocore", "wmill"},
+    "notify_status": {"requests"},
+    "test_configuration": {"requests"},
+}
+
+
+class Colors:
+    """ANSI color codes for terminal output"""
+
+    RED = "\033[0;31m"
+    GREEN = "\033[0;32m"
+    YELLOW = "\033[1;33m"
+    BLUE = "\033[0;34m"
+    NC = "\033[0m"  # No Color
+
+
+def log_info(message: str) -> None:
+    """Log info message in green"""
+    print(f"{Colors.GREEN}[INFO]{Colors.NC} {message}")
+
+
+def log_warn(message: str) -> None:
+    """Log warning message in yellow"""
+    print(f"{Colors.YELLOW}[WARN]{Colors.NC} {message}")
+
+
+def log_error(message: str) -> None:
+    """Log error message in red"""
+    print(f"{Colors.RED}[ERROR]{Colors.NC} {message}")
+
+
+def log_step(message: str) -> None:
+    """Log step message in blue"""
+    print(f"{Colors.BLUE}[STEP]{Colors.NC} {message}")
+
+
+def measure(script: str) -> tuple[float, set[str]]:
+    """Import one script in a fresh interpreter
+
+    Returns:
+        Tuple of (cumulative import time of the script in ms, top-level packages imported)
+
+    Raises:
+        RuntimeError: If the import fails
+    """
+    module = f"f.terraform.{script}"
+    env = {**os.environ, "PYTHONPATH": str(WINDMILL_DIR)}
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], capture_output=True, text=True, env=env, cwd=WINDMILL_DIR)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    cumulative_us = 0
+    packages = set()
+    for line in result.stderr.splitlines():
+        # import time:  self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = (field.strip() for field in line.removeprefix("import time:").split("|"))
+        if not cumulative.isdigit():
+            continue  # Header line
+        packages.add(name.split(".")[0])
+        if name == module:
+            cumulative_us = int(cumulative)
+    return cumulative_us / 1000, packages
+
+
+def main() -> int:
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Check import time of the Windmill Terraform scripts against a budget")
+    parser.add_argument("scripts", nargs="*", help="Scripts to check (default: all in windmill/f/terraform)")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS, help=f"Cumulative import budget per script (default: {DEFAULT_BUDGET_MS})")
+    parser.add_argument("--eager-budget-ms", type=float, default=DEFAULT_EAGER_BUDGET_MS, help=f"Budget for scripts allowed eager dependencies (default: {DEFAULT_EAGER_BUDGET_MS})")
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS, help=f"Imports per script; the fastest counts (default: {DEFAULT_RUNS})")
+    args = parser.parse_args()
+
+    scripts = args.scripts or sorted(path.stem for path in SCRIPTS_DIR.glob("*.py"))
+    log_step(f"Measuring {len(scripts)} scripts (budget {args.budget_ms:.0f} ms, best of {args.runs})")
+
+    failed = 0
+    for script in scripts:
+        try:
+            runs = [measure(script) for _ in range(args.runs)]
+        except RuntimeError as e:
+            log_error(f"{script}: import failed: {e}")
+            failed += 1
+            continue
+
+        best_ms = min(ms for ms, _ in runs)
+        eager = (runs[0][1] & set(HEAVY_MODULES)) - EAGER_ALLOWED.get(script, set())
+        if eager:
+            log_error(f"{script}: imports {', '.join(sorted(eager))} at module level; import them where they are used")
+            failed += 1
+        budget_ms = args.eager_budget_ms if script in EAGER_ALLOWED else args.budget_ms
+        if best_ms > budget_ms:
+            log_error(f"{script}: {best_ms:.1f} ms exceeds the {budget_ms:.0f} ms budget")
+            failed += 1
+        elif not eager:
+            log_info(f"{script}: {best_ms:.1f} ms")
+
+    if failed:
+        log_warn(f"{failed} import budget violations")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -9,14 +9,43 @@ This script:
 3. Creates the infrastructure-developer policy
 4. Extracts secrets from .envrc and 1Password
 5. Creates secrets in Vault
-6. Verifies secret access
+6. Decrypts ansible-vault files and creates their secrets in Vault
+7. Verifies secret access
 """
 
 import os
+import re
 import subprocess
 import sys
 from pathlib import Path
 
+ANSIBLE_VAULT_HEADER = b"$ANSIBLE_VAULT;"
+VAULT_INFRASTRUCTURE_PATH = "secret/fzymgc-house/infrastructure"
+EXPORT_ASSIGNMENT_RE = re.compile(r"^([A-Za-z_][A-Za-z0-9_]*)=(.*)$", re.DOTALL)
+
+# Secrets to migrate: where each value is found and where it is written in Vault.
+# Sources: "envrc" (exported variable name in .envrc) and/or "onepassword" (item name).
+SECRET_SOURCES: dict[str, dict[str, str]] = {
+    "TPI_ALPHA_BMC": {
+        "description": "TPI Alpha BMC password",
+        "envrc": "TPI_ALPHA_BMC_ROOT_PW",
+        "path": f"{VAULT_INFRASTRUCTURE_PATH}/bmc/tpi-alpha",
+        "field": "password",
+    },
+    "TPI_BETA_BMC": {
+        "description": "TPI Beta BMC password",
+        "envrc": "TPI_BETA_BMC_ROOT_PW",
+        "path": f"{VAULT_INFRASTRUCTURE_PATH}/bmc/tpi-beta",
+        "field": "password",
+    },
+    "CLOUDFLARE_TOKEN": {
+        "description": "Cloudflare API token",
+        "onepassword": "cloudflare-api-token",
+        "path": f"{VAULT_INFRASTRUCTURE_PATH}/cloudflare/api-token",
+        "field": "token",
+    },
+}
+
 
 class Colors:
     """ANSI color codes for terminal output"""
@@ -145,57 +174,122 @@ def create_vault_policy(repo_root: Path) -> bool:
         return True  # Don't fail the entire script if policy already exists
 
 
+def parse_shell_exports(text: str) -> dict[str, str]:
+    """
+    Parse all `export NAME=value` assignments from shell source in one pass
+
+    Handles single/double quoting, backslash escapes and line continuations,
+    comments, `;`-separated statements and multiple assignments per export
+    (`export A=1 B=2`). Variable expansions are kept literally.
+
+    Returns:
+        Dict of exported variable name -> value (later exports win)
+    """
+    exports: dict[str, str] = {}
+    words: list[str] = []
+    word: list[str] = []
+    in_word = False
+    quote = ""
+    i = 0
+
+    def end_word() -> None:
+        nonlocal in_word
+        if in_word:
+            words.append("".join(word))
+            word.clear()
+            in_word = False
+
+    def end_statement() -> None:
+        end_word()
+        if words and words[0] == "export":
+            for assignment in words[1:]:
+                match = EXPORT_ASSIGNMENT_RE.match(assignment)
+                if match:
+                    exports[match.group(1)] = match.group(2)
+        words.clear()
+
+    while i < len(text):
+        char = text[i]
+        i += 1
+        if quote == "'":
+            if char == "'":
+                quote = ""
+            else:
+                word.append(char)
+        elif quote == '"':
+            if char == "\\" and i < len(text) and text[i] in '$`"\\\n':
+                if text[i] != "\n":
+                    word.append(text[i])
+                i += 1
+            elif char == '"':
+                quote = ""
+            else:
+                word.append(char)
+        elif char in "'\"":
+            quote = char
+            in_word = True
+        elif char == "\\":
+            if i < len(text) and text[i] != "\n":
+                word.append(text[i])
+                in_word = True
+            i += 1
+        elif char in " \t\r":
+            end_word()
+        elif char in "\n;":
+            end_statement()
+        elif char == "#" and not in_word:
+            newline = text.find("\n", i)
+            i = len(text) if newline == -1 else newline
+        else:
+            word.append(char)
+            in_word = True
+
+    end_statement()
+    return exports
+
+
 def extract_secrets(repo_root: Path) -> dict[str, str | None]:
     """Extract secrets from .envrc and 1Password"""
     log_step("Extracting secrets from current sources...")
 
-    secrets = {
-        "TPI_ALPHA_BMC": None,
-        "TPI_BETA_BMC": None,
-        "CLOUDFLARE_TOKEN": None,
-    }
+    secrets: dict[str, str | None] = dict.fromkeys(SECRET_SOURCES)
 
     # Extract from .envrc (if it still has secrets - may already be migrated)
     envrc_file = repo_root / ".envrc"
     if envrc_file.exists():
-        # Parse .envrc for environment variables
         try:
-            with open(envrc_file) as f:
-                for line in f:
-                    line = line.strip()
-                    if line.startswith("export TPI_ALPHA_BMC_ROOT_PW="):
-                        value = line.split("=", 1)[1].strip('"').strip("'")
-                        if value:
-                            secrets["TPI_ALPHA_BMC"] = value
-                            log_info("✓ Found TPI Alpha BMC password in .envrc")
-                    elif line.startswith("export TPI_BETA_BMC_ROOT_PW="):
-                        value = line.split("=", 1)[1].strip('"').strip("'")
-                        if value:
-                            secrets["TPI_BETA_BMC"] = value
-                            log_info("✓ Found TPI Beta BMC password in .envrc")
+            exports = parse_shell_exports(envrc_file.read_text())
         except Exception as e:
             log_warn(f"Failed to parse .envrc: {e}")
+            exports = {}
+
+        for name, source in SECRET_SOURCES.items():
+            if "envrc" not in source:
+                continue
+            value = exports.get(source["envrc"])
+            if value:
+                secrets[name] = value
+                log_info(f"✓ Found {source['description']} in .envrc")
+            else:
+                log_warn(f"{source['description']} not found in .envrc (may already be migrated)")
     else:
         log_warn(".envrc not found")
 
-    # Check if we got values from .envrc
-    if not secrets["TPI_ALPHA_BMC"]:
-        log_warn("TPI Alpha BMC password not found in .envrc (may already be migrated)")
-    if not secrets["TPI_BETA_BMC"]:
-        log_warn("TPI Beta BMC password not found in .envrc (may already be migrated)")
-
     # Extract from 1Password (only if op command is available)
     exit_code, _, _ = run_command(["op", "--version"])
     if exit_code == 0:
         log_info("Extracting secrets from 1Password...")
 
-        exit_code, stdout, _ = run_command(["op", "item", "get", "--vault", "fzymgc-house", "cloudflare-api-token", "--fields", "password", "--reveal"])
+        for name, source in SECRET_SOURCES.items():
+            if "onepassword" not in source:
+                continue
+            exit_code, stdout, _ = run_command(["op", "item", "get", "--vault", "fzymgc-house", source["onepassword"], "--fields", "password", "--reveal"])
 
-        if exit_code == 0 and stdout.strip():
-            secrets["CLOUDFLARE_TOKEN"] = stdout.strip()
-            log_info("✓ Found Cloudflare API token in 1Password")
-        else:
-            log_warn("Cloudflare API token not found in 1Password")
+            if exit_code == 0 and stdout.strip():
+                secrets[name] = stdout.strip()
+                log_info(f"✓ Found {source['description']} in 1Password")
+            else:
+                log_warn(f"{source['description']} not found in 1Password")
     else:
         log_warn("1Password CLI not available, skipping 1Password extraction")
 
@@ -215,43 +309,20 @@ def create_vault_secrets(secrets: dict[str, str | None]) -> list[str]:
     created = 0
     skipped = 0
 
-    # Create BMC secrets
-    if secrets["TPI_ALPHA_BMC"]:
-        log_info("Creating secret/fzymgc-house/infrastructure/bmc/tpi-alpha...")
-        exit_code, _, stderr = run_command(["vault", "kv", "put", "secret/fzymgc-house/infrastructure/bmc/tpi-alpha", f"password={secrets['TPI_ALPHA_BMC']}"])
-        if exit_code == 0:
-            created_secrets.append("secret/fzymgc-house/infrastructure/bmc/tpi-alpha")
-            created += 1
-        else:
-            log_error(f"Failed to create TPI Alpha BMC secret: {stderr}")
-    else:
-        log_warn("Skipping TPI Alpha BMC (no value)")
-        skipped += 1
+    for name, source in SECRET_SOURCES.items():
+        value = secrets.get(name)
+        if not value:
+            log_warn(f"Skipping {source['description']} (no value)")
+            skipped += 1
+            continue
 
-    if secrets["TPI_BETA_BMC"]:
-        log_info("Creating secret/fzymgc-house/infrastructure/bmc/tpi-beta...")
-        exit_code, _, stderr = run_command(["vault", "kv", "put", "secret/fzymgc-house/infrastructure/bmc/tpi-beta", f"password={secrets['TPI_BETA_BMC']}"])
+        log_info(f"Creating {source['path']}...")
+        exit_code, _, stderr = run_command(["vault", "kv", "put", source["path"], f"{source['field']}={value}"])
         if exit_code == 0:
-            created_secrets.append("secret/fzymgc-house/infrastructure/bmc/tpi-beta")
+            created_secrets.append(source["path"])
             created += 1
         else:
-            log_error(f"Failed to create TPI Beta BMC secret: {stderr}")
-    else:
-        log_warn("Skipping TPI Beta BMC (no value)")
-        skipped += 1
-
-    # Create Cloudflare secret
-    if secrets["CLOUDFLARE_TOKEN"]:
-        log_info("Creating secret/fzymgc-house/infrastructure/cloudflare/api-token...")
-        exit_code, _, stderr = run_command(["vault", "kv", "put", "secret/fzymgc-house/infrastructure/cloudflare/api-token", f"token={secrets['CLOUDFLARE_TOKEN']}"])
-        if exit_code == 0:
-            created_secrets.append("secret/fzymgc-house/infrastructure/cloudflare/api-token")
-            created += 1
-        else:
-            log_error(f"Failed to create Cloudflare secret: {stderr}")
-    else:
-        log_warn("Skipping Cloudflare API token (no value)")
-        skipped += 1
+            log_error(f"Failed to create {source['description']} secret: {stderr}")
 
     log_info(f"✓ Created {created} secrets, skipped {skipped}")
     print()
@@ -290,22 +361,140 @@ def verify_secrets(created_secrets: list[str]) -> bool:
         return False
 
 
-def handle_ansible_vault(repo_root: Path) -> None:
-    """Handle ansible-vault encrypted files"""
+def find_ansible_vault_files(repo_root: Path) -> list[Path]:
+    """Find ansible-vault encrypted YAML files under ansible/"""
+    vault_files = []
+    for path in sorted((repo_root / "ansible").rglob("*")):
+        if path.suffix not in (".yml", ".yaml") or not path.is_file():
+            continue
+        try:
+            with open(path, "rb") as f:
+                header = f.read(len(ANSIBLE_VAULT_HEADER))
+        except OSError:
+            continue
+        if header == ANSIBLE_VAULT_HEADER:
+            vault_files.append(path)
+    return vault_files
+
+
+def load_ansible_vault_secrets() -> list:
+    """
+    Load ansible-vault password secrets for in-process decryption
+
+    Uses ANSIBLE_VAULT_PASSWORD_FILE, the same variable ansible-vault reads.
+    Executable password files are run as scripts, matching ansible-vault.
+
+    Returns:
+        List of (vault_id, VaultSecret) tuples, empty if no password is configured
+    """
+    from ansible.parsing.dataloader import DataLoader
+    from ansible.parsing.vault import get_file_vault_secret
+
+    password_file = os.environ.get("ANSIBLE_VAULT_PASSWORD_FILE")
+    if not password_file:
+        return []
+
+    secret = get_file_vault_secret(filename=os.path.expanduser(password_file), loader=DataLoader())
+    secret.load()
+    return [("default", secret)]
+
+
+def flatten_yaml(data: object, prefix: str = "") -> dict[str, str]:
+    """
+    Flatten nested YAML data into slash-separated key paths
+
+    Example: {"db": {"user": "a"}, "token": "b"} -> {"db/user": "a", "token": "b"}
+    """
+    if isinstance(data, dict):
+        items = data.items()
+    elif isinstance(data, list):
+        items = enumerate(data)
+    else:
+        return {prefix: str(data)} if prefix and data is not None else {}
+
+    flattened = {}
+    for key, value in items:
+        flattened.update(flatten_yaml(value, f"{prefix}/{key}" if prefix else str(key)))
+    return flattened
+
+
+def ansible_vault_secret_paths(repo_root: Path, vault_file: Path, key_paths: dict[str, str]) -> dict[str, dict[str, str]]:
+    """
+    Map flattened key paths from an ansible-vault file to Vault secret paths
+
+    Role vars (ansible/roles/<role>/vars/*.yml) map to infrastructure/<role>,
+    other files to infrastructure/<relative path without suffix>. The last
+    key path segment becomes the field name, the rest extend the secret path.
+
+    Returns:
+        Dict of Vault secret path -> {field: value}
+    """
+    relative = vault_file.relative_to(repo_root / "ansible")
+    if len(relative.parts) >= 3 and relative.parts[0] == "roles":
+        base = relative.parts[1]
+    else:
+        base = str(relative.with_suffix(""))
+
+    secret_paths: dict[str, dict[str, str]] = {}
+    for key_path, value in key_paths.items():
+        parent, _, field = key_path.rpartition("/")
+        path = f"{VAULT_INFRASTRUCTURE_PATH}/{base}/{parent}" if parent else f"{VAULT_INFRASTRUCTURE_PATH}/{base}"
+        secret_paths.setdefault(path, {})[field] = value
+    return secret_paths
+
+
+def handle_ansible_vault(repo_root: Path) -> list[str]:
+    """
+    Decrypt ansible-vault encrypted files and create their secrets in Vault
+
+    Returns:
+        List of secret paths that were successfully created
+    """
     log_step("Handling ansible-vault encrypted files...")
 
-    ansible_vault_file = repo_root / "ansible" / "roles" / "k3sup" / "vars" / "main.yml"
-    if ansible_vault_file.exists():
-        print()
-        log_warn(f"Found ansible-vault encrypted file: {ansible_vault_file}")
-        print()
-        print("To decrypt and view contents, run:")
-        print("  cd ansible && ansible-vault view roles/k3sup/vars/main.yml")
-        print()
-        print("After viewing, manually create secrets in Vault with:")
-        print("  vault kv put secret/fzymgc-house/infrastructure/k3sup/<name> <key>=<value>")
-        print()
-        input("Press Enter to continue...")
+    vault_files = find_ansible_vault_files(repo_root)
+    if not vault_files:
+        log_info("No ansible-vault encrypted files found")
+        return []
+
+    try:
+        import yaml
+        from ansible.parsing.vault import AnsibleVaultError, VaultLib
+
+        vault_secrets = load_ansible_vault_secrets()
+    except ImportError as e:
+        log_error(f"Ansible Python libraries not available: {e}")
+        return []
+    except Exception as e:
+        log_error(f"Failed to load ansible-vault password: {e}")
+        return []
+
+    if not vault_secrets:
+        log_warn("ANSIBLE_VAULT_PASSWORD_FILE not set, skipping ansible-vault decryption")
+        return []
+
+    vault = VaultLib(secrets=vault_secrets)
+    created_secrets = []
+
+    for vault_file in vault_files:
+        log_info(f"Decrypting {vault_file.relative_to(repo_root)}...")
+        try:
+            data = yaml.safe_load(vault.decrypt(vault_file.read_bytes(), filename=str(vault_file)))
+        except (AnsibleVaultError, yaml.YAMLError, OSError) as e:
+            log_error(f"Failed to decrypt {vault_file}: {e}")
+            continue
+
+        secret_paths = ansible_vault_secret_paths(repo_root, vault_file, flatten_yaml(data))
+        for path, fields in secret_paths.items():
+            log_info(f"Creating {path}...")
+            exit_code, _, stderr = run_command(["vault", "kv", "put", path] + [f"{field}={value}" for field, value in fields.items()])
+            if exit_code == 0:
+                created_secrets.append(path)
+            else:
+                log_error(f"Failed to create {path}: {stderr}")
+
+    log_info(f"✓ Created {len(created_secrets)} secrets from {len(vault_files)} ansible-vault files")
+    return created_secrets
 
 
 def main() -> int:
@@ -333,12 +522,11 @@ def main() -> int:
 
     secrets = extract_secrets(repo_root)
     created_secrets = create_vault_secrets(secrets)
+    created_secrets += handle_ansible_vault(repo_root)
 
     if not verify_secrets(created_secrets):
         return 1
 
-    handle_ansible_vault(repo_root)
-
     # Print summary
     print()
     log_info("==========================================")
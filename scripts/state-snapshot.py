@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: MIT
+"""
+Archive, list and restore Terraform state snapshots in the artifacts S3 bucket
+
+terraform_apply archives every serial of an S3-backend module after a
+successful apply (see docs/windmill.md). This script:
+1. Lists the archived serials of a module
+2. Archives the current state of modules by hand (e.g. to backfill before a risky change)
+3. Restores any archived serial to a local file, verified against its SHA-256
+
+Restoring only writes a file; push it back deliberately with
+`terraform state push -force` from an initialized module (the serial is older
+than the current state).
+
+Requirements: boto3
+
+Usage:
+    ./state-snapshot.py list tf/cluster-bootstrap
+    ./state-snapshot.py snapshot tf/cluster-bootstrap tf/vault
+    ./state-snapshot.py restore tf/cluster-bootstrap 42 -o terraform.tfstate
+"""
+
+import argparse
+import os
+import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT / "windmill"))
+
+from f.terraform.s3_artifacts import create_s3_client, s3_errors  # noqa: E402
+from f.terraform.state_snapshots import list_snapshots, restore_state, snapshot_state  # noqa: E402
+from f.terraform.state_summary import state_key  # noqa: E402
+
+
+class Colors:
+    """ANSI color codes for terminal output"""
+
+    RED = "\033[0;31m"
+    GREEN = "\033[0;32m"
+    YELLOW = "\033[1;33m"
+    BLUE = "\033[0;34m"
+    NC = "\033[0m"  # No Color
+
+
+def log_info(message: str) -> None:
+    """Log info message in green"""
+    print(f"{Colors.GREEN}[INFO]{Colors.NC} {message}")
+
+
+def log_warn(message: str) -> None:
+    """Log warning message in yellow"""
+    print(f"{Colors.YELLOW}[WARN]{Colors.NC} {message}")
+
+
+def log_error(message: str) -> None:
+    """Log error message in red"""
+    print(f"{Colors.RED}[ERROR]{Colors.NC} {message}")
+
+
+def log_step(message: str) -> None:
+    """Log step message in blue"""
+    print(f"{Colors.BLUE}[STEP]{Colors.NC} {message}")
+
+
+def snapshot_modules(client, bucket: str, state_bucket: str, state_prefix: str, modules: list[str]) -> int:
+    """Archive the current state of each module; return the number of failures"""
+    failed = 0
+    for module in modules:
+        key = state_key(module, state_prefix)
+        try:
+            state = client.get_object(Bucket=state_bucket, Key=key)["Body"].read()
+            result = snapshot_state(client, bucket, module, state)
+        except (*s3_errors(), RuntimeError) as e:
+            log_error(f"{module}: {e}")
+            failed += 1
+            continue
+        if result["skipped"]:
+            log_info(f"{module}: serial {result['serial']} already archived")
+        else:
+            log_info(f"{module}: serial {result['serial']} archived, {result['new_chunks']}/{result['chunks']} chunks new ({result['new_bytes']} bytes)")
+    return failed
+
+
+def main() -> int:
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Archive, list and restore Terraform state snapshots")
+    parser.add_argument("--endpoint", default=os.environ.get("AWS_ENDPOINT_URL"), help="S3 endpoint URL (default: $AWS_ENDPOINT_URL)")
+    parser.add_argument("--bucket", default=os.environ.get("TF_ARTIFACTS_BUCKET"), help="Artifacts bucket holding the snapshots (default: $TF_ARTIFACTS_BUCKET)")
+    parser.add_argument("--region", default=os.environ.get("AWS_REGION", "us-east-1"))
+    subcommands = parser.add_subparsers(dest="command", required=True)
+
+    list_parser = subcommands.add_parser("list", help="List archived serials of a module")
+    list_parser.add_argument("module", help="Terraform module path (e.g., tf/vault)")
+
+    snapshot_parser = subcommands.add_parser("snapshot", help="Archive the current state of modules")
+    snapshot_parser.add_argument("modules", nargs="+", help="Terraform module paths")
+    snapshot_parser.add_argument("--state-bucket", help="Bucket holding the state (default: --bucket)")
+    snapshot_parser.add_argument("--state-prefix", default="", help="State key prefix (the g/all/s3_bucket_prefix variable)")
+
+    restore_parser = subcommands.add_parser("restore", help="Write an archived serial to a file")
+    restore_parser.add_argument("module", help="Terraform module path (e.g., tf/vault)")
+    restore_parser.add_argument("serial", type=int, help="State serial to restore")
+    restore_parser.add_argument("--lineage", default="", help="State lineage (default: lineage of the latest snapshot)")
+    restore_parser.add_argument("-o", "--output", required=True, help="File to write the state to")
+    args = parser.parse_args()
+
+    if not args.endpoint or not args.bucket:
+        log_error("--endpoint and --bucket are required (or set AWS_ENDPOINT_URL and TF_ARTIFACTS_BUCKET)")
+        return 1
+
+    client = create_s3_client(
+        {
+            "bucket": args.bucket,
+            "region": args.region,
+            "endPoint": args.endpoint,
+            "accessKey": os.environ.get("AWS_ACCESS_KEY_ID", ""),
+            "secretKey": os.environ.get("AWS_SECRET_ACCESS_KEY", ""),
+            "useSSL": args.endpoint.startswith("https"),
+            "pathStyle": True,
+        }
+    )
+
+    try:
+        if args.command == "list":
+            snapshots = list_snapshots(client, args.bucket, args.module)
+            if not snapshots:
+                log_warn(f"No snapshots for {args.module}")
+            for snapshot in snapshots:
+                print(f"{snapshot['lineage']}  {snapshot['serial']:>8}  {snapshot['last_modified']}")
+            return 0
+
+        if args.command == "snapshot":
+            log_step(f"Archiving {len(args.modules)} modules")
+            failed = snapshot_modules(client, args.bucket, args.state_bucket or args.bucket, args.state_prefix, args.modules)
+            return 1 if failed else 0
+
+        log_step(f"Restoring serial {args.serial} of {args.module}")
+        state = restore_state(client, args.bucket, args.module, args.serial, args.lineage)
+        Path(args.output).write_bytes(state)
+        log_info(f"Wrote {len(state)} bytes to {args.output} (verified); push it with: terraform state push -force {args.output}")
+        return 0
+    except RuntimeError as e:
+        log_error(str(e))
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: MIT
+"""
+Sync the Terraform provider network mirror in the artifacts S3 bucket
+
+This script:
+1. Collects provider versions from every tf/*/.terraform.lock.hcl
+2. Downloads missing provider archives from their origin registry (SHA-256 verified)
+3. Uploads archives plus index.json/<version>.json in network mirror layout
+4. Optionally prunes versions no lock file references any more
+5. With --terraform, mirrors the newest Terraform release matching each module's
+   required_version in releases.hashicorp.com layout
+
+Workers point terraform init at the mirror by setting TF_PROVIDER_MIRROR_URL
+and fetch Terraform binaries from it by setting TF_RELEASES_MIRROR_URL (see
+docs/windmill.md). Terraform requires the mirror to be served over HTTPS and
+readable without credentials.
+
+Requirements: boto3
+
+Usage:
+    ./sync-provider-mirror.py --endpoint https://minio.fzymgc.house --bucket terraform-artifacts
+    ./sync-provider-mirror.py --platforms linux_amd64 --prune --dry-run
+    ./sync-provider-mirror.py --terraform
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT / "windmill"))
+
+from f.terraform.provider_mirror import MIRROR_PREFIX, lock_files, parse_lock_file  # noqa: E402
+from f.terraform.s3_artifacts import create_s3_client  # noqa: E402
+from f.terraform.terraform_versions import DEFAULT_RELEASES_URL, RELEASES_PREFIX, newest_matching, required_version  # noqa: E402
+
+DEFAULT_PLATFORMS = "linux_amd64,linux_arm64"
+HTTP_TIMEOUT = 60  # seconds
+
+
+class Colors:
+    """ANSI color codes for terminal output"""
+
+    RED = "\033[0;31m"
+    GREEN = "\033[0;32m"
+    YELLOW = "\033[1;33m"
+    BLUE = "\033[0;34m"
+    NC = "\033[0m"  # No Color
+
+
+def log_info(message: str) -> None:
+    """Log info message in green"""
+    print(f"{Colors.GREEN}[INFO]{Colors.NC} {message}")
+
+
+def log_warn(message: str) -> None:
+    """Log warning message in yellow"""
+    print(f"{Colors.YELLOW}[WARN]{Colors.NC} {message}")
+
+
+def log_error(message: str) -> None:
+    """Log error message in red"""
+    print(f"{Colors.RED}[ERROR]{Colors.NC} {message}")
+
+
+def log_step(message: str) -> None:
+    """Log step message in blue"""
+    print(f"{Colors.BLUE}[STEP]{Colors.NC} {message}")
+
+
+def fetch_json(url: str) -> dict:
+    """GET a JSON document"""
+    with urllib.request.urlopen(url, timeout=HTTP_TIMEOUT) as response:
+        return json.load(response)
+
+
+def providers_api(hostname: str, cache: dict[str, str]) -> str:
+    """Resolve a registry's providers.v1 base URL via service discovery"""
+    if hostname not in cache:
+        services = fetch_json(f"https://{hostname}/.well-known/terraform.json")
+        cache[hostname] = f"https://{hostname}{services['providers.v1']}".rstrip("/")
+    return cache[hostname]
+
+
+def collect_providers(repo_root: Path) -> dict[str, set[str]]:
+    """Return {provider address: versions} across all lock files"""
+    providers: dict[str, set[str]] = {}
+    for lock_file in lock_files(str(repo_root)):
+        for address, version in parse_lock_file(lock_file.read_text()).items():
+            providers.setdefault(address, set()).add(version)
+    return providers
+
+
+def read_json(client, bucket: str, key: str, default: dict) -> dict:
+    """Read a JSON object from S3, or return default if it does not exist"""
+    try:
+        return json.loads(client.get_object(Bucket=bucket, Key=key)["Body"].read())
+    except client.exceptions.NoSuchKey:
+        return default
+
+
+def write_json(client, bucket: str, key: str, data: dict) -> None:
+    """Write a JSON object to S3"""
+    client.put_object(Bucket=bucket, Key=key, Body=json.dumps(data, indent=2).encode(), ContentType="application/json")
+
+
+def mirror_archive(client, bucket: str, prefix: str, download: dict) -> dict:
+    """Download one provider archive, verify its SHA-256 and upload it; return its mirror entry"""
+    with tempfile.NamedTemporaryFile(suffix=".zip") as archive:
+        digest = hashlib.sha256()
+        with urllib.request.urlopen(download["download_url"], timeout=HTTP_TIMEOUT) as response:
+            while chunk := response.read(1024 * 1024):
+                digest.update(chunk)
+                archive.write(chunk)
+        archive.flush()
+        if digest.hexdigest() != download["shasum"]:
+            msg = f"SHA-256 mismatch for {download['filename']}: expected {download['shasum']}, got {digest.hexdigest()}"
+            raise RuntimeError(msg)
+        client.upload_file(archive.name, bucket, f"{prefix}{download['filename']}", ExtraArgs={"ContentType": "application/zip"})
+    return {"url": download["filename"], "hashes": [f"zh:{download['shasum']}"]}
+
+
+def sync_provider(client, bucket: str, address: str, versions: set[str], platforms: list[str], prune: bool, dry_run: bool, api_cache: dict[str, str]) -> int:
+    """Mirror every platform of the given versions of one provider; return archives uploaded"""
+    hostname, namespace, provider_type = address.split("/")
+    prefix = f"{MIRROR_PREFIX}{hostname}/{namespace}/{provider_type}/"
+    index = read_json(client, bucket, f"{prefix}index.json", {"versions": {}})
+    uploaded = 0
+
+    for version in sorted(versions):
+        version_key = f"{prefix}{version}.json"
+        version_doc = read_json(client, bucket, version_key, {"archives": {}})
+        missing = [platform for platform in platforms if platform not in version_doc["archives"]]
+        for platform in missing:
+            os_name, arch = platform.split("_", 1)
+            if dry_run:
+                log_info(f"Would mirror {address} {version} {platform}")
+                continue
+            try:
+                download = fetch_json(f"{providers_api(hostname, api_cache)}/{namespace}/{provider_type}/{version}/download/{os_name}/{arch}")
+            except urllib.error.HTTPError as e:
+                log_warn(f"{address} {version} has no {platform} build ({e.code}), skipping")
+                continue
+            version_doc["archives"][platform] = mirror_archive(client, bucket, prefix, download)
+            uploaded += 1
+            log_info(f"Mirrored {address} {version} {platform}")
+
+        if not dry_run and missing:
+            write_json(client, bucket, version_key, version_doc)
+        index["versions"][version] = {}
+
+    if prune:
+        for version in sorted(set(index["versions"]) - versions):
+            log_info(f"{'Would prune' if dry_run else 'Pruning'} {address} {version}")
+            if dry_run:
+                continue
+            version_doc = read_json(client, bucket, f"{prefix}{version}.json", {"archives": {}})
+            keys = [f"{prefix}{entry['url']}" for entry in version_doc["archives"].values()] + [f"{prefix}{version}.json"]
+            client.delete_objects(Bucket=bucket, Delete={"Objects": [{"Key": key} for key in keys], "Quiet": True})
+            del index["versions"][version]
+
+    if not dry_run:
+        # Index last: versions only become visible once their archives exist
+        write_json(client, bucket, f"{prefix}index.json", index)
+    return uploaded
+
+
+def sync_terraform(client, bucket: str, platforms: list[str], dry_run: bool) -> int:
+    """Mirror the newest Terraform release matching each module's required_version; return archives uploaded"""
+    constraints = {required_version(str(module_dir)) for module_dir in sorted(REPO_ROOT.glob("tf/*")) if module_dir.is_dir()}
+    upstream = fetch_json(f"{DEFAULT_RELEASES_URL}/index.json")["versions"]
+    index = read_json(client, bucket, f"{RELEASES_PREFIX}index.json", {"name": "terraform", "versions": {}})
+    uploaded = 0
+
+    for constraint in sorted(constraints):
+        version = newest_matching(upstream, constraint)
+        if not version:
+            log_warn(f"No Terraform release matches {constraint!r}, skipping")
+            continue
+        if version in index["versions"]:
+            log_info(f"Terraform {version} ({constraint or 'unconstrained'}) already mirrored")
+            continue
+        if dry_run:
+            log_info(f"Would mirror Terraform {version} ({constraint or 'unconstrained'})")
+            continue
+
+        prefix = f"{RELEASES_PREFIX}{version}/"
+        shasums = upstream[version]["shasums"]
+        with urllib.request.urlopen(f"{DEFAULT_RELEASES_URL}/{version}/{shasums}", timeout=HTTP_TIMEOUT) as response:
+            sums = response.read()
+        expected = {name: digest for digest, name in (line.split() for line in sums.decode().splitlines() if line.strip())}
+        for platform in platforms:
+            filename = f"terraform_{version}_{platform}.zip"
+            if filename not in expected:
+                log_warn(f"Terraform {version} has no {platform} build, skipping")
+                continue
+            mirror_archive(client, bucket, prefix, {"download_url": f"{DEFAULT_RELEASES_URL}/{version}/{filename}", "filename": filename, "shasum": expected[filename]})
+            uploaded += 1
+            log_info(f"Mirrored Terraform {version} {platform}")
+        client.put_object(Bucket=bucket, Key=f"{prefix}{shasums}", Body=sums, ContentType="text/plain")
+        index["versions"][version] = {"name": "terraform", "version": version, "shasums": shasums}
+
+    if not dry_run:
+        # Index last: versions only become visible once their archives exist
+        write_json(client, bucket, f"{RELEASES_PREFIX}index.json", index)
+    return uploaded
+
+
+def main() -> int:
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Sync the Terraform provider network mirror in S3 from the tf/ lock files")
+    parser.add_argument("--endpoint", default=os.environ.get("AWS_ENDPOINT_URL"), help="S3 endpoint URL (default: $AWS_ENDPOINT_URL)")
+    parser.add_argument("--bucket", default=os.environ.get("TF_ARTIFACTS_BUCKET"), help="Bucket (default: $TF_ARTIFACTS_BUCKET)")
+    parser.add_argument("--region", default=os.environ.get("AWS_REGION", "us-east-1"))
+    parser.add_argument("--platforms", default=DEFAULT_PLATFORMS, help=f"Comma-separated os_arch list (default: {DEFAULT_PLATFORMS})")
+    parser.add_argument("--jobs", type=int, default=4, help="Providers synced in parallel (default: 4)")
+    parser.add_argument("--prune", action="store_true", help="Remove versions no lock file references")
+    parser.add_argument("--terraform", action="store_true", help="Also mirror Terraform releases matching each module's required_version")
+    parser.add_argument("--dry-run", action="store_true", help="Show what would change without uploading")
+    args = parser.parse_args()
+
+    if not args.endpoint or not args.bucket:
+        log_error("--endpoint and --bucket are required (or set AWS_ENDPOINT_URL and TF_ARTIFACTS_BUCKET)")
+        return 1
+
+    client = create_s3_client(
+        {
+            "bucket": args.bucket,
+            "region": args.region,
+            "endPoint": args.endpoint,
+            "accessKey": os.environ.get("AWS_ACCESS_KEY_ID", ""),
+            "secretKey": os.environ.get("AWS_SECRET_ACCESS_KEY", ""),
+            "useSSL": args.endpoint.startswith("https"),
+            "pathStyle": True,
+        }
+    )
+    platforms = [platform for platform in args.platforms.split(",") if platform]
+
+    log_step("Collecting providers from lock files")
+    providers = collect_providers(REPO_ROOT)
+    for address, versions in sorted(providers.items()):
+        log_info(f"{address}: {', '.join(sorted(versions))}")
+
+    log_step(f"Syncing {len(providers)} providers for {', '.join(platforms)}")
+    api_cache: dict[str, str] = {}
+    failed = 0
+    with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+        futures = {address: pool.submit(sync_provider, client, args.bucket, address, versions, platforms, args.prune, args.dry_run, api_cache) for address, versions in providers.items()}
+        uploaded = 0
+        for address, future in futures.items():
+            try:
+                uploaded += future.result()
+            except Exception as e:  # noqa: BLE001 - report every provider, fail at the end
+                log_error(f"{address}: {e}")
+                failed += 1
+
+    log_info(f"Uploaded {uploaded} archives to s3://{args.bucket}/{MIRROR_PREFIX}")
+
+    if args.terraform:
+        log_step("Syncing Terraform releases")
+        try:
+            released = sync_terraform(client, args.bucket, platforms, args.dry_run)
+            log_info(f"Uploaded {released} archives to s3://{args.bucket}/{RELEASES_PREFIX}")
+        except Exception as e:  # noqa: BLE001 - provider results are already reported
+            log_error(f"Terraform releases: {e}")
+            failed += 1
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
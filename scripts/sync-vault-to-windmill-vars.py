@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: MIT
+"""
+Sync secrets from Vault to Windmill workspace variables
+
+This script:
+1. Reads each Vault secret once through a single hvac client
+2. Lists the workspace's g/all/ variables with one Windmill API call
+3. Diffs them in memory (secret values cannot be read back, so secrets are always updated)
+4. Creates/updates only what changed, concurrently over one pooled HTTP session
+
+Requirements: hvac, requests
+
+Usage:
+    ./sync-vault-to-windmill-vars.py --workspace staging
+    ./sync-vault-to-windmill-vars.py --workspace prod --dry-run
+"""
+
+import argparse
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import hvac
+import requests
+from requests.adapters import HTTPAdapter
+
+WINDMILL_URL = "https://windmill.fzymgc.house"
+WORKSPACES = {"staging": "terraform-gitops-staging", "prod": "terraform-gitops-prod"}
+VARIABLE_PREFIX = "g/all/"  # Global variables accessible from all folders
+HTTP_TIMEOUT = 30  # seconds
+
+VAULT_MOUNT = "secret"
+WINDMILL_SECRET = "fzymgc-house/cluster/windmill"
+GITHUB_SECRET = "fzymgc-house/cluster/github"
+# Single token works for all workspaces - tokens are per-user
+WINDMILL_TOKEN_FIELD = "windmill_gitops_token"
+
+# Windmill variable name -> Vault source. Empty values are skipped unless a default is set.
+VARIABLES: dict[str, dict] = {
+    "discord_bot_token": {"secret": WINDMILL_SECRET, "field": "discord_bot_token", "is_secret": True, "description": "Discord bot token from Vault"},
+    "discord_application_id": {"secret": WINDMILL_SECRET, "field": "discord_application_id", "is_secret": False, "description": "Discord application ID"},
+    "discord_public_key": {"secret": WINDMILL_SECRET, "field": "discord_public_key", "is_secret": True, "description": "Discord public key for signature verification"},
+    "discord_channel_id": {"secret": WINDMILL_SECRET, "field": "discord_channel_id", "is_secret": False, "description": "Discord channel ID for notifications"},
+    "s3_access_key": {"secret": WINDMILL_SECRET, "field": "s3_access_key", "is_secret": True, "description": "S3 access key"},
+    "s3_secret_key": {"secret": WINDMILL_SECRET, "field": "s3_secret_key", "is_secret": True, "description": "S3 secret key"},
+    "s3_bucket": {"secret": WINDMILL_SECRET, "field": "s3_bucket", "is_secret": False, "description": "S3 bucket name"},
+    "s3_bucket_prefix": {
+        "secret": WINDMILL_SECRET,
+        "field": "s3_bucket_prefix",
+        "is_secret": False,
+        "description": "S3 bucket prefix for shared bucket organization",
+        "default": "windmill/terraform-gitops",
+    },
+    "s3_endpoint": {"secret": WINDMILL_SECRET, "field": "s3_endpoint", "is_secret": False, "description": "S3 endpoint URL"},
+    "github_token": {"secret": GITHUB_SECRET, "field": "windmill_actions_runner_token", "is_secret": True, "description": "GitHub token for repo access"},
+    "vault_terraform_token": {"secret": WINDMILL_SECRET, "field": "vault_terraform_token", "is_secret": True, "description": "Vault token for Terraform operations"},
+    "tfc_token": {"secret": WINDMILL_SECRET, "field": "tfc_token", "is_secret": True, "description": "Terraform Cloud API token for HCP Terraform"},
+}
+
+
+class Colors:
+    """ANSI color codes for terminal output"""
+
+    RED = "\033[0;31m"
+    GREEN = "\033[0;32m"
+    YELLOW = "\033[1;33m"
+    BLUE = "\033[0;34m"
+    NC = "\033[0m"  # No Color
+
+
+def log_info(message: str) -> None:
+    """Log info message in green"""
+    print(f"{Colors.GREEN}[INFO]{Colors.NC} {message}")
+
+
+def log_warn(message: str) -> None:
+    """Log warning message in yellow"""
+    print(f"{Colors.YELLOW}[WARN]{Colors.NC} {message}")
+
+
+def log_error(message: str) -> None:
+    """Log error message in red"""
+    print(f"{Colors.RED}[ERROR]{Colors.NC} {message}")
+
+
+def log_step(message: str) -> None:
+    """Log step message in blue"""
+    print(f"{Colors.BLUE}[STEP]{Colors.NC} {message}")
+
+
+def read_vault_secrets(client: hvac.Client) -> dict[str, dict[str, str]]:
+    """Read every Vault secret referenced by VARIABLES once; unreadable secrets map to {}"""
+    secrets = {}
+    for path in sorted({source["secret"] for source in VARIABLES.values()}):
+        try:
+            response = client.secrets.kv.v2.read_secret_version(path=path, mount_point=VAULT_MOUNT, raise_on_deleted_version=True)
+            secrets[path] = response["data"]["data"]
+        except hvac.exceptions.VaultError as e:
+            log_warn(f"Could not read {VAULT_MOUNT}/{path}: {e}")
+            secrets[path] = {}
+    return secrets
+
+
+def desired_variables(secrets: dict[str, dict[str, str]]) -> dict[str, dict]:
+    """Return {variable path: {value, is_secret, description}} for variables with a value"""
+    desired = {}
+    for name, source in VARIABLES.items():
+        value = secrets[source["secret"]].get(source["field"]) or source.get("default", "")
+        if not value:
+            log_warn(f"Skipping {name} (not in Vault)")
+            continue
+        desired[f"{VARIABLE_PREFIX}{name}"] = {"value": value, "is_secret": source["is_secret"], "description": source["description"]}
+    return desired
+
+
+def plan_changes(desired: dict[str, dict], current: dict[str, dict]) -> dict[str, str]:
+    """Return {variable path: "create" | "update" | "unchanged"}"""
+    actions = {}
+    for path, variable in desired.items():
+        existing = current.get(path)
+        if existing is None:
+            actions[path] = "create"
+        elif variable["is_secret"] or existing.get("is_secret") or existing.get("value") != variable["value"]:
+            # Secret values are not returned by the list API, so they are always updated
+            actions[path] = "update"
+        else:
+            actions[path] = "unchanged"
+    return actions
+
+
+def apply_change(session: requests.Session, api: str, path: str, action: str, variable: dict) -> None:
+    """Create or update one variable
+
+    Raises:
+        requests.HTTPError: If the Windmill API rejects the request
+    """
+    if action == "create":
+        response = session.post(f"{api}/variables/create", json={"path": path, **variable}, timeout=HTTP_TIMEOUT)
+    else:
+        response = session.post(f"{api}/variables/update/{path}", json=variable, timeout=HTTP_TIMEOUT)
+    response.raise_for_status()
+
+
+def main() -> int:
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Sync secrets from Vault to Windmill workspace variables")
+    parser.add_argument("--workspace", "-w", required=True, choices=sorted(WORKSPACES), help="Target workspace")
+    parser.add_argument("--dry-run", "-n", action="store_true", help="Show what would be updated without making changes")
+    parser.add_argument("--jobs", type=int, default=8, help="Variables updated in parallel (default: 8)")
+    args = parser.parse_args()
+
+    windmill_workspace = WORKSPACES[args.workspace]
+    log_step(f"Syncing Vault secrets to Windmill workspace {windmill_workspace}{' (dry run)' if args.dry_run else ''}")
+
+    # Token from VAULT_TOKEN or ~/.vault-token, like the vault CLI
+    vault = hvac.Client(url=os.environ.get("VAULT_ADDR", "https://vault.fzymgc.house"))
+    if not vault.is_authenticated():
+        log_error("Not authenticated to Vault. Set VAULT_TOKEN or run 'vault login'")
+        return 1
+
+    log_step("Reading secrets from Vault")
+    secrets = read_vault_secrets(vault)
+    windmill_token = secrets[WINDMILL_SECRET].get(WINDMILL_TOKEN_FIELD)
+    if not windmill_token:
+        log_error(f"Failed to get Windmill token from {VAULT_MOUNT}/{WINDMILL_SECRET} ({WINDMILL_TOKEN_FIELD})")
+        return 1
+    desired = desired_variables(secrets)
+
+    session = requests.Session()
+    session.headers["Authorization"] = f"Bearer {windmill_token}"
+    session.mount("https://", HTTPAdapter(pool_maxsize=args.jobs))
+    api = f"{WINDMILL_URL}/api/w/{windmill_workspace}"
+
+    log_step("Listing current Windmill variables")
+    response = session.get(f"{api}/variables/list", params={"path_start": VARIABLE_PREFIX}, timeout=HTTP_TIMEOUT)
+    if not response.ok:
+        log_error(f"Failed to list Windmill variables: HTTP {response.status_code} - {response.text}")
+        return 1
+    current = {variable["path"]: variable for variable in response.json()}
+    actions = plan_changes(desired, current)
+
+    if args.dry_run:
+        for path, action in sorted(actions.items()):
+            log_info(f"{path}: {'would skip (unchanged)' if action == 'unchanged' else f'would {action}'}")
+        return 0
+
+    changes = {path: action for path, action in actions.items() if action != "unchanged"}
+    counts = {"create": 0, "update": 0, "unchanged": len(actions) - len(changes)}
+    failed = 0
+    with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+        futures = {path: pool.submit(apply_change, session, api, path, action, desired[path]) for path, action in changes.items()}
+        for path, future in sorted(futures.items()):
+            try:
+                future.result()
+                counts[changes[path]] += 1
+                log_info(f"{path}: {changes[path]}d")
+            except requests.RequestException as e:
+                log_error(f"{path}: {changes[path]} failed: {e}")
+                failed += 1
+
+    print()
+    log_info(f"Created: {counts['create']}, updated: {counts['update']}, unchanged: {counts['unchanged']}, failed: {failed}")
+    if not (secrets[WINDMILL_SECRET].get("s3_access_key") and secrets[WINDMILL_SECRET].get("s3_secret_key")):
+        log_warn("S3 credentials not configured in Vault - S3 storage tests will fail until they are added")
+    log_info("Next: Run test_configuration script in Windmill to verify integrations")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
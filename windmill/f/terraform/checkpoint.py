@@ -0,0 +1,176 @@
+"""Checkpoint Terraform module workspaces to S3 so apply can resume on any worker."""
+# requirements:
+# boto3
+
+import hashlib
+import io
+import json
+import os
+import subprocess
+import tempfile
+from pathlib import Path
+from typing import TypedDict
+
+from f.terraform.module_graph import external_files
+from f.terraform.provider_mirror import MIRROR_URL_ENV, write_cli_config
+from f.terraform.s3_artifacts import repo_relative_path, s3, s3_errors, sanitize_module_path
+from f.terraform.state_summary import BACKEND_FILE
+from f.terraform.workspace_pool import DEFAULT_POOL_DIR, PLUGIN_CACHE_DIR, plugin_cache_lock
+
+# The plan file is stored separately as the plan artifact (plan_s3_key); providers
+# are installed again on restore from the lock file, usually out of the plugin cache
+EXCLUDED_PATHS = {"tfplan", ".terraform/providers"}
+# BACKEND_FILE holds the -backend-config values terraform init was given, credentials included
+REDACTED_BACKEND_KEYS = ("access_key", "secret_key", "token")
+# Fast compression: archives are written once and read at most once
+COMPRESS_LEVEL = 1
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class Checkpoint(TypedDict):
+    """Reference to a module workspace archive stored in S3."""
+
+    s3_key: str
+    size: int
+    sha256: str
+    module_path: str
+    root: str  # Path of the module inside the archive ("." in checkpoints without outside files)
+    external_files: list[str]  # Files outside the module it reads, relative to the checkout
+
+
+def file_sha256(path: Path) -> str:
+    """Return the hex SHA-256 of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def checkpoint_key(module_dir: str, job_id: str) -> str:
+    """S3 key for a module workspace checkpoint, alongside the plan artifacts layout."""
+    return f"terraform-checkpoints/{sanitize_module_path(module_dir)}/{job_id}/workspace.tar.gz"
+
+
+def _redacted_backend(path: Path) -> bytes:
+    """The backend file with its credentials removed (apply takes the backend from the plan)."""
+    backend = json.loads(path.read_text())
+    config = (backend.get("backend") or {}).get("config") or {}
+    for name in REDACTED_BACKEND_KEYS:
+        if config.get(name):
+            config[name] = None
+    return json.dumps(backend, indent=2).encode()
+
+
+def create_checkpoint(module_dir: str, s3_client, s3_resource: s3, job_id: str) -> Checkpoint:
+    """Archive the module workspace and the files it reads from outside it, and upload it to S3.
+
+    The archive mirrors the checkout layout, so references such as
+    ${path.module}/../../cloudflare/... resolve after a restore. Providers
+    and backend credentials are left out (see EXCLUDED_PATHS and
+    REDACTED_BACKEND_KEYS).
+
+    Raises:
+        RuntimeError: If the upload fails
+    """
+    import tarfile
+
+    key = checkpoint_key(module_dir, job_id)
+    module_path = Path(module_dir)
+    root = repo_relative_path(module_dir)
+    if Path(root).is_absolute():  # Not inside a checkout
+        root, checkout, outside = ".", module_path, []
+    else:
+        checkout = module_path.parents[len(Path(root).parts) - 1]
+        outside = external_files(module_path, checkout)
+
+    def exclude(member: tarfile.TarInfo) -> tarfile.TarInfo | None:
+        relative = Path(member.name).relative_to(root).as_posix()
+        return None if relative in EXCLUDED_PATHS or relative == BACKEND_FILE else member
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        archive = Path(tmp_dir) / "workspace.tar.gz"
+        with tarfile.open(archive, "w:gz", compresslevel=COMPRESS_LEVEL, dereference=True) as tar:
+            tar.add(module_dir, arcname=root, filter=exclude)
+            if (module_path / BACKEND_FILE).exists():
+                backend = _redacted_backend(module_path / BACKEND_FILE)
+                info = tar.gettarinfo(module_path / BACKEND_FILE, arcname=f"{root}/{BACKEND_FILE}")
+                info.size = len(backend)
+                tar.addfile(info, io.BytesIO(backend))
+            for path in outside:
+                tar.add(path, arcname=path.relative_to(checkout.resolve()).as_posix())
+
+        sha256 = file_sha256(archive)
+        size = archive.stat().st_size
+        try:
+            s3_client.upload_file(str(archive), s3_resource["bucket"], key, ExtraArgs={"Metadata": {"sha256": sha256}})
+        except s3_errors() as e:
+            raise RuntimeError(f"[S3 Upload Error] Failed to upload workspace checkpoint: {e}\n  Key: {key}\n  Bucket: {s3_resource['bucket']}") from e
+
+    return {
+        "s3_key": key,
+        "size": size,
+        "sha256": sha256,
+        "module_path": repo_relative_path(module_dir),
+        "root": root,
+        "external_files": [path.relative_to(checkout.resolve()).as_posix() for path in outside],
+    }
+
+
+def restore_checkpoint(module_dir: str, s3_client, s3_resource: s3, checkpoint: Checkpoint) -> None:
+    """Download a checkpoint, verify its hash and extract it so the module lands in module_dir.
+
+    Files from outside the module are extracted next to it, as in the
+    checkout. Providers are not restored; see install_providers.
+
+    Raises:
+        RuntimeError: If the download fails or the archive hash does not match
+    """
+    import tarfile
+
+    module_path = Path(module_dir)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        archive = Path(tmp_dir) / "workspace.tar.gz"
+        try:
+            s3_client.download_file(s3_resource["bucket"], checkpoint["s3_key"], str(archive))
+        except s3_errors() as e:
+            raise RuntimeError(f"[S3 Download Error] Failed to download workspace checkpoint: {e}\n  Key: {checkpoint['s3_key']}\n  Bucket: {s3_resource['bucket']}") from e
+
+        sha256 = file_sha256(archive)
+        if sha256 != checkpoint["sha256"]:
+            raise RuntimeError(f"Workspace checkpoint hash mismatch for {checkpoint['s3_key']}: expected {checkpoint['sha256']}, got {sha256}")
+
+        root = checkpoint.get("root", ".")
+        target = module_path if root == "." else module_path.parents[len(Path(root).parts) - 1]
+        target.mkdir(parents=True, exist_ok=True)
+        with tarfile.open(archive, "r:gz") as tar:
+            # "data" filter rejects absolute paths and links escaping the target
+            tar.extractall(target, filter="data")
+
+
+def install_providers(module_dir: str, terraform_bin: str, env: dict) -> None:
+    """Install the providers pinned in .terraform.lock.hcl into a restored workspace.
+
+    Runs `terraform init -backend=false`, so no backend credentials are needed
+    and the state is not touched. Providers come from the worker's plugin
+    cache when they are there, otherwise from the provider mirror if one is
+    configured, else from the registry.
+
+    Raises:
+        RuntimeError: If terraform init fails
+    """
+    env = {**env}
+    env.setdefault("TF_PLUGIN_CACHE_DIR", str(Path(DEFAULT_POOL_DIR) / PLUGIN_CACHE_DIR))
+    Path(env["TF_PLUGIN_CACHE_DIR"]).mkdir(parents=True, exist_ok=True)
+    mirror = os.environ.get(MIRROR_URL_ENV, "")
+    if mirror:
+        env["TF_CLI_CONFIG_FILE"] = write_cli_config(mirror)
+    cmd = [terraform_bin, "init", "-backend=false", "-input=false", "-no-color", "-lockfile=readonly"]
+    try:
+        with plugin_cache_lock(env):
+            result = subprocess.run(cmd, cwd=module_dir, capture_output=True, text=True, env=env)
+    finally:
+        if mirror:
+            Path(env["TF_CLI_CONFIG_FILE"]).unlink(missing_ok=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Terraform init (provider install) failed (exit {result.returncode}):\n{result.stderr}")
@@ -0,0 +1,104 @@
+"""Deploy several Terraform modules in dependency order, running independent modules in parallel."""
+# requirements:
+# boto3
+# wmill
+# pyyaml
+
+import os
+import subprocess
+import uuid
+from typing import TypedDict
+
+from f.terraform import git_clone
+from f.terraform.deploy_queue import DEFAULT_MAX_CONCURRENT, dispatch, enqueue_rollout
+from f.terraform.instrumentation import Timings
+from f.terraform.module_graph import build_graph, upstream_closure, waves
+from f.terraform.s3_artifacts import create_s3_client, s3
+from f.terraform.workspace_pool import DEFAULT_POOL_DIR, release_workspace
+
+
+class github(TypedDict):  # noqa: N801
+    """GitHub resource type (name matches Windmill resource)."""
+
+    token: str
+
+
+def main(
+    github: github,
+    s3_resource: s3,
+    ref: str = "main",
+    modules: list[str] | None = None,
+    repository: str = "fzymgc-house/selfhosted-cluster",
+    pool_dir: str = DEFAULT_POOL_DIR,
+    max_concurrent: int = DEFAULT_MAX_CONCURRENT,
+    dry_run: bool = False,
+):
+    """
+    Deploy modules in dependency order through the deploy queue.
+
+    The dependency graph comes from module_graph (remote state, Vault KV
+    secrets, and tf/dependencies.yaml). Every module is queued as one
+    rollout at a single commit, each waiting for its upstream modules in
+    the rollout. The dispatch_deploys schedule starts a module once all of
+    them succeeded and skips it if one failed, so this script returns
+    right after queueing instead of holding a worker while deploys run.
+    Progress is reported per rollout in the dispatch_deploys result.
+
+    Args:
+        github: GitHub resource with token for cloning
+        s3_resource: S3 resource holding terraform-queue/ and terraform-history/
+        ref: Git ref to deploy (resolved to one commit SHA for all modules)
+        modules: Modules to deploy (e.g. ["tf/vault", "tf/grafana"]); all modules if empty
+        repository: Repository in owner/repo format
+        pool_dir: Workspace pool directory for the checkout used to build the graph
+        max_concurrent: Deploy flows allowed to run terraform at once
+        dry_run: Only compute and return the waves
+
+    Returns:
+        dict with:
+            - commit: Commit SHA deployed
+            - waves: Modules per wave, in dependency order
+            - rollout: Rollout ID the modules were queued under
+            - started: deploy_terraform job ID per module started right away
+            - waiting, running: Queued and running modules (all rollouts)
+            - timings: Seconds spent per phase (graph, enqueue, dispatch)
+
+    Raises:
+        RuntimeError: If the queue cannot be updated
+    """
+    timings = Timings()
+
+    with timings.span("graph"):
+        clone = git_clone.main(github=github, repository=repository, branch=ref, pool_dir=pool_dir)
+        workspace = clone["workspace_path"]
+        try:
+            commit = subprocess.run(["git", "-C", workspace, "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+            graph = build_graph(workspace)
+        finally:
+            release_workspace(workspace)
+        plan = waves(graph, modules or None)
+
+    print(f"[Deploy] {commit[:12]}: " + " -> ".join(f"[{', '.join(wave)}]" for wave in plan))
+    if dry_run:
+        return {"commit": commit, "waves": plan, "rollout": "", "started": {}, "waiting": [], "running": [], "timings": timings.as_dict()}
+
+    # Named after this job so the rollout can be traced back to its run
+    rollout = os.environ.get("WM_JOB_ID") or str(uuid.uuid4())
+    selected = {module for wave in plan for module in wave}
+    s3_client = create_s3_client(s3_resource)
+
+    with timings.span("enqueue"):
+        enqueue_rollout(s3_client, s3_resource, rollout, commit, {module: upstream_closure(graph, module) & selected for module in selected})
+    with timings.span("dispatch"):
+        result = dispatch(s3_client, s3_resource, max_concurrent)
+
+    timings.export("deploy_modules")
+    return {
+        "commit": commit,
+        "waves": plan,
+        "rollout": rollout,
+        "started": result["started"],
+        "waiting": result["waiting"],
+        "running": result["running"],
+        "timings": timings.as_dict(),
+    }
@@ -0,0 +1,325 @@
+"""Deploy queue in front of deploy_terraform: priorities, a global cap, memory admission, coalescing and rollout ordering."""
+# requirements:
+# boto3
+# wmill
+
+import json
+import os
+from datetime import UTC, datetime, timedelta
+from typing import TypedDict
+
+from f.terraform.history import peak_memory
+from f.terraform.s3_artifacts import s3, s3_errors
+
+# One JSON document holds the whole queue; writers serialize on its ETag
+QUEUE_KEY = "terraform-queue/deploys.json"
+WRITE_ATTEMPTS = 5
+DEPLOY_FLOW = "f/terraform/deploy_terraform"
+
+# Higher runs first; modules others depend on come before their dependents
+MODULE_PRIORITIES = {"tf/cluster-bootstrap": 100, "tf/core-services": 90, "tf/vault": 80}
+DEFAULT_PRIORITY = 50
+
+DEFAULT_MAX_CONCURRENT = 3
+# Worker memory terraform may use across admitted deploys, overridable per installation
+MEMORY_BUDGET_ENV = "TF_DEPLOY_MEMORY_BUDGET_MB"
+DEFAULT_MEMORY_BUDGET_MB = 3072
+# Assumed memory peak for modules without recorded history
+DEFAULT_MODULE_MEMORY_MB = 768
+# A claimed entry whose flow never started (dispatcher died in between) is queued again
+CLAIM_TIMEOUT = timedelta(minutes=5)
+# A running entry is released after this even if its job status cannot be read:
+# the approval suspend (up to 24h) plus plan and apply, as for pooled workspaces
+MAX_LEASE = timedelta(hours=26)
+# Finished rollouts (deploy_modules runs) are kept this long for their results
+ROLLOUT_RETENTION = timedelta(days=7)
+
+
+class QueueEntry(TypedDict):
+    """A requested deploy of one module."""
+
+    module: str
+    ref: str
+    priority: int
+    memory_mb: float
+    requested_at: str
+    job_id: str  # Set once dispatched
+    claimed_at: str
+    rollout: str  # deploy_modules run this deploy belongs to ("" for single deploys)
+    after: list[str]  # Modules of the same rollout that must succeed first
+
+
+def _now() -> str:
+    return datetime.now(UTC).isoformat(timespec="seconds")
+
+
+def _error_code(e: Exception) -> str:
+    return getattr(e, "response", {}).get("Error", {}).get("Code", "")
+
+
+def _read_queue(s3_client, bucket: str) -> tuple[dict, dict]:
+    """Return the stored queue and the put_object condition that writes over exactly that version."""
+    try:
+        response = s3_client.get_object(Bucket=bucket, Key=QUEUE_KEY)
+        queue = json.loads(response["Body"].read())
+        condition = {"IfMatch": response["ETag"]}
+    except s3_errors() as e:
+        if _error_code(e) not in ("NoSuchKey", "404"):
+            raise RuntimeError(f"[S3 Download Error] Failed to read deploy queue: {e}\n  Key: {QUEUE_KEY}") from e
+        queue = {"queued": {}, "running": {}}
+        condition = {"IfNoneMatch": "*"}
+    queue.setdefault("rollouts", {})
+    return queue, condition
+
+
+def update_queue(s3_client, s3_resource: s3, mutate) -> dict:
+    """Apply mutate(queue) to the stored queue with a conditional PUT, retrying on conflicts.
+
+    The queue is {"queued": {module: QueueEntry}, "running": {module: QueueEntry},
+    "rollouts": {rollout: {"commit", "created_at", "results": {module: outcome}}}}.
+    mutate changes it in place and may be called more than once, so it must
+    not call out to other services.
+
+    Returns:
+        The queue as written
+
+    Raises:
+        RuntimeError: If the queue cannot be read or written
+    """
+    bucket = s3_resource["bucket"]
+    for _ in range(WRITE_ATTEMPTS):
+        queue, condition = _read_queue(s3_client, bucket)
+        mutate(queue)
+        try:
+            s3_client.put_object(Bucket=bucket, Key=QUEUE_KEY, Body=json.dumps(queue, indent=2).encode(), ContentType="application/json", **condition)
+            return queue
+        except s3_errors() as e:
+            if _error_code(e) not in ("PreconditionFailed", "ConditionalRequestConflict", "412", "409"):
+                raise RuntimeError(f"[S3 Upload Error] Failed to write deploy queue: {e}\n  Key: {QUEUE_KEY}") from e
+    raise RuntimeError(f"Deploy queue {QUEUE_KEY} kept changing, gave up after {WRITE_ATTEMPTS} attempts")
+
+
+def _new_entry(s3_client, s3_resource: s3, module: str, ref: str, priority: int | None, rollout: str = "", after: list[str] | None = None) -> QueueEntry:
+    try:
+        memory_mb = peak_memory(s3_client, s3_resource, module) or DEFAULT_MODULE_MEMORY_MB
+    except RuntimeError as e:
+        print(f"[Queue Warning] Could not read memory history for {module}, assuming {DEFAULT_MODULE_MEMORY_MB} MB (non-fatal): {e}")
+        memory_mb = DEFAULT_MODULE_MEMORY_MB
+    return {
+        "module": module,
+        "ref": ref,
+        "priority": priority if priority is not None else MODULE_PRIORITIES.get(module, DEFAULT_PRIORITY),
+        "memory_mb": memory_mb,
+        "requested_at": _now(),
+        "job_id": "",
+        "claimed_at": "",
+        "rollout": rollout,
+        "after": after or [],
+    }
+
+
+def _add(queue: dict, entry: QueueEntry) -> None:
+    """Queue entry, replacing a queued deploy of its module.
+
+    A replacing single deploy keeps the rollout ordering of the entry it
+    replaces, so the rollout's dependents still wait for this module.
+    """
+    replaced = queue["queued"].get(entry["module"])
+    if replaced:
+        if replaced["ref"] != entry["ref"]:
+            print(f"[Queue] {entry['module']}: {entry['ref'][:12]} supersedes queued {replaced['ref'][:12]}")
+        if not entry["rollout"]:
+            entry = {**entry, "rollout": replaced.get("rollout", ""), "after": replaced.get("after", [])}
+    queue["queued"][entry["module"]] = entry
+
+
+def enqueue(s3_client, s3_resource: s3, module: str, ref: str, priority: int | None = None) -> QueueEntry:
+    """Queue a deploy, replacing any queued (not yet started) deploy of the same module.
+
+    Requests arrive in push order, so the replaced entry is for an older
+    commit; only the newest is deployed.
+
+    Raises:
+        RuntimeError: If the queue cannot be updated
+    """
+    entry = _new_entry(s3_client, s3_resource, module, ref, priority)
+    update_queue(s3_client, s3_resource, lambda queue: _add(queue, entry))
+    return entry
+
+
+def enqueue_rollout(s3_client, s3_resource: s3, rollout: str, commit: str, upstreams: dict[str, set[str]]) -> list[QueueEntry]:
+    """Queue a deploy of several modules at one commit, each waiting for its upstream modules.
+
+    upstreams maps every module to the modules of the rollout it depends on.
+    dispatch starts a module once all of them succeeded and skips it if one
+    failed or was skipped.
+
+    Raises:
+        RuntimeError: If the queue cannot be updated
+    """
+    entries = [_new_entry(s3_client, s3_resource, module, commit, None, rollout, sorted(after)) for module, after in sorted(upstreams.items())]
+
+    def add(queue: dict) -> None:
+        queue["rollouts"][rollout] = {"commit": commit, "created_at": _now(), "results": {}}
+        for entry in entries:
+            _add(queue, entry)
+
+    update_queue(s3_client, s3_resource, add)
+    return entries
+
+
+def _job_state(client, job_id: str) -> str:
+    """State of a deploy job: "succeeded", "failed", "suspended" (waiting for approval) or "running" (also when the lookup fails)."""
+    try:
+        if client.get_job_status(job_id) == "COMPLETED":
+            return "succeeded" if client.get_job(job_id).get("success") else "failed"
+        return "suspended" if client.get_job(job_id).get("suspend", 0) > 0 else "running"
+    except Exception as e:  # noqa: BLE001 - wmill raises plain Exception for API errors
+        print(f"[Queue Warning] Could not look up job {job_id}, keeping its slot (non-fatal): {e}")
+        return "running"
+
+
+def _outcome(entry: QueueEntry, state: str, now: datetime) -> str | None:
+    """How a running entry ended: "succeeded", "failed", "requeue" (never started), or None while it is still running."""
+    age = now - datetime.fromisoformat(entry["claimed_at"])
+    if not entry["job_id"]:
+        return "requeue" if age > CLAIM_TIMEOUT else None
+    if age > MAX_LEASE:
+        print(f"[Queue Warning] Job {entry['job_id']} of {entry['module']} held its slot past {MAX_LEASE.total_seconds() / 3600:.0f}h, releasing it")
+        return "failed"
+    return state if state in ("succeeded", "failed") else None
+
+
+def _blocked(queue: dict, entry: QueueEntry) -> str | None:
+    """Why a rollout entry cannot start yet: "wait" for pending upstreams, "skip" if one failed; None if it may start."""
+    if not entry.get("after"):
+        return None
+    results = queue["rollouts"].get(entry["rollout"], {}).get("results", {})
+    waiting = False
+    for upstream in entry["after"]:
+        if results.get(upstream) == "succeeded":
+            continue
+        pending = any(other.get("rollout") == entry["rollout"] for other in (queue["queued"].get(upstream), queue["running"].get(upstream)) if other)
+        if upstream in results or not pending:
+            return "skip"  # Failed, skipped, or dropped from the queue
+        waiting = True
+    return "wait" if waiting else None
+
+
+def dispatch(s3_client, s3_resource: s3, max_concurrent: int = DEFAULT_MAX_CONCURRENT, memory_budget_mb: float | None = None) -> dict:
+    """Start queued deploys that fit the concurrency cap and memory budget.
+
+    Queued modules are considered by priority, then age. A module already
+    running waits for that run, and a rollout module for its upstream
+    modules; it is skipped when one of them failed or was skipped.
+
+    Flows suspended for approval run no terraform, so they do not count
+    against max_concurrent; their memory stays reserved in the budget so
+    they can always resume. A resumed flow counts again, which can take the
+    running count past the cap until it finishes. When nothing is running,
+    the first candidate starts even if its estimate exceeds the budget.
+
+    Job states are looked up once, before the queue update; an entry that
+    appears during the update (another dispatcher started it) counts as running.
+
+    Each flow is started and its job ID written to the queue before the
+    next one starts, so a failure partway leaves no started flow without
+    its ID (which would be queued and deployed again).
+
+    Returns:
+        dict with started (module -> job ID), waiting and running module lists,
+        and the per-module results of unfinished and recent rollouts
+
+    Raises:
+        RuntimeError: If the queue cannot be updated
+    """
+    import wmill
+
+    client = wmill.Windmill()
+    budget = memory_budget_mb or float(os.environ.get(MEMORY_BUDGET_ENV, DEFAULT_MEMORY_BUDGET_MB))
+    now = datetime.now(UTC)
+    claimed: dict[str, QueueEntry] = {}
+    # Outside claim: update_queue may call it several times
+    states = {entry["job_id"]: _job_state(client, entry["job_id"]) for entry in _read_queue(s3_client, s3_resource["bucket"])[0]["running"].values() if entry["job_id"]}
+
+    def claim(queue: dict) -> None:
+        claimed.clear()
+        for module, entry in list(queue["running"].items()):
+            outcome = _outcome(entry, states.get(entry["job_id"], "running"), now)
+            if not outcome:
+                continue
+            del queue["running"][module]
+            if outcome == "requeue":
+                if module not in queue["queued"]:
+                    queue["queued"][module] = {**entry, "claimed_at": ""}
+            elif entry.get("rollout") in queue["rollouts"]:
+                queue["rollouts"][entry["rollout"]]["results"][module] = outcome
+
+        # Skipping one module can block its dependents, so repeat until nothing changes
+        skipping = True
+        while skipping:
+            skipping = False
+            for module, entry in list(queue["queued"].items()):
+                if _blocked(queue, entry) == "skip":
+                    print(f"[Queue] Skipping {module}: an upstream module of rollout {entry['rollout']} did not deploy")
+                    del queue["queued"][module]
+                    queue["rollouts"][entry["rollout"]]["results"][module] = "skipped"
+                    skipping = True
+
+        for rollout, state in list(queue["rollouts"].items()):
+            pending = any(entry.get("rollout") == rollout for entry in [*queue["queued"].values(), *queue["running"].values()])
+            if not pending and now - datetime.fromisoformat(state["created_at"]) > ROLLOUT_RETENTION:
+                del queue["rollouts"][rollout]
+
+        running = len(queue["running"])
+        active = sum(states.get(entry["job_id"]) != "suspended" for entry in queue["running"].values())
+        used = sum(entry["memory_mb"] for entry in queue["running"].values())
+        for candidate in sorted(queue["queued"].values(), key=lambda entry: (-entry["priority"], entry["requested_at"])):
+            if candidate["module"] in queue["running"] or _blocked(queue, candidate):
+                continue
+            if active >= max_concurrent or (running and used + candidate["memory_mb"] > budget):
+                continue
+            entry = {**candidate, "claimed_at": _now()}
+            del queue["queued"][entry["module"]]
+            queue["running"][entry["module"]] = entry
+            claimed[entry["module"]] = entry
+            running += 1
+            active += 1
+            used += entry["memory_mb"]
+
+    queue = update_queue(s3_client, s3_resource, claim)
+
+    def ours(queue: dict, module: str) -> QueueEntry | None:
+        """The running entry this dispatcher claimed (not one requeued and claimed again since)."""
+        entry = queue["running"].get(module)
+        return entry if entry and entry["claimed_at"] == claimed[module]["claimed_at"] else None
+
+    started: dict[str, str] = {}
+    for module, entry in claimed.items():
+        try:
+            job_id = client.run_flow_async(DEPLOY_FLOW, {"module": module, "ref": entry["ref"]})
+        except Exception as e:  # noqa: BLE001 - wmill raises plain Exception for API errors
+            print(f"[Queue Warning] Failed to start {module}, returning it to the queue (non-fatal): {e}")
+
+            def release(queue: dict, module: str = module) -> None:
+                if ours(queue, module):
+                    del queue["running"][module]
+                    queue["queued"].setdefault(module, {**claimed[module], "claimed_at": ""})
+
+            queue = update_queue(s3_client, s3_resource, release)
+            continue
+
+        def record(queue: dict, module: str = module, job_id: str = job_id) -> None:
+            if ours(queue, module):
+                queue["running"][module]["job_id"] = job_id
+
+        queue = update_queue(s3_client, s3_resource, record)
+        started[module] = job_id
+        print(f"[Queue] Started {module} at {entry['ref'][:12]} (job {job_id}, ~{entry['memory_mb']:.0f} MB)")
+
+    return {
+        "started": started,
+        "waiting": sorted(queue["queued"]),
+        "running": sorted(queue["running"]),
+        "rollouts": {rollout: state["results"] for rollout, state in queue["rollouts"].items()},
+    }
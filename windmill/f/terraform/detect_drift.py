@@ -0,0 +1,251 @@
+"""Detect drift across all Terraform modules and post one Discord digest."""
+# requirements:
+# boto3
+# requests
+# pyyaml
+
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+from typing import TypedDict
+
+import requests
+from botocore.exceptions import BotoCoreError, ClientError
+from f.terraform import git_clone, terraform_init, terraform_plan
+from f.terraform.instrumentation import Timings
+from f.terraform.module_graph import build_graph
+from f.terraform.s3_artifacts import create_s3_client, sanitize_module_path
+from f.terraform.workspace_pool import DEFAULT_POOL_DIR, PLUGIN_CACHE_DIR, release_workspace
+
+# Discord API limits
+DISCORD_API_TIMEOUT = 30  # seconds
+DISCORD_EMBED_FIELDS = 25
+DISCORD_EMBED_FIELD_LIMIT = 1000
+# Drifted addresses listed per module in the digest
+DIGEST_ADDRESSES = 10
+
+
+class github(TypedDict):  # noqa: N801
+    """GitHub resource type (name matches Windmill resource)."""
+
+    token: str
+
+
+class s3(TypedDict):  # noqa: N801
+    """S3 resource type (name matches Windmill resource)."""
+
+    bucket: str
+    region: str
+    endPoint: str
+    accessKey: str
+    secretKey: str
+    useSSL: bool
+    pathStyle: bool
+
+
+class c_discord_bot_token_configuration(TypedDict):  # noqa: N801
+    """Discord bot token configuration resource type (name matches Windmill resource)."""
+
+    token: str
+    channel_id: str
+
+
+def drift_key(module_path: str) -> str:
+    """S3 key of the latest drift result for a module."""
+    return f"terraform-drift/{sanitize_module_path(module_path)}/latest.json"
+
+
+def _recently_planned(s3_client, bucket: str, module_path: str, plan_cutoff: datetime, clean_cutoff: datetime) -> bool:
+    """Whether the module needs no check yet: a deploy planned it after plan_cutoff, or its last drift check after clean_cutoff found it clean.
+
+    Drift checks that found drift or failed never cause a skip, so they are reported again.
+    """
+    try:
+        record = json.loads(s3_client.get_object(Bucket=bucket, Key=drift_key(module_path))["Body"].read())
+        if not record["has_drift"] and not record["error"] and datetime.fromisoformat(record["checked_at"]) > clean_cutoff:
+            return True
+    except (ClientError, BotoCoreError, json.JSONDecodeError, KeyError, ValueError):
+        pass  # Never checked (or unreadable - check again)
+    try:
+        response = s3_client.list_objects_v2(Bucket=bucket, Prefix=f"terraform-plans/{sanitize_module_path(module_path)}/")
+        return any(obj["LastModified"] > plan_cutoff for obj in response.get("Contents", []))
+    except (ClientError, BotoCoreError) as e:
+        print(f"[S3 List Warning] Could not list recent plans for {module_path}, checking it anyway (non-fatal): {e}")
+        return False
+
+
+def _check_module(module_path: str, workspace: str, commit: str, settings: dict) -> dict:
+    """Run init and a refresh-only plan for one module; errors are returned, not raised.
+
+    Any exception (e.g. an S3 or HTTP client error, or a missing key in an
+    unexpected terraform output) becomes the module's error, so one module
+    cannot abort the run before results are stored and the digest is posted.
+    """
+    start = time.perf_counter()
+    record = {"module": module_path, "commit": commit, "checked_at": datetime.now(UTC).isoformat(), "has_drift": False, "drift": [], "error": None}
+    try:
+        # terraform_init holds the plugin cache lock, so inits still run one at a time
+        init = terraform_init.main(
+            workspace_path=workspace,
+            module_path=module_path,
+            s3=settings["s3_resource"],
+            s3_bucket_prefix=settings["s3_bucket_prefix"],
+            tfc_token=settings["tfc_token"],
+        )
+        plan = terraform_plan.main(
+            module_dir=init["module_dir"],
+            vault_addr=settings["vault_addr"],
+            vault_token=settings["vault_token"],
+            tfc_token=settings["tfc_token"],
+            s3_resource=settings["s3_resource"],
+            refresh_only=True,
+        )
+        record.update(has_drift=plan["has_changes"], drift=plan["drift"], plan_summary=plan["plan_summary"], plan_details=plan["plan_details"])
+        # Modules are planned in parallel threads, so these are mostly marked aggregate
+        record["resource_usage"] = {"init": init["resource_usage"], "plan": plan["resource_usage"]}
+    except (RuntimeError, ValueError) as e:
+        record["error"] = str(e)
+    except Exception as e:  # noqa: BLE001 - one module's failure must not abort the drift run
+        record["error"] = f"{type(e).__name__}: {e}"
+    record["duration"] = round(time.perf_counter() - start, 3)
+    return record
+
+
+def _digest_embed(results: list[dict], skipped: list[str], commit: str) -> dict:
+    """Build one Discord embed summarizing drift and errors."""
+    drifted = [r for r in results if r["has_drift"]]
+    errored = [r for r in results if r["error"]]
+    fields = []
+    for r in drifted:
+        lines = [f"{d['action']}: {d['address']}" for d in r["drift"][:DIGEST_ADDRESSES]]
+        if len(r["drift"]) > DIGEST_ADDRESSES:
+            lines.append(f"... and {len(r['drift']) - DIGEST_ADDRESSES} more")
+        fields.append({"name": f"🔀 {r['module']}", "value": f"```\n{chr(10).join(lines) or r['plan_summary']}\n```"[:DISCORD_EMBED_FIELD_LIMIT], "inline": False})
+    for r in errored:
+        fields.append({"name": f"❌ {r['module']}", "value": f"```\n{r['error'][: DISCORD_EMBED_FIELD_LIMIT - 10]}\n```", "inline": False})
+
+    clean = len(results) - len(drifted) - len(errored)
+    description = f"Commit `{commit[:12]}`: {len(drifted)} drifted, {len(errored)} failed, {clean} clean, {len(skipped)} skipped (recently planned)"
+    color = 0xFF0000 if errored else 0xFFA500 if drifted else 0x00FF00
+    return {
+        "title": "🔍 Terraform Drift Report",
+        "description": description,
+        "color": color,
+        "fields": fields[:DISCORD_EMBED_FIELDS],
+        "timestamp": datetime.now(UTC).isoformat(),
+        "footer": {"text": "Windmill Terraform GitOps"},
+    }
+
+
+def main(
+    github: github,
+    s3_resource: s3,
+    discord_bot_token: c_discord_bot_token_configuration,
+    s3_bucket_prefix: str = "",
+    vault_addr: str = "https://vault.fzymgc.house",
+    vault_token: str = "",
+    tfc_token: str | None = None,
+    ref: str = "main",
+    modules: list[str] | None = None,
+    repository: str = "fzymgc-house/selfhosted-cluster",
+    pool_dir: str = DEFAULT_POOL_DIR,
+    max_workers: int = 4,
+    skip_recent_minutes: int = 50,
+    skip_clean_minutes: int = 170,
+    notify_clean: bool = False,
+):
+    """
+    Run refresh-only plans over every module and report drift.
+
+    The checkout comes from the workspace pool, so hourly runs fetch instead of
+    cloning and keep .terraform/ directories. Providers are shared through a
+    plugin cache in the pool directory. Modules a deploy planned within
+    skip_recent_minutes, or whose last drift check within skip_clean_minutes
+    found them clean, are skipped.
+
+    Each module's result is stored at terraform-drift/{module--path}/latest.json.
+
+    Args:
+        github: GitHub resource with token for cloning
+        s3_resource: S3 resource for state backend config and drift results
+        discord_bot_token: Discord bot token and channel configuration
+        s3_bucket_prefix: Optional state key prefix within the bucket
+        vault_addr: Vault server address
+        vault_token: Vault authentication token
+        tfc_token: Terraform Cloud API token (optional)
+        ref: Git ref to check
+        modules: Modules to check (default: every module in the dependency graph)
+        repository: Repository in owner/repo format
+        pool_dir: Workspace pool directory
+        max_workers: Modules planned in parallel
+        skip_recent_minutes: Skip modules a deploy planned more recently than this
+        skip_clean_minutes: Skip modules whose last drift check found no drift
+            more recently than this (drifted and failed modules are always checked)
+        notify_clean: Post the digest even when nothing drifted
+
+    Returns:
+        dict with commit, per-module results, skipped modules, whether a digest
+        was posted, and per-phase timings (clone, modules, store, discord)
+    """
+    timings = Timings()
+    s3_client = create_s3_client(s3_resource)
+    bucket = s3_resource["bucket"]
+    os.environ.setdefault("TF_PLUGIN_CACHE_DIR", str(Path(pool_dir) / PLUGIN_CACHE_DIR))
+    Path(os.environ["TF_PLUGIN_CACHE_DIR"]).mkdir(parents=True, exist_ok=True)
+
+    with timings.span("clone"):
+        clone = git_clone.main(github=github, repository=repository, branch=ref, pool_dir=pool_dir)
+    workspace = clone["workspace_path"]
+
+    try:
+        candidates = modules or sorted(build_graph(workspace))
+        now = datetime.now(UTC)
+        plan_cutoff, clean_cutoff = now - timedelta(minutes=skip_recent_minutes), now - timedelta(minutes=skip_clean_minutes)
+        selected, skipped = [], []
+        for module_path in candidates:
+            recent = _recently_planned(s3_client, bucket, module_path, plan_cutoff, clean_cutoff)
+            (skipped if recent else selected).append(module_path)
+
+        settings = {
+            "s3_resource": s3_resource,
+            "s3_bucket_prefix": s3_bucket_prefix,
+            "vault_addr": vault_addr,
+            "vault_token": vault_token,
+            "tfc_token": tfc_token,
+        }
+        with timings.span("modules"), ThreadPoolExecutor(max_workers=max_workers) as pool:
+            results = list(pool.map(lambda m: _check_module(m, workspace, clone["commit_sha"], settings), selected))
+    finally:
+        release_workspace(workspace)
+
+    with timings.span("store"):
+        for record in results:
+            try:
+                s3_client.put_object(Bucket=bucket, Key=drift_key(record["module"]), Body=json.dumps(record).encode(), ContentType="application/json")
+            except (ClientError, BotoCoreError) as e:
+                print(f"[S3 Upload Warning] Failed to store drift result for {record['module']} (non-fatal): {e}")
+
+    notify = notify_clean or any(r["has_drift"] or r["error"] for r in results)
+    if notify:
+        with timings.span("discord"):
+            response = requests.post(
+                f"https://discord.com/api/v10/channels/{discord_bot_token['channel_id']}/messages",
+                headers={"Authorization": f"Bot {discord_bot_token['token']}", "Content-Type": "application/json"},
+                json={"embeds": [_digest_embed(results, skipped, clone["commit_sha"])]},
+                timeout=DISCORD_API_TIMEOUT,
+            )
+        if not response.ok:
+            raise Exception(f"Discord API failed: {response.status_code} - {response.text}")
+
+    timings.export("detect_drift")
+
+    return {
+        "commit": clone["commit_sha"],
+        "results": results,
+        "skipped": skipped,
+        "notified": notify,
+        "timings": timings.as_dict(),
+    }
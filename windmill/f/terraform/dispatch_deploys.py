@@ -0,0 +1,44 @@
+"""Start queued module deploys as concurrency and worker memory allow."""
+# requirements:
+# boto3
+# wmill
+
+from f.terraform.deploy_queue import DEFAULT_MAX_CONCURRENT, dispatch
+from f.terraform.instrumentation import Timings
+from f.terraform.s3_artifacts import create_s3_client, s3
+
+
+def main(
+    s3_resource: s3,
+    max_concurrent: int = DEFAULT_MAX_CONCURRENT,
+    memory_budget_mb: int = 0,
+):
+    """
+    Release finished deploys from the queue and start the next ones.
+
+    Runs every minute; enqueue_deploy also dispatches, so the schedule only
+    matters once a running deploy finishes or resumes after approval. A
+    finished deploy also unblocks its dependents in a deploy_modules rollout.
+
+    Args:
+        s3_resource: S3 resource holding terraform-queue/
+        max_concurrent: Deploy flows allowed to run terraform at once
+        memory_budget_mb: Worker memory admitted deploys may use together
+            (0 uses the worker's TF_DEPLOY_MEMORY_BUDGET_MB, default 3072)
+
+    Returns:
+        dict with started (module -> job ID), waiting and running modules,
+        per-module results of deploy_modules rollouts and per-phase timings
+        (dispatch)
+
+    Raises:
+        RuntimeError: If the queue cannot be updated
+    """
+    timings = Timings()
+    s3_client = create_s3_client(s3_resource)
+
+    with timings.span("dispatch"):
+        result = dispatch(s3_client, s3_resource, max_concurrent, memory_budget_mb or None)
+
+    timings.export("dispatch_deploys")
+    return {**result, "timings": timings.as_dict()}
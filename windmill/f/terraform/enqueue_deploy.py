@@ -0,0 +1,48 @@
+"""Queue a module deploy for the deploy dispatcher instead of starting its flow directly."""
+# requirements:
+# boto3
+# wmill
+
+from f.terraform.deploy_queue import DEFAULT_MAX_CONCURRENT, dispatch, enqueue
+from f.terraform.instrumentation import Timings
+from f.terraform.s3_artifacts import create_s3_client, s3
+
+
+def main(
+    s3_resource: s3,
+    module: str,
+    ref: str,
+    priority: int | None = None,
+    max_concurrent: int = DEFAULT_MAX_CONCURRENT,
+):
+    """
+    Queue a deploy of a module and start whatever the queue admits right away.
+
+    A queued (not yet started) deploy of the same module is replaced, so a
+    burst of pushes deploys only the newest commit. Deploys that do not fit
+    are started by the dispatch_deploys schedule as slots free up.
+
+    Args:
+        s3_resource: S3 resource holding terraform-queue/ and terraform-history/
+        module: Terraform module path (e.g., tf/vault)
+        ref: Git ref to deploy (commit SHA)
+        priority: Queue priority, higher first (defaults to the module's entry in MODULE_PRIORITIES)
+        max_concurrent: Deploy flows allowed to run terraform at once
+
+    Returns:
+        dict with the queued entry, started (module -> job ID), waiting and
+        running modules and per-phase timings (enqueue, dispatch)
+
+    Raises:
+        RuntimeError: If the queue cannot be updated
+    """
+    timings = Timings()
+    s3_client = create_s3_client(s3_resource)
+
+    with timings.span("enqueue"):
+        entry = enqueue(s3_client, s3_resource, module, ref, priority)
+    with timings.span("dispatch"):
+        result = dispatch(s3_client, s3_resource, max_concurrent)
+
+    timings.export("enqueue_deploy", module=module)
+    return {"queued": entry, **result, "timings": timings.as_dict()}
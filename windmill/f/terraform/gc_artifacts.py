@@ -0,0 +1,185 @@
+"""Garbage-collect orphaned Terraform pipeline artifacts from S3."""
+# requirements:
+# boto3
+# wmill
+
+from datetime import UTC, datetime, timedelta
+from typing import TypedDict
+
+import wmill
+from botocore.exceptions import BotoCoreError, ClientError
+from f.terraform.instrumentation import Timings
+from f.terraform.s3_artifacts import create_s3_client
+from f.terraform.terraform_validate import VALIDATE_PREFIX
+
+# Artifacts only an unfinished deploy can still use (apply deletes them on success)
+RUN_PREFIXES = ("terraform-plans/", "terraform-checkpoints/")
+# Step outputs stay referenced from completed job results, so expire by age only
+OUTPUT_PREFIX = "terraform-outputs/"
+# Speculative plans are keyed by module tree, not job; only useful until state changes
+SPECULATIVE_PREFIX = "terraform-speculative/"
+
+DELETE_BATCH_SIZE = 1000  # S3 DeleteObjects limit
+
+
+class s3(TypedDict):  # noqa: N801
+    """S3 resource type (name matches Windmill resource)."""
+
+    bucket: str
+    region: str
+    endPoint: str
+    accessKey: str
+    secretKey: str
+    useSSL: bool
+    pathStyle: bool
+
+
+def _list_objects(s3_client, bucket: str, prefix: str):
+    """Yield every object under prefix, following list_objects_v2 pagination."""
+    paginator = s3_client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix, PaginationConfig={"PageSize": 1000}):
+        yield from page.get("Contents", [])
+
+
+def _job_id(key: str) -> str:
+    """Extract the job ID from '<prefix>/<module--path>/<job_id>/<file>'."""
+    parts = key.split("/")
+    return parts[2] if len(parts) >= 4 else ""
+
+
+def _deploy_finished(job_id: str, cache: dict[str, bool]) -> bool:
+    """Whether the deploy flow that produced job_id has finished.
+
+    Lookup failures count as still running; such artifacts are removed once
+    they pass max_run_age_hours instead.
+    """
+    if job_id not in cache:
+        try:
+            root_id = wmill.get_root_job_id(job_id)
+            cache[job_id] = wmill.get_job_status(root_id) == "COMPLETED"
+        except Exception as e:  # noqa: BLE001 - wmill raises plain Exception for API errors
+            print(f"[GC Warning] Could not look up job {job_id}, keeping its artifacts (non-fatal): {e}")
+            cache[job_id] = False
+    return cache[job_id]
+
+
+def _delete_keys(s3_client, bucket: str, keys: list[str]) -> list[str]:
+    """Delete keys in batches of DELETE_BATCH_SIZE; return keys that failed."""
+    failed = []
+    for start in range(0, len(keys), DELETE_BATCH_SIZE):
+        batch = keys[start : start + DELETE_BATCH_SIZE]
+        try:
+            response = s3_client.delete_objects(
+                Bucket=bucket,
+                Delete={"Objects": [{"Key": key} for key in batch], "Quiet": True},
+            )
+        except (ClientError, BotoCoreError) as e:
+            print(f"[S3 Delete Warning] Failed to delete {len(batch)} objects (non-fatal): {e}")
+            failed.extend(batch)
+            continue
+        for error in response.get("Errors", []):
+            print(f"[S3 Delete Warning] {error.get('Key')}: {error.get('Code')} {error.get('Message')}")
+            failed.append(error.get("Key"))
+    return failed
+
+
+def main(
+    s3_resource: s3,
+    min_age_minutes: int = 60,
+    max_run_age_hours: int = 26,
+    output_max_age_days: int = 30,
+    speculative_max_age_days: int = 7,
+    validate_max_age_days: int = 30,
+    dry_run: bool = False,
+):
+    """
+    Remove plan, checkpoint and output artifacts left behind by rejected, timed-out or failed deploys.
+
+    Plans and checkpoints are removed once the deploy flow that created them has
+    finished, or unconditionally after max_run_age_hours (longer than the 24h
+    approval suspend, so no flow can still apply them). Offloaded outputs are
+    removed after output_max_age_days, speculative plans after
+    speculative_max_age_days, cached validation results after
+    validate_max_age_days.
+
+    Args:
+        s3_resource: S3 resource holding the pipeline artifacts
+        min_age_minutes: Never touch artifacts younger than this
+        max_run_age_hours: Age after which plans/checkpoints are removed without a job lookup
+        output_max_age_days: Retention for offloaded step outputs
+        speculative_max_age_days: Retention for speculative plans
+        validate_max_age_days: Retention for cached terraform_validate results
+        dry_run: Report what would be deleted without deleting
+
+    Returns:
+        dict with:
+            - deleted: Number of objects deleted (or that would be, in dry run)
+            - bytes_reclaimed: Total size of those objects
+            - kept_active: Number of objects kept because their deploy is still running (or unknown)
+            - failed: Keys that could not be deleted
+            - dry_run: Whether this was a dry run
+            - timings: Seconds spent per phase (list, job_lookup, delete)
+    """
+    timings = Timings()
+    s3_client = create_s3_client(s3_resource)
+    bucket = s3_resource["bucket"]
+    now = datetime.now(UTC)
+    min_age = timedelta(minutes=min_age_minutes)
+    max_run_age = timedelta(hours=max_run_age_hours)
+    age_limits = {
+        OUTPUT_PREFIX: timedelta(days=output_max_age_days),
+        SPECULATIVE_PREFIX: timedelta(days=speculative_max_age_days),
+        VALIDATE_PREFIX: timedelta(days=validate_max_age_days),
+    }
+
+    stale: dict[str, int] = {}
+    pending: list[dict] = []
+    for prefix in (*RUN_PREFIXES, *age_limits):
+        try:
+            with timings.span("list"):
+                objects = list(_list_objects(s3_client, bucket, prefix))
+        except (ClientError, BotoCoreError) as e:
+            raise RuntimeError(f"[S3 List Error] Failed to list artifacts: {e}\n  Prefix: {prefix}\n  Bucket: {bucket}") from e
+
+        for obj in objects:
+            age = now - obj["LastModified"]
+            if age < min_age:
+                continue
+            if prefix in age_limits:
+                if age > age_limits[prefix]:
+                    stale[obj["Key"]] = obj["Size"]
+            elif age > max_run_age or not _job_id(obj["Key"]):
+                stale[obj["Key"]] = obj["Size"]
+            else:
+                pending.append(obj)
+
+    # Cross-check younger plans/checkpoints against their deploy flow
+    finished: dict[str, bool] = {}
+    kept_active = 0
+    with timings.span("job_lookup"):
+        for obj in pending:
+            if _deploy_finished(_job_id(obj["Key"]), finished):
+                stale[obj["Key"]] = obj["Size"]
+            else:
+                kept_active += 1
+
+    failed: list[str] = []
+    if stale and not dry_run:
+        with timings.span("delete"):
+            failed = _delete_keys(s3_client, bucket, list(stale))
+
+    failed_keys = set(failed)
+    deleted = [key for key in stale if key not in failed_keys]
+    bytes_reclaimed = sum(stale[key] for key in deleted)
+    print(f"[GC] {'Would delete' if dry_run else 'Deleted'} {len(deleted)} objects ({bytes_reclaimed} bytes), kept {kept_active} of active deploys")
+
+    timings.export("gc_artifacts", bucket=bucket)
+
+    return {
+        "deleted": len(deleted),
+        "bytes_reclaimed": bytes_reclaimed,
+        "kept_active": kept_active,
+        "failed": failed,
+        "dry_run": dry_run,
+        "timings": timings.as_dict(),
+    }
@@ -0,0 +1,212 @@
+"""Plan/apply history: one SQLite file per module and month in S3."""
+# requirements:
+# boto3
+
+import resource
+import sqlite3
+import subprocess
+import tempfile
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import TypedDict
+
+from f.terraform.s3_artifacts import s3, s3_errors, sanitize_module_path
+
+# Layout: terraform-history/<module--path>/<YYYY-MM>.sqlite
+HISTORY_PREFIX = "terraform-history/"
+# Concurrent writers (e.g. a speculative plan next to a deploy) retry on a changed ETag
+WRITE_ATTEMPTS = 5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    job_id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    module TEXT NOT NULL,
+    commit_sha TEXT,
+    plan_job_id TEXT,
+    recorded_at TEXT NOT NULL,
+    duration REAL,
+    adds INTEGER,
+    changes INTEGER,
+    destroys INTEGER,
+    terraform_version TEXT,
+    peak_rss_mb REAL,
+    peak_memory_mb REAL
+);
+CREATE TABLE IF NOT EXISTS resources (
+    job_id TEXT NOT NULL,
+    address TEXT NOT NULL,
+    type TEXT NOT NULL,
+    action TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS resources_address ON resources (address);
+CREATE INDEX IF NOT EXISTS resources_job ON resources (job_id);
+CREATE INDEX IF NOT EXISTS runs_kind ON runs (kind, recorded_at);
+"""
+# Columns added after the first partitions were written: name -> type
+ADDED_COLUMNS = {"peak_rss_mb": "REAL", "peak_memory_mb": "REAL"}
+
+
+class RunRecord(TypedDict):
+    """One plan or apply run."""
+
+    job_id: str
+    kind: str  # "plan" or "apply"
+    module: str
+    commit_sha: str
+    plan_job_id: str  # For applies: the plan job whose resources were applied
+    recorded_at: str
+    duration: float
+    adds: int
+    changes: int
+    destroys: int
+    terraform_version: str
+    peak_rss_mb: float  # RSS of the largest single process (terraform or a provider) the job ran
+    peak_memory_mb: float | None  # Combined cgroup memory peak of the job's terraform phases (None if unavailable)
+
+
+def history_key(module: str, month: str) -> str:
+    """S3 key of a module's history partition for a month (YYYY-MM)."""
+    return f"{HISTORY_PREFIX}{sanitize_module_path(module)}/{month}.sqlite"
+
+
+def _error_code(e: Exception) -> str:
+    return getattr(e, "response", {}).get("Error", {}).get("Code", "")
+
+
+def recent_months(count: int) -> list[str]:
+    """The current month and the count - 1 before it, as YYYY-MM (newest first)."""
+    now = datetime.now(UTC)
+    index = now.year * 12 + now.month - 1
+    return [f"{(index - i) // 12:04d}-{(index - i) % 12 + 1:02d}" for i in range(count)]
+
+
+def migrate(db: sqlite3.Connection, schema: str = "main") -> None:
+    """Add columns missing from a partition written by an older version."""
+    existing = {row[1] for row in db.execute(f"PRAGMA {schema}.table_info(runs)")}
+    for column, column_type in ADDED_COLUMNS.items():
+        if column not in existing:
+            db.execute(f"ALTER TABLE {schema}.runs ADD COLUMN {column} {column_type}")
+
+
+def download_partitions(s3_client, s3_resource: s3, module: str, months: int, dest_dir: str) -> list[tuple[str, Path]]:
+    """Download a module's partitions for the last months into dest_dir.
+
+    Returns:
+        (S3 key, local path) per partition that exists, newest first
+
+    Raises:
+        RuntimeError: If a download fails for a reason other than a missing partition
+    """
+    partitions = []
+    for month in recent_months(months):
+        key = history_key(module, month)
+        path = Path(dest_dir) / f"{month}.sqlite"
+        try:
+            s3_client.download_file(s3_resource["bucket"], key, str(path))
+        except s3_errors() as e:
+            if _error_code(e) in ("404", "NoSuchKey"):
+                continue  # No runs that month
+            raise RuntimeError(f"[S3 Download Error] Failed to download history partition: {e}\n  Key: {key}") from e
+        partitions.append((key, path))
+    return partitions
+
+
+def peak_memory(s3_client, s3_resource: s3, module: str, months: int = 2) -> float | None:
+    """Largest memory peak (MiB) recorded for a module's runs in the last months, or None without history.
+
+    Runs with a combined cgroup peak use it; older runs, or runs without
+    cgroup stats, fall back to their largest single process.
+
+    Raises:
+        RuntimeError: If a partition cannot be downloaded
+    """
+    peaks = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for _, path in download_partitions(s3_client, s3_resource, module, months, tmp_dir):
+            with sqlite3.connect(path) as db:
+                migrate(db)
+                peaks.append(db.execute("SELECT MAX(COALESCE(peak_memory_mb, peak_rss_mb)) FROM runs").fetchone()[0])
+            db.close()
+    peaks = [peak for peak in peaks if peak]
+    return max(peaks) if peaks else None
+
+
+def head_commit(module_dir: str) -> str:
+    """Commit checked out in the module's workspace ("" outside a checkout, e.g. after a restore)."""
+    result = subprocess.run(["git", "rev-parse", "HEAD"], cwd=module_dir, capture_output=True, text=True)
+    return result.stdout.strip() if result.returncode == 0 else ""
+
+
+def record_run(s3_client, s3_resource: s3, record: RunRecord, resources: list[dict]) -> str:
+    """Append a run and its resource changes to the module's partition for this month.
+
+    The partition is read, appended to locally and written back with a
+    conditional PUT (If-Match on the ETag read, If-None-Match for a new
+    partition), retried when another writer got there first.
+
+    Returns:
+        S3 key of the partition
+
+    Raises:
+        RuntimeError: If the partition cannot be read or written
+    """
+    key = history_key(record["module"], record["recorded_at"][:7])
+    bucket = s3_resource["bucket"]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = Path(tmp_dir) / "history.sqlite"
+        for _ in range(WRITE_ATTEMPTS):
+            db_path.unlink(missing_ok=True)
+            try:
+                response = s3_client.get_object(Bucket=bucket, Key=key)
+                db_path.write_bytes(response["Body"].read())
+                condition = {"IfMatch": response["ETag"]}
+            except s3_errors() as e:
+                if _error_code(e) not in ("NoSuchKey", "404"):
+                    raise RuntimeError(f"[S3 Download Error] Failed to read history partition: {e}\n  Key: {key}") from e
+                condition = {"IfNoneMatch": "*"}
+
+            with sqlite3.connect(db_path) as db:
+                db.executescript(SCHEMA)
+                migrate(db)
+                db.execute(
+                    f"INSERT OR REPLACE INTO runs ({', '.join(record)}) VALUES ({', '.join(f':{column}' for column in record)})",
+                    record,
+                )
+                db.execute("DELETE FROM resources WHERE job_id = ?", (record["job_id"],))
+                db.executemany(
+                    "INSERT INTO resources VALUES (?, ?, ?, ?)",
+                    [(record["job_id"], r["address"], r["type"], r["action"]) for r in resources],
+                )
+            db.close()
+
+            try:
+                s3_client.put_object(Bucket=bucket, Key=key, Body=db_path.read_bytes(), ContentType="application/vnd.sqlite3", **condition)
+                return key
+            except s3_errors() as e:
+                if _error_code(e) not in ("PreconditionFailed", "ConditionalRequestConflict", "412", "409"):
+                    raise RuntimeError(f"[S3 Upload Error] Failed to write history partition: {e}\n  Key: {key}") from e
+    raise RuntimeError(f"History partition {key} kept changing, gave up after {WRITE_ATTEMPTS} attempts")
+
+
+def new_record(kind: str, module: str, job_id: str, duration: float, **fields) -> RunRecord:
+    """Build a RunRecord for a module (repo-relative, e.g. 'tf/vault') with defaults for unknown fields."""
+    record: RunRecord = {
+        "job_id": job_id,
+        "kind": kind,
+        "module": module,
+        "commit_sha": "",
+        "plan_job_id": "",
+        "recorded_at": datetime.now(UTC).isoformat(timespec="seconds"),
+        "duration": round(duration, 3),
+        "adds": 0,
+        "changes": 0,
+        "destroys": 0,
+        "terraform_version": "",
+        # Windmill runs each job in its own process, so its children are this job's terraform runs.
+        # ru_maxrss (KiB on Linux) is the largest one of them, not their sum; callers pass peak_memory_mb
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+        "peak_memory_mb": None,
+    }
+    record.update(fields)
+    return record
@@ -0,0 +1,267 @@
+"""Shared timing instrumentation for Terraform pipeline scripts."""
+
+import base64
+import json
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager
+from functools import cache
+from pathlib import Path
+
+# Optional exporters, enabled by worker environment variables
+PUSHGATEWAY_URL_ENV = "TF_PIPELINE_PUSHGATEWAY_URL"
+OTLP_FILE_ENV = "TF_PIPELINE_OTLP_FILE"
+EXPORT_TIMEOUT = 5  # seconds
+
+PHASE_DURATION_METRIC = "terraform_pipeline_phase_duration_seconds"
+PROCESS_CPU_METRIC = "terraform_pipeline_process_cpu_seconds"
+PROCESS_LARGEST_RSS_METRIC = "terraform_pipeline_process_largest_rss_bytes"
+PROCESS_PEAK_MEMORY_METRIC = "terraform_pipeline_process_peak_memory_bytes"
+
+CGROUP_ROOT = Path("/sys/fs/cgroup")
+MIB = 1024 * 1024
+
+# RUSAGE_CHILDREN is process-wide: process spans that overlap in other threads
+# (detect_drift plans modules on a thread pool) see each other's children
+_process_spans_lock = threading.Lock()
+_process_spans = {"active": 0, "started": 0}
+
+
+@cache
+def _memory_peak_file() -> Path | None:
+    """The high-water mark of this job's memory cgroup: memory.peak (v2) or memory.max_usage_in_bytes (v1)."""
+    try:
+        lines = Path("/proc/self/cgroup").read_text().splitlines()
+    except OSError:
+        return None
+    candidates = []
+    for line in lines:
+        _, controllers, path = line.split(":", 2)
+        if not controllers:
+            candidates.append(CGROUP_ROOT / path.lstrip("/") / "memory.peak")
+        elif "memory" in controllers.split(","):
+            candidates.append(CGROUP_ROOT / "memory" / path.lstrip("/") / "memory.max_usage_in_bytes")
+    return next((candidate for candidate in candidates if candidate.exists()), None)
+
+
+def _open_memory_peak(shared: bool):
+    """Open the cgroup memory high-water mark, reset to current usage; None if unavailable.
+
+    Resetting memory.peak only affects the open descriptor (Linux 6.12+), so
+    concurrent spans keep their own peaks. memory.max_usage_in_bytes resets
+    for every reader, so it is not used while another span is active (shared).
+    """
+    path = _memory_peak_file()
+    if not path or (shared and path.name != "memory.peak"):
+        return None
+    try:
+        peak = open(path, "r+b", buffering=0)  # noqa: SIM115 - closed by _close_memory_peak
+    except OSError:
+        return None
+    try:
+        peak.write(b"reset\n" if path.name == "memory.peak" else b"0")
+    except OSError:
+        peak.close()
+        return None
+    return peak
+
+
+def _close_memory_peak(peak) -> float | None:
+    """Read the peak (MiB) since _open_memory_peak and close the descriptor."""
+    if not peak:
+        return None
+    try:
+        peak.seek(0)
+        return int(peak.read().split()[0]) / MIB
+    except (OSError, ValueError, IndexError):
+        return None
+    finally:
+        peak.close()
+
+
+class Timings:
+    """Collect wall-clock durations of named pipeline phases.
+
+    Usage:
+        timings = Timings()
+        with timings.span("plan"):
+            subprocess.run(...)
+        return {..., "timings": timings.as_dict()}
+
+    Repeated spans with the same name are accumulated. Phases that run
+    terraform use process_span to also record the CPU and memory of the
+    processes they start.
+    """
+
+    def __init__(self) -> None:
+        self._durations: dict[str, float] = {}
+        self._usage: dict[str, dict[str, float]] = {}
+
+    @contextmanager
+    def span(self, phase: str):
+        """Time the enclosed block as `phase`, recording it even if the block raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._durations[phase] = self._durations.get(phase, 0.0) + time.perf_counter() - start
+
+    @contextmanager
+    def process_span(self, phase: str):
+        """Time the enclosed block as `phase` and record the resource usage of the subprocesses it waits for.
+
+        Uses getrusage(RUSAGE_CHILDREN), which covers terraform and the
+        provider plugins it reaps. CPU seconds are exact per phase (summed
+        over retries). largest_process_rss_mb is the largest single process
+        the job has waited for so far, not terraform and its providers
+        together. Where the job's memory cgroup exposes a resettable
+        high-water mark, peak_memory_mb is the combined peak of the cgroup
+        during the phase: terraform, the providers running next to it and
+        the job itself. If another process span ran at the same time in this
+        process (another thread), the phase is marked aggregate: its numbers
+        include that span's subprocesses too.
+        """
+        with _process_spans_lock:
+            aggregate = _process_spans["active"] > 0
+            _process_spans["active"] += 1
+            _process_spans["started"] += 1
+            started = _process_spans["started"]
+        start = time.perf_counter()
+        before = resource.getrusage(resource.RUSAGE_CHILDREN)
+        peak = _open_memory_peak(shared=aggregate)
+        try:
+            with self.span(phase):
+                yield
+        finally:
+            after = resource.getrusage(resource.RUSAGE_CHILDREN)
+            peak_memory_mb = _close_memory_peak(peak)
+            with _process_spans_lock:
+                _process_spans["active"] -= 1
+                aggregate = aggregate or _process_spans["started"] != started
+            usage = self._usage.setdefault(phase, {"wall_seconds": 0.0, "user_cpu_seconds": 0.0, "system_cpu_seconds": 0.0, "largest_process_rss_mb": 0.0, "aggregate": False})
+            usage["wall_seconds"] += time.perf_counter() - start
+            usage["user_cpu_seconds"] += after.ru_utime - before.ru_utime
+            usage["system_cpu_seconds"] += after.ru_stime - before.ru_stime
+            # ru_maxrss is in KiB on Linux
+            usage["largest_process_rss_mb"] = max(usage["largest_process_rss_mb"], after.ru_maxrss / 1024)
+            if peak_memory_mb is not None:
+                usage["peak_memory_mb"] = max(usage.get("peak_memory_mb", 0.0), peak_memory_mb)
+            usage["aggregate"] = usage["aggregate"] or aggregate
+
+    def as_dict(self) -> dict[str, float]:
+        """Return phase durations in seconds, rounded to milliseconds."""
+        return {phase: round(duration, 3) for phase, duration in self._durations.items()}
+
+    def usage_as_dict(self) -> dict[str, dict[str, float | bool]]:
+        """Return wall time, user/system CPU seconds, memory (MiB) and the aggregate flag per process_span phase."""
+        return {phase: {name: value if isinstance(value, bool) else round(value, 3 if name.endswith("seconds") else 1) for name, value in usage.items()} for phase, usage in self._usage.items()}
+
+    def peak_memory_mb(self) -> float | None:
+        """Largest combined cgroup memory peak (MiB) over the process spans, or None where it could not be read."""
+        peaks = [usage["peak_memory_mb"] for usage in self._usage.values() if "peak_memory_mb" in usage]
+        return round(max(peaks), 1) if peaks else None
+
+    def export(self, script: str, **labels: str) -> None:
+        """Export timings to the configured exporters.
+
+        Exports are best-effort: failures are logged but never fail the script.
+
+        Args:
+            script: Script name (e.g., "terraform_plan")
+            **labels: Extra metric labels (e.g., module="tf/vault")
+        """
+        samples = self._samples()
+        if not samples:
+            return
+
+        labels = {"script": script, **{key: str(value) for key, value in labels.items() if value}}
+
+        pushgateway_url = os.environ.get(PUSHGATEWAY_URL_ENV)
+        if pushgateway_url:
+            try:
+                _push_to_gateway(pushgateway_url, samples, labels)
+            except OSError as e:
+                print(f"[Metrics Warning] Failed to push timings to Pushgateway (non-fatal): {e}")
+
+        otlp_file = os.environ.get(OTLP_FILE_ENV)
+        if otlp_file:
+            try:
+                _append_otlp_json(otlp_file, samples, labels)
+            except OSError as e:
+                print(f"[Metrics Warning] Failed to write timings to {otlp_file} (non-fatal): {e}")
+
+    def _samples(self) -> list[tuple[str, str, dict[str, str], float]]:
+        """(metric, unit, point labels, value) for every phase duration and process usage."""
+        samples = [(PHASE_DURATION_METRIC, "s", {"phase": phase}, duration) for phase, duration in self.as_dict().items()]
+        for phase, usage in self.usage_as_dict().items():
+            aggregate = str(usage["aggregate"]).lower()
+            samples.append((PROCESS_CPU_METRIC, "s", {"phase": phase, "mode": "user", "aggregate": aggregate}, usage["user_cpu_seconds"]))
+            samples.append((PROCESS_CPU_METRIC, "s", {"phase": phase, "mode": "system", "aggregate": aggregate}, usage["system_cpu_seconds"]))
+            samples.append((PROCESS_LARGEST_RSS_METRIC, "By", {"phase": phase, "aggregate": aggregate}, usage["largest_process_rss_mb"] * MIB))
+            if "peak_memory_mb" in usage:
+                samples.append((PROCESS_PEAK_MEMORY_METRIC, "By", {"phase": phase, "aggregate": aggregate}, usage["peak_memory_mb"] * MIB))
+        return samples
+
+
+def _escape_label_value(value: str) -> str:
+    """Escape a Prometheus text-format label value."""
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _push_to_gateway(url: str, samples: list[tuple[str, str, dict[str, str], float]], labels: dict[str, str]) -> None:
+    """Push samples to a Prometheus Pushgateway.
+
+    Metrics are grouped by every label so runs of different scripts/modules
+    don't replace each other. Label values are base64url-encoded in the
+    grouping path since module paths contain slashes.
+    """
+    import urllib.request  # Only needed when a Pushgateway is configured
+
+    grouping = "".join(f"/{key}@base64/{base64.urlsafe_b64encode(value.encode()).decode()}" for key, value in labels.items())
+    lines = []
+    for metric in dict.fromkeys(metric for metric, _, _, _ in samples):
+        lines.append(f"# TYPE {metric} gauge")
+        for _, _, point_labels, value in (sample for sample in samples if sample[0] == metric):
+            label_text = ",".join(f'{key}="{_escape_label_value(label)}"' for key, label in {**labels, **point_labels}.items())
+            lines.append(f"{metric}{{{label_text}}} {value}")
+
+    request = urllib.request.Request(
+        f"{url.rstrip('/')}/metrics/job/terraform_pipeline{grouping}",
+        data=("\n".join(lines) + "\n").encode(),
+        headers={"Content-Type": "text/plain; version=0.0.4"},
+        method="PUT",
+    )
+    with urllib.request.urlopen(request, timeout=EXPORT_TIMEOUT):
+        pass
+
+
+def _append_otlp_json(path: str, samples: list[tuple[str, str, dict[str, str], float]], labels: dict[str, str]) -> None:
+    """Append samples as one OTLP/JSON line (readable by the collector's otlpjsonfile receiver)."""
+    now = str(time.time_ns())
+    metrics: dict[str, dict] = {}
+    for metric, unit, point_labels, value in samples:
+        data_points = metrics.setdefault(metric, {"name": metric, "unit": unit, "gauge": {"dataPoints": []}})["gauge"]["dataPoints"]
+        data_points.append(
+            {
+                "asDouble": value,
+                "timeUnixNano": now,
+                "attributes": [{"key": key, "value": {"stringValue": label}} for key, label in {**labels, **point_labels}.items()],
+            }
+        )
+    record = {
+        "resourceMetrics": [
+            {
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "windmill-terraform"}}]},
+                "scopeMetrics": [
+                    {
+                        "scope": {"name": "f.terraform.instrumentation"},
+                        "metrics": list(metrics.values()),
+                    },
+                ],
+            },
+        ],
+    }
+    with open(path, "a") as f:
+        f.write(json.dumps(record) + "\n")
@@ -0,0 +1,164 @@
+"""Dependency graph between Terraform modules under tf/."""
+# requirements:
+# pyyaml
+
+import re
+from pathlib import Path
+
+# Declared edges and exclusions, relative to the repository root
+OVERRIDES_FILE = "tf/dependencies.yaml"
+MODULES_DIR = "tf"
+
+BLOCK_RE = re.compile(r'^(data|resource)\s+"([^"]+)"\s+"([^"]+)"\s*\{', re.MULTILINE)
+ATTRIBUTE_RE = re.compile(r'^\s*(\w+)\s*=\s*"([^"]*)"', re.MULTILINE)
+INTERPOLATION_RE = re.compile(r"\$\{[^}]*\}")
+# State keys written by terraform_init: {prefix}/terraform/{module_path}/terraform.tfstate
+STATE_KEY_RE = re.compile(r"terraform/(.+)/terraform\.tfstate$")
+# Paths climbing out of the module, e.g. "${path.module}/../../cloudflare/worker.js" or source = "../modules/x";
+# the second group is set when an interpolation cuts the path short
+RELATIVE_PATH_RE = re.compile(r'"(?:\$\{path\.(?:module|root)\}/)?(\.\./[^"$]*)(\$?)')
+
+
+def _blocks(text: str):
+    """Yield (kind, type, body) for each top-level data/resource block in HCL text."""
+    for match in BLOCK_RE.finditer(text):
+        depth, pos = 1, match.end()
+        while depth and pos < len(text):
+            depth += {"{": 1, "}": -1}.get(text[pos], 0)
+            pos += 1
+        yield match.group(1), match.group(2), text[match.end() : pos - 1]
+
+
+def _secret_pattern(mount: str, name: str) -> re.Pattern:
+    """Match a KV path, treating interpolations like ${var.x} as wildcards."""
+    parts = INTERPOLATION_RE.split(f"{mount}/{name}")
+    return re.compile("[^/]+".join(re.escape(part) for part in parts) + "$")
+
+
+def scan_module(module_dir: Path) -> dict:
+    """Collect the cross-module references of one module.
+
+    Returns:
+        dict with:
+            - reads: Vault KV paths read via data "vault_kv_secret_v2"
+            - writes: Patterns of Vault KV paths written via resource "vault_kv_secret_v2"
+            - remote_state: Module paths read via data "terraform_remote_state"
+    """
+    reads, writes, remote_state = set(), [], set()
+    for tf_file in sorted(module_dir.glob("*.tf")):
+        for kind, block_type, body in _blocks(tf_file.read_text()):
+            attributes = dict(ATTRIBUTE_RE.findall(body))
+            if block_type == "vault_kv_secret_v2" and "name" in attributes:
+                mount = attributes.get("mount", "secret")
+                if kind == "data":
+                    reads.add(f"{mount}/{attributes['name']}")
+                else:
+                    writes.append(_secret_pattern(mount, attributes["name"]))
+            elif kind == "data" and block_type == "terraform_remote_state":
+                key = STATE_KEY_RE.search(attributes.get("key", ""))
+                if key:
+                    remote_state.add(key.group(1))
+    return {"reads": reads, "writes": writes, "remote_state": remote_state}
+
+
+def external_files(module_dir: Path, repo_root: Path) -> list[Path]:
+    """Files in the repository outside module_dir that the module reads through ../ paths.
+
+    Covers file references and local module sources. A path cut short by an
+    interpolation counts as its directory, unless that directory contains
+    the module itself.
+    """
+    module_dir, repo_root = module_dir.resolve(), repo_root.resolve()
+    files: set[Path] = set()
+    for tf_file in sorted(module_dir.glob("*.tf")):
+        for reference, cut in RELATIVE_PATH_RE.findall(tf_file.read_text()):
+            path = (module_dir / (reference.rsplit("/", 1)[0] if cut else reference)).resolve()
+            if not path.is_relative_to(repo_root) or path.is_relative_to(module_dir) or module_dir.is_relative_to(path):
+                continue
+            if path.is_file():
+                files.add(path)
+            elif path.is_dir():
+                files.update(child for child in path.rglob("*") if child.is_file() and not {".git", ".terraform"} & set(child.parts))
+    return sorted(files)
+
+
+def load_overrides(repo_root: Path) -> dict:
+    """Load declared dependencies and exclusions (missing file means none)."""
+    import yaml
+
+    path = repo_root / OVERRIDES_FILE
+    if not path.exists():
+        return {"depends_on": {}, "exclude": []}
+    data = yaml.safe_load(path.read_text()) or {}
+    return {"depends_on": data.get("depends_on") or {}, "exclude": data.get("exclude") or []}
+
+
+def build_graph(repo_root: str) -> dict[str, set[str]]:
+    """Map each module (e.g. 'tf/grafana') to the modules it depends on.
+
+    Edges come from terraform_remote_state data sources, Vault KV secrets read
+    by one module and written by another, and the depends_on overrides.
+    """
+    root = Path(repo_root)
+    overrides = load_overrides(root)
+    excluded = set(overrides["exclude"])
+    modules = {
+        path.relative_to(root).as_posix(): scan_module(path)
+        for path in sorted((root / MODULES_DIR).iterdir())
+        if path.is_dir() and any(path.glob("*.tf")) and path.relative_to(root).as_posix() not in excluded
+    }
+
+    graph: dict[str, set[str]] = {module: set() for module in modules}
+    for module, refs in modules.items():
+        graph[module] |= {upstream for upstream in refs["remote_state"] if upstream in modules}
+        for secret in refs["reads"]:
+            graph[module] |= {writer for writer, writer_refs in modules.items() if writer != module and any(pattern.match(secret) for pattern in writer_refs["writes"])}
+
+    for module, upstreams in overrides["depends_on"].items():
+        if module not in graph:
+            raise ValueError(f"{OVERRIDES_FILE}: unknown module {module}")
+        unknown = set(upstreams) - set(graph)
+        if unknown:
+            raise ValueError(f"{OVERRIDES_FILE}: {module} depends on unknown modules {sorted(unknown)}")
+        graph[module] |= set(upstreams)
+    return graph
+
+
+def upstream_closure(graph: dict[str, set[str]], module: str) -> set[str]:
+    """Return every module that module depends on, directly or transitively."""
+    seen: set[str] = set()
+    stack = list(graph.get(module, ()))
+    while stack:
+        upstream = stack.pop()
+        if upstream not in seen:
+            seen.add(upstream)
+            stack.extend(graph.get(upstream, ()))
+    return seen
+
+
+def waves(graph: dict[str, set[str]], modules: list[str] | None = None) -> list[list[str]]:
+    """Group modules into waves; every module runs after all its upstreams' waves.
+
+    When modules is given, only those are scheduled, but ordering still follows
+    dependencies through unselected modules.
+
+    Raises:
+        ValueError: If a module is unknown or the graph has a cycle
+    """
+    selected = set(modules) if modules else set(graph)
+    unknown = selected - set(graph)
+    if unknown:
+        raise ValueError(f"Unknown modules: {sorted(unknown)}")
+
+    pending = {module: upstream_closure(graph, module) & selected for module in selected}
+    result = []
+    while pending:
+        ready = sorted(module for module, upstreams in pending.items() if not upstreams)
+        if not ready:
+            raise ValueError(f"Dependency cycle between modules: {sorted(pending)}")
+        result.append(ready)
+        for module in ready:
+            del pending[module]
+        for upstreams in pending.values():
+            upstreams.difference_update(ready)
+    return result
@@ -2,6 +2,7 @@
 # requirements:
 # wmill
 # requests
+# boto3
 
 import logging
 import os
@@ -9,8 +10,8 @@ from datetime import UTC, datetime
 from typing import TypedDict
 from urllib.parse import urlparse, urlunparse
 
-import requests
-import wmill
+from f.terraform.instrumentation import Timings
+from f.terraform.s3_artifacts import OutputRef, resolve_output
 
 # Configure logging for Windmill
 logger = logging.getLogger(__name__)
@@ -37,6 +38,18 @@ class c_discord_bot_token_configuration(TypedDict):  # noqa: N801
     channel_id: str
 
 
+class s3(TypedDict):  # noqa: N801
+    """S3 resource type (name matches Windmill resource)."""
+
+    bucket: str
+    region: str
+    endPoint: str
+    accessKey: str
+    secretKey: str
+    useSSL: bool
+    pathStyle: bool
+
+
 def make_public_url(internal_url: str) -> str:
     """Transform internal Windmill URL to public tunnel URL.
 
@@ -69,7 +82,9 @@ def main(
     discord_bot_token: c_discord_bot_token_configuration,
     module: str,
     plan_summary: str,
-    plan_details: str,
+    plan_details: str | OutputRef,
+    s3_resource: s3 | None = None,
+    plan_digest: str | None = None,
 ) -> dict[str, str | bool]:
     """Send approval notification with Link buttons to Discord.
 
@@ -90,12 +105,21 @@ def main(
         discord_bot_token: Discord bot token and channel configuration
         module: Terraform module name
         plan_summary: Short summary of plan changes
-        plan_details: Full plan output
+        plan_details: Full plan output, or an S3 output reference from terraform_plan
+        s3_resource: S3 resource used to resolve an offloaded plan_details (optional)
+        plan_digest: Grouped change digest from terraform_plan (digest.text); shown
+                     instead of plan_details when given (optional)
 
     Returns:
-        dict with message_id and notification status
+        dict with message_id, notification status and per-phase timings
 
     """
+    # Deferred so importing this module (e.g. for make_public_url) doesn't load the SDK and HTTP client
+    import requests
+    import wmill
+
+    timings = Timings()
+
     # Get flow job ID and workspace from Windmill environment variables
     run_id = os.environ.get("WM_FLOW_JOB_ID") or os.environ.get("WM_JOB_ID")
     workspace = os.environ.get("WM_WORKSPACE", "terraform-gitops")
@@ -107,7 +131,8 @@ def main(
 
     # Get internal resume/cancel/approval URLs from Windmill SDK
     try:
-        urls = wmill.get_resume_urls()
+        with timings.span("resume_urls"):
+            urls = wmill.get_resume_urls()
     except Exception as e:
         msg = f"Failed to get resume URLs from Windmill SDK: {e}"
         raise RuntimeError(msg) from e
@@ -124,7 +149,17 @@ def main(
     public_approval_page = make_public_url(urls.get("approvalPage", urls["resume"]))
 
     # Truncate plan details to fit in Discord embed
-    truncated_details = plan_details[:DISCORD_EMBED_FIELD_LIMIT] + "..." if len(plan_details) > DISCORD_EMBED_FIELD_LIMIT else plan_details
+    # The digest lists what changes across the whole plan; the raw output is only the first screenful
+    if plan_digest:
+        details_size = len(plan_digest)
+        truncated_details = plan_digest[:DISCORD_EMBED_FIELD_LIMIT]
+    else:
+        # Offloaded plans are fetched with a ranged GET for just the characters we display
+        details_size = plan_details["size"] if isinstance(plan_details, dict) else len(plan_details)
+        with timings.span("resolve_details"):
+            truncated_details = resolve_output(plan_details, s3_resource, limit=DISCORD_EMBED_FIELD_LIMIT)
+    if details_size > DISCORD_EMBED_FIELD_LIMIT:
+        truncated_details += "..."
 
     # Build button components
     buttons = [
@@ -185,12 +220,13 @@ def main(
 
     # Send Discord message with proper error handling for network issues
     try:
-        response = requests.post(
-            f"https://discord.com/api/v10/channels/{discord_bot_token['channel_id']}/messages",
-            headers={"Authorization": f"Bot {discord_bot_token['token']}", "Content-Type": "application/json"},
-            json=payload,
-            timeout=DISCORD_API_TIMEOUT,
-        )
+        with timings.span("discord"):
+            response = requests.post(
+                f"https://discord.com/api/v10/channels/{discord_bot_token['channel_id']}/messages",
+                headers={"Authorization": f"Bot {discord_bot_token['token']}", "Content-Type": "application/json"},
+                json=payload,
+                timeout=DISCORD_API_TIMEOUT,
+            )
     except requests.exceptions.Timeout:
         msg = f"Discord API request timed out after {DISCORD_API_TIMEOUT}s"
         raise RuntimeError(msg) from None
@@ -216,4 +252,5 @@ def main(
         raise RuntimeError(msg)
 
     logger.info("Discord notification sent successfully, message_id=%s", message_id)
-    return {"message_id": message_id, "notified": True}
+    timings.export("notify_approval", module=module)
+    return {"message_id": message_id, "notified": True, "timings": timings.as_dict()}
@@ -4,6 +4,8 @@ from datetime import datetime
 from typing import Optional, TypedDict
 
 import requests
+from f.terraform.instrumentation import Timings
+from f.terraform.s3_artifacts import OutputRef, resolve_output
 
 # Discord API limits
 DISCORD_EMBED_FIELD_LIMIT = 1000
@@ -20,13 +22,24 @@ class c_discord_bot_token_configuration(TypedDict):
     channel_id: str
 
 
+class s3(TypedDict):
+    bucket: str
+    region: str
+    endPoint: str
+    accessKey: str
+    secretKey: str
+    useSSL: bool
+    pathStyle: bool
+
+
 def main(
     discord: discord_bot_configuration,
     discord_bot_token: c_discord_bot_token_configuration,
     module: str,
     status: str,
-    details: str,
+    details: str | OutputRef,
     approval_message_id: Optional[str] = None,
+    s3_resource: Optional[s3] = None,
 ):
     """
     Send status notification to Discord and optionally update the approval message.
@@ -36,12 +49,14 @@ def main(
         discord_bot_token: Discord bot token and channel configuration
         module: Terraform module name
         status: Status ("success" or "failed")
-        details: Status details/message
+        details: Status details/message, or an S3 output reference (e.g. apply output)
         approval_message_id: Optional message ID of the approval notification to update
+        s3_resource: S3 resource used to resolve offloaded details (optional)
 
     Returns:
-        dict with notification status
+        dict with notification status and per-phase timings
     """
+    timings = Timings()
     config = {
         "success": {
             "title": "✅ Terraform Apply Complete",
@@ -60,11 +75,10 @@ def main(
     status_config = config.get(status, config["failed"])
 
     # Truncate details to fit in Discord
-    truncated_details = (
-        details[:DISCORD_EMBED_FIELD_LIMIT] + "..."
-        if len(details) > DISCORD_EMBED_FIELD_LIMIT
-        else details
-    )
+    details_size = details["size"] if isinstance(details, dict) else len(details)
+    truncated_details = resolve_output(details, s3_resource, limit=DISCORD_EMBED_FIELD_LIMIT)
+    if details_size > DISCORD_EMBED_FIELD_LIMIT:
+        truncated_details += "..."
 
     # Send new status notification
     payload = {
@@ -80,29 +94,33 @@ def main(
         ]
     }
 
-    response = requests.post(
-        f"https://discord.com/api/v10/channels/{discord_bot_token['channel_id']}/messages",
-        headers={"Authorization": f"Bot {discord_bot_token['token']}", "Content-Type": "application/json"},
-        json=payload,
-        timeout=DISCORD_API_TIMEOUT,
-    )
+    with timings.span("discord"):
+        response = requests.post(
+            f"https://discord.com/api/v10/channels/{discord_bot_token['channel_id']}/messages",
+            headers={"Authorization": f"Bot {discord_bot_token['token']}", "Content-Type": "application/json"},
+            json=payload,
+            timeout=DISCORD_API_TIMEOUT,
+        )
 
     if not response.ok:
         raise Exception(f"Discord API failed: {response.status_code} - {response.text}")
 
     # Update original approval message if provided
     if approval_message_id:
-        _update_approval_message(
-            discord_bot_token=discord_bot_token,
-            message_id=approval_message_id,
-            title=status_config["approval_title"],
-            status_text=status_config["approval_status"],
-            details=truncated_details,
-            color=status_config["color"],
-            module=module,
-        )
-
-    return {"notified": True}
+        with timings.span("discord_update"):
+            _update_approval_message(
+                discord_bot_token=discord_bot_token,
+                message_id=approval_message_id,
+                title=status_config["approval_title"],
+                status_text=status_config["approval_status"],
+                details=truncated_details,
+                color=status_config["color"],
+                module=module,
+            )
+
+    timings.export("notify_status", module=module, status=status)
+
+    return {"notified": True, "timings": timings.as_dict()}
 
 
 def _update_approval_message(
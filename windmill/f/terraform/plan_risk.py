@@ -0,0 +1,185 @@
+"""Score Terraform plans against per-module approval rules and digest their changes."""
+# requirements:
+# pyyaml
+
+import json
+import subprocess
+from pathlib import Path
+from typing import TypedDict
+
+# Per-module rules, next to the module's .tf files (tf/<module>/approval.yaml):
+#
+#   auto_approve:
+#     create: [grafana_folder, vault_policy]   # Resource types that may be added without approval
+#   max_changes: 20                            # Larger plans always need approval (default below)
+#
+# Modules without the file never auto-approve.
+RULES_FILE = "approval.yaml"
+DEFAULT_MAX_CHANGES = 20
+
+# Points per resource change; a plan is auto-approved only when every change scores 0
+ACTION_SCORES = {"create": 1, "update": 3, "delete": 10, "replace": 10, "forget": 5}
+
+# Digest bounds: output size stays fixed however large the plan is
+DIGEST_ADDRESSES = 5  # Example addresses kept per (type, action) group
+DIGEST_ATTRIBUTES = 8  # Changed attribute names kept per updated resource
+DIGEST_GROUPS = 30  # Groups returned and rendered, most destructive first
+# Rendering order and symbols, matching terraform's plan output
+DIGEST_ACTIONS = {"delete": "-", "replace": "-/+", "update": "~", "forget": ".", "create": "+"}
+
+
+class DigestGroup(TypedDict):
+    """Changes of one resource type and action."""
+
+    type: str
+    action: str
+    count: int
+    addresses: list[str]  # First DIGEST_ADDRESSES
+    attributes: dict[str, list[str]]  # Updates only: changed attributes of the example addresses
+
+
+class Digest(TypedDict):
+    """Compact, bounded summary of a plan's resource changes."""
+
+    total: int
+    groups: list[DigestGroup]  # First DIGEST_GROUPS
+    omitted_groups: int  # Groups beyond DIGEST_GROUPS (still counted in total)
+    text: str
+
+
+class Risk(TypedDict):
+    """Risk assessment of a plan."""
+
+    score: int
+    auto_approve: bool
+    reasons: list[str]
+    changes: dict[str, dict[str, int]]
+
+
+def load_rules(module_dir: str) -> dict:
+    """Return the module's approval rules ({} if it has none).
+
+    Raises:
+        ValueError: If the rules file is not valid YAML
+    """
+    rules_file = Path(module_dir) / RULES_FILE
+    if not rules_file.exists():
+        return {}
+    import yaml  # Only modules with rules pay for it
+
+    try:
+        return yaml.safe_load(rules_file.read_text()) or {}
+    except yaml.YAMLError as e:
+        raise ValueError(f"Invalid {rules_file}: {e}") from e
+
+
+def _action(actions: list[str]) -> str | None:
+    """Collapse a plan's action list to one action (None for no-op/read)."""
+    if "delete" in actions and "create" in actions:
+        return "replace"
+    return next((action for action in actions if action in ACTION_SCORES), None)
+
+
+def resource_actions(plan: dict) -> list[dict]:
+    """Return the changed resources of a `terraform show -json` plan as {address, type, action}."""
+    resources = []
+    for resource in plan.get("resource_changes", []):
+        action = _action(resource.get("change", {}).get("actions", []))
+        if action:
+            resources.append({"address": resource.get("address", ""), "type": resource.get("type", ""), "action": action})
+    return resources
+
+
+def assess(plan: dict, rules: dict) -> Risk:
+    """Index a `terraform show -json` plan by resource type and action, and score it.
+
+    Returns:
+        Risk with the total score, whether the plan may skip approval, the
+        reasons it may not, and change counts as {type: {action: count}}
+    """
+    allowed = set(rules.get("auto_approve", {}).get("create", []))
+    max_changes = rules.get("max_changes", DEFAULT_MAX_CHANGES)
+
+    changes: dict[str, dict[str, int]] = {}
+    score = 0
+    reasons = []
+    for resource in resource_actions(plan):
+        action = resource["action"]
+        counts = changes.setdefault(resource["type"], {})
+        counts[action] = counts.get(action, 0) + 1
+        if action == "create" and resource["type"] in allowed:
+            continue
+        score += ACTION_SCORES[action]
+        reasons.append(f"{action}: {resource['address']}")
+
+    total = sum(sum(counts.values()) for counts in changes.values())
+    if not rules:
+        reasons.insert(0, f"no {RULES_FILE} for this module")
+    if total > max_changes:
+        reasons.insert(0, f"{total} changes exceed max_changes={max_changes}")
+    return {"score": score, "auto_approve": bool(rules) and total > 0 and not reasons, "reasons": reasons, "changes": changes}
+
+
+def _changed_attributes(change: dict) -> list[str]:
+    """Top-level attributes an update changes (names only, so sensitive values never leave the plan)."""
+    before, after = change.get("before") or {}, change.get("after") or {}
+    unknown = change.get("after_unknown") or {}
+    return sorted(key for key in before.keys() | after.keys() | unknown.keys() if unknown.get(key) or before.get(key) != after.get(key))
+
+
+def digest(plan: dict) -> Digest:
+    """Group a `terraform show -json` plan's changes by resource type and action in one pass.
+
+    Only counts and the first few addresses per group are kept, with the
+    changed attribute names for updates, for at most DIGEST_GROUPS groups.
+    The result is bounded; the parsed plan passed in is not (see read_plan).
+    """
+    groups: dict[tuple[str, str], DigestGroup] = {}
+    total = 0
+    for resource in plan.get("resource_changes", []):
+        change = resource.get("change", {})
+        action = _action(change.get("actions", []))
+        if not action:
+            continue
+        total += 1
+        group = groups.setdefault(
+            (resource.get("type", ""), action),
+            {"type": resource.get("type", ""), "action": action, "count": 0, "addresses": [], "attributes": {}},
+        )
+        group["count"] += 1
+        if len(group["addresses"]) < DIGEST_ADDRESSES:
+            address = resource.get("address", "")
+            group["addresses"].append(address)
+            if action == "update":
+                group["attributes"][address] = _changed_attributes(change)[:DIGEST_ATTRIBUTES]
+
+    order = list(DIGEST_ACTIONS)
+    ordered = sorted(groups.values(), key=lambda group: (order.index(group["action"]), -group["count"], group["type"]))
+    kept, omitted = ordered[:DIGEST_GROUPS], len(ordered) - DIGEST_GROUPS
+    lines = []
+    for group in kept:
+        lines.append(f"{DIGEST_ACTIONS[group['action']]} {group['type']} ({group['count']} {group['action']})")
+        for address in group["addresses"]:
+            attributes = group["attributes"].get(address)
+            lines.append(f"    {address}" + (f": {', '.join(attributes)}" if attributes else ""))
+        if group["count"] > len(group["addresses"]):
+            lines.append(f"    ... {group['count'] - len(group['addresses'])} more")
+    if omitted > 0:
+        lines.append(f"... {omitted} more resource types")
+    return {"total": total, "groups": kept, "omitted_groups": max(omitted, 0), "text": "\n".join(lines)}
+
+
+def read_plan(module_dir: str, env: dict, terraform_bin: str = "terraform") -> dict:
+    """Return the module's saved tfplan as JSON (`terraform show -json tfplan`).
+
+    The whole document is parsed in memory, so memory grows with plan size
+    (roughly the JSON size a few times over); only what is derived from it
+    (digest, risk, history resources) is bounded or compact.
+
+    Raises:
+        RuntimeError: If the plan cannot be read
+    """
+    result = subprocess.run([terraform_bin, "show", "-json", "tfplan"], cwd=module_dir, capture_output=True, text=True, env=env)
+    if result.returncode != 0:
+        raise RuntimeError(f"Terraform show -json failed (exit {result.returncode}):\n{result.stderr}")
+    return json.loads(result.stdout)
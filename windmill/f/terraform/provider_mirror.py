@@ -0,0 +1,64 @@
+"""Terraform provider network mirror hosted in the artifacts S3 bucket."""
+
+import re
+import tempfile
+from pathlib import Path
+
+from f.terraform.s3_artifacts import s3
+
+# Network mirror layout (see scripts/sync-provider-mirror.py):
+#   terraform-providers/<hostname>/<namespace>/<type>/index.json
+#   terraform-providers/<hostname>/<namespace>/<type>/<version>.json
+#   terraform-providers/<hostname>/<namespace>/<type>/<archive>.zip
+MIRROR_PREFIX = "terraform-providers/"
+# Overrides the URL derived from the S3 resource (e.g. for a CDN or ingress in front of MinIO)
+MIRROR_URL_ENV = "TF_PROVIDER_MIRROR_URL"
+# Providers served by the mirror; anything else is installed directly
+MIRRORED_HOSTS = ("registry.terraform.io",)
+
+LOCK_PROVIDER_RE = re.compile(r'^provider\s+"([^"]+)"\s*\{(.*?)^\}', re.MULTILINE | re.DOTALL)
+LOCK_VERSION_RE = re.compile(r'^\s*version\s*=\s*"([^"]+)"', re.MULTILINE)
+
+
+def parse_lock_file(text: str) -> dict[str, str]:
+    """Return {provider address: version} from a .terraform.lock.hcl."""
+    providers = {}
+    for address, body in LOCK_PROVIDER_RE.findall(text):
+        version = LOCK_VERSION_RE.search(body)
+        if version:
+            providers[address] = version.group(1)
+    return providers
+
+
+def mirror_url(s3_resource: s3) -> str:
+    """Path-style HTTPS URL of the mirror prefix in the bucket (Terraform requires HTTPS)."""
+    return f"{s3_resource['endPoint'].rstrip('/')}/{s3_resource['bucket']}/{MIRROR_PREFIX}"
+
+
+def write_cli_config(url: str) -> str:
+    """Write a Terraform CLI config that installs registry providers from the mirror.
+
+    The file lives outside the workspace so it never ends up in checkpoints.
+
+    Returns:
+        Path to use as TF_CLI_CONFIG_FILE
+    """
+    patterns = ", ".join(f'"{host}/*/*"' for host in MIRRORED_HOSTS)
+    config = f"""provider_installation {{
+  network_mirror {{
+    url     = "{url.rstrip("/")}/"
+    include = [{patterns}]
+  }}
+  direct {{
+    exclude = [{patterns}]
+  }}
+}}
+"""
+    with tempfile.NamedTemporaryFile("w", prefix="terraform-mirror-", suffix=".tfrc", delete=False) as f:
+        f.write(config)
+    return f.name
+
+
+def lock_files(repo_root: str) -> list[Path]:
+    """Return every .terraform.lock.hcl under tf/."""
+    return sorted(Path(repo_root).glob("tf/*/.terraform.lock.hcl"))
@@ -0,0 +1,112 @@
+"""Query the plan/apply history of a Terraform module."""
+# requirements:
+# boto3
+
+import sqlite3
+import statistics
+import tempfile
+
+from f.terraform.history import SCHEMA, download_partitions, migrate
+from f.terraform.instrumentation import Timings
+from f.terraform.s3_artifacts import create_s3_client, s3
+
+# Applies carry no resources of their own; they link to the plan they applied
+CHANGES_QUERY = """
+SELECT r.address, r.type, r.action, p.job_id, p.commit_sha, p.recorded_at,
+       a.job_id AS apply_job_id, a.recorded_at AS applied_at
+FROM resources r
+JOIN runs p ON p.job_id = r.job_id
+LEFT JOIN runs a ON a.kind = 'apply' AND a.plan_job_id = p.job_id
+WHERE r.address LIKE ?
+"""
+
+
+def _percentile(values: list[float], pct: int) -> float:
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return round(statistics.quantiles(values, n=100, method="inclusive")[pct - 1], 3)
+
+
+def main(
+    s3_resource: s3,
+    module: str,
+    address: str = "",
+    months: int = 3,
+    applied_only: bool = False,
+    limit: int = 20,
+):
+    """Answer history questions for a module from its monthly SQLite partitions.
+
+    Args:
+        s3_resource: S3 resource holding terraform-history/
+        module: Terraform module path (e.g., tf/vault)
+        address: Resource address to look up; SQL LIKE wildcards (%) allowed,
+                 e.g. 'vault_policy.%'. Empty skips the resource lookup
+        months: How many months back to search, including the current one
+        applied_only: Only report resource changes whose plan was applied
+        limit: Maximum resource changes returned, newest first
+
+    Returns:
+        dict with:
+            - partitions: History partitions found in S3
+            - changes: Planned changes of matching resources, with the plan's
+              commit and the apply job/time when it was applied
+            - durations: Per run kind (plan, apply): count, p50, p95 and max seconds,
+              the largest single terraform/provider process RSS (peak_rss_mb) and
+              the largest combined cgroup memory peak (peak_memory_mb, None
+              without cgroup stats) in MiB
+            - timings: Seconds spent per phase (download, query)
+    """
+    timings = Timings()
+    s3_client = create_s3_client(s3_resource)
+
+    # Partitions are merged so an apply in the month after its plan still joins to it
+    db = sqlite3.connect(":memory:")
+    db.row_factory = sqlite3.Row
+    db.executescript(SCHEMA)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        with timings.span("download"):
+            partitions = download_partitions(s3_client, s3_resource, module, months, tmp_dir)
+
+        with timings.span("query"):
+            for _, path in partitions:
+                db.execute("ATTACH DATABASE ? AS partition", (str(path),))
+                migrate(db, "partition")
+                columns = ", ".join(row[1] for row in db.execute("PRAGMA main.table_info(runs)"))
+                db.execute(f"INSERT OR REPLACE INTO runs ({columns}) SELECT {columns} FROM partition.runs")
+                db.execute("INSERT INTO resources SELECT * FROM partition.resources")
+                db.commit()
+                db.execute("DETACH DATABASE partition")
+
+    with timings.span("query"):
+        durations: dict[str, list[float]] = {}
+        peak_rss: dict[str, float] = {}
+        peak_memory: dict[str, float] = {}
+        for kind, duration, rss, memory in db.execute("SELECT kind, duration, peak_rss_mb, peak_memory_mb FROM runs WHERE duration IS NOT NULL"):
+            durations.setdefault(kind, []).append(duration)
+            peak_rss[kind] = max(peak_rss.get(kind, 0.0), rss or 0.0)
+            if memory:
+                peak_memory[kind] = max(peak_memory.get(kind, 0.0), memory)
+        changes = []
+        if address:
+            query = CHANGES_QUERY + (" AND a.job_id IS NOT NULL" if applied_only else "") + " ORDER BY p.recorded_at DESC LIMIT ?"
+            changes = [dict(row) for row in db.execute(query, (address, limit))]
+    db.close()
+
+    timings.export("query_history", module=module)
+    return {
+        "partitions": [key for key, _ in partitions],
+        "changes": changes,
+        "durations": {
+            kind: {
+                "count": len(values),
+                "p50": _percentile(values, 50),
+                "p95": _percentile(values, 95),
+                "max": round(max(values), 3),
+                "peak_rss_mb": peak_rss[kind],
+                "peak_memory_mb": peak_memory.get(kind),
+            }
+            for kind, values in sorted(durations.items())
+        },
+        "timings": timings.as_dict(),
+    }
@@ -0,0 +1,103 @@
+"""Classify Terraform failures as transient or fatal and retry transient ones."""
+
+import json
+import random
+import re
+import subprocess
+import time
+
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_BASE_DELAY = 10  # seconds
+DEFAULT_MAX_DELAY = 120  # seconds
+# How long terraform itself waits for a held state lock before failing
+DEFAULT_LOCK_TIMEOUT = "5m"
+
+# HTTP status codes only count in status context ("status code: 503", "Code: 503",
+# "HTTP/1.1 503"), never as bare numbers that may be IDs, values or addresses
+HTTP_STATUS = r"(?:\bstatus(?: code)?|\bcode|\bHTTP/\d(?:\.\d)?)[:=]?\s*"
+
+# Failures worth retrying in the same step: lock contention, rate limiting,
+# upstream 5xx (Vault, Authentik, Cloudflare APIs) and network blips
+TRANSIENT_PATTERNS = [
+    re.compile(pattern, re.IGNORECASE)
+    for pattern in (
+        r"error acquiring the state lock",
+        rf"{HTTP_STATUS}429\b|\btoo many requests\b|\brate limit(ed|ing| exceeded)?\b",
+        rf"{HTTP_STATUS}50[0234]\b|\b(bad gateway|service unavailable|gateway timeout)\b",
+        r"connection (reset|refused)|broken pipe|unexpected EOF",
+        r"i/o timeout|TLS handshake timeout|context deadline exceeded|Client\.Timeout exceeded",
+        r"no such host|temporary failure in name resolution|network is unreachable",
+    )
+]
+# Never retried even if a transient pattern also matches
+FATAL_PATTERNS = [
+    re.compile(pattern, re.IGNORECASE)
+    for pattern in (
+        r"saved plan is stale",
+        rf"permission denied|403 forbidden|{HTTP_STATUS}401\b|invalid token|unauthorized",
+        r"unsupported argument|invalid reference|missing required argument|reference to undeclared",
+    )
+]
+# Printed by terraform apply (-no-color) as it starts on a resource. After that the
+# saved plan is spent, and a retry would only fail with "Saved plan is stale"
+APPLY_STARTED_RE = re.compile(r"^\S.*: (Creating|Modifying|Destroying|Reading)\.\.\.", re.MULTILINE)
+
+
+def diagnostics(stdout: str) -> list[str]:
+    """Return error diagnostics ("summary: detail") from terraform -json output."""
+    found = []
+    for line in stdout.splitlines():
+        try:
+            data = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        diagnostic = data.get("diagnostic", {}) if isinstance(data, dict) and data.get("type") == "diagnostic" else {}
+        if diagnostic.get("severity") == "error":
+            found.append(f"{diagnostic.get('summary', '')}: {diagnostic.get('detail', '')}")
+    return found
+
+
+def is_transient(stdout: str, stderr: str) -> bool:
+    """Classify a failed terraform run from its diagnostics and stderr."""
+    text = "\n".join(diagnostics(stdout) + [stderr])
+    if any(pattern.search(text) for pattern in FATAL_PATTERNS):
+        return False
+    return any(pattern.search(text) for pattern in TRANSIENT_PATTERNS)
+
+
+def backoff_delay(attempt: int, base_delay: float = DEFAULT_BASE_DELAY, max_delay: float = DEFAULT_MAX_DELAY) -> float:
+    """Full-jitter exponential backoff before retry number `attempt` (1-based)."""
+    return random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1)))
+
+
+def run_with_retry(
+    cmd: list[str],
+    cwd: str,
+    env: dict,
+    ok_codes: tuple[int, ...] = (0,),
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    base_delay: float = DEFAULT_BASE_DELAY,
+    started: re.Pattern | None = None,
+) -> tuple[subprocess.CompletedProcess, int]:
+    """Run a terraform command, retrying transient failures with jittered backoff.
+
+    Fatal failures and the last transient failure are returned to the caller,
+    which raises as before. A failure whose stdout matches started (e.g.
+    APPLY_STARTED_RE) is returned without retrying, whatever its cause.
+
+    Returns:
+        Tuple of (completed process of the last attempt, attempts made)
+    """
+    attempt = 1
+    while True:
+        result = subprocess.run(cmd, cwd=cwd, capture_output=True, text=True, env=env)
+        if result.returncode in ok_codes or attempt >= max_attempts or not is_transient(result.stdout, result.stderr):
+            return result, attempt
+        if started and started.search(result.stdout):
+            print(f"[Retry] terraform {cmd[1]} failed after it started changing resources, not retrying")
+            return result, attempt
+        delay = backoff_delay(attempt, base_delay)
+        reason = next(iter(diagnostics(result.stdout)), "") or result.stderr.strip().rsplit("\n", 1)[-1]
+        print(f"[Retry] terraform {cmd[1]} failed with a transient error (attempt {attempt}/{max_attempts}), retrying in {delay:.1f}s: {reason}")
+        time.sleep(delay)
+        attempt += 1
@@ -0,0 +1,178 @@
+"""Shared S3 helpers for Terraform pipeline artifacts."""
+# requirements:
+# boto3
+
+import gzip
+import hashlib
+import os
+import zlib
+from pathlib import Path
+from typing import TypedDict
+
+# Text outputs larger than this are stored in S3 instead of the step result,
+# keeping Windmill's job table and flow state small
+OUTPUT_SIZE_BUDGET = 16 * 1024  # bytes
+# Leading characters of an offloaded output kept inline for quick display
+OUTPUT_DIGEST_CHARS = 500
+
+
+class s3(TypedDict):
+    bucket: str
+    region: str
+    endPoint: str
+    accessKey: str
+    secretKey: str
+    useSSL: bool
+    pathStyle: bool
+
+
+class OutputRef(TypedDict):
+    """Reference to a step output stored in S3 (gzip-compressed UTF-8 text)."""
+
+    s3_key: str
+    size: int
+    compressed_size: int
+    sha256: str
+    digest: str
+
+
+def s3_errors() -> tuple[type[Exception], ...]:
+    """Return botocore's S3 error types, for use as `except s3_errors() as e:`.
+
+    boto3/botocore are imported on first use rather than at module import, so
+    scripts running without an S3 resource don't pay for them. An except
+    clause's expression is only evaluated while matching a raised exception.
+    """
+    from botocore.exceptions import BotoCoreError, ClientError
+
+    return ClientError, BotoCoreError
+
+
+def create_s3_client(s3_resource: s3):
+    """Create boto3 S3 client with proper configuration from Windmill resource."""
+    import boto3
+    from botocore.config import Config
+
+    addressing_style = "path" if s3_resource.get("pathStyle", True) else "virtual"
+    return boto3.client(
+        "s3",
+        endpoint_url=s3_resource["endPoint"],
+        aws_access_key_id=s3_resource["accessKey"],
+        aws_secret_access_key=s3_resource["secretKey"],
+        region_name=s3_resource.get("region", "auto"),
+        use_ssl=s3_resource.get("useSSL", True),
+        config=Config(s3={"addressing_style": addressing_style}),
+    )
+
+
+def repo_relative_path(module_dir: str) -> str:
+    """Return module_dir relative to its git checkout (e.g. 'tf/vault').
+
+    Workspace roots differ per run, so keys must not include them.
+    Falls back to module_dir unchanged when it is not inside a checkout.
+    """
+    path = Path(module_dir)
+    for parent in path.parents:
+        if (parent / ".git").exists():
+            return path.relative_to(parent).as_posix()
+    return module_dir
+
+
+def sanitize_module_path(module_dir: str) -> str:
+    """Sanitize module path for S3 key to prevent collisions.
+
+    Uses '--' as separator to distinguish from literal hyphens in paths.
+    Example: 'tf/vault' -> 'tf--vault', 'tf-core/services' -> 'tf-core--services'
+    """
+    return repo_relative_path(module_dir).replace("/", "--").strip("-")
+
+
+def output_key(module_dir: str, job_id: str, name: str) -> str:
+    """S3 key for an offloaded step output, alongside the plan artifacts layout."""
+    return f"terraform-outputs/{sanitize_module_path(module_dir)}/{job_id}/{name}.txt.gz"
+
+
+def offload_output(text: str, s3_resource: s3 | None, module_dir: str, name: str, s3_client=None) -> str | OutputRef:
+    """Return text unchanged if within budget, otherwise store it in S3 and return a reference.
+
+    Offloading requires an S3 resource and WM_JOB_ID; without them the text is
+    returned inline as before.
+
+    Args:
+        text: Output text (e.g., terraform stdout)
+        s3_resource: S3 resource for storage (optional)
+        module_dir: Module path, used to build the key
+        name: Output name within the job (e.g., "plan_details")
+        s3_client: Existing client to reuse (optional)
+
+    Returns:
+        The text itself, or an OutputRef with key, size, sha256 and a short digest
+    """
+    data = text.encode()
+    job_id = os.environ.get("WM_JOB_ID", "")
+    if len(data) <= OUTPUT_SIZE_BUDGET or not s3_resource or not job_id:
+        return text
+
+    key = output_key(module_dir, job_id, name)
+    body = gzip.compress(data)
+    client = s3_client or create_s3_client(s3_resource)
+    try:
+        client.put_object(
+            Bucket=s3_resource["bucket"],
+            Key=key,
+            Body=body,
+            ContentType="text/plain; charset=utf-8",
+            ContentEncoding="gzip",
+        )
+    except s3_errors() as e:
+        raise RuntimeError(f"[S3 Upload Error] Failed to offload {name} to S3: {e}\n  Key: {key}\n  Bucket: {s3_resource['bucket']}") from e
+
+    return {
+        "s3_key": key,
+        "size": len(data),
+        "compressed_size": len(body),
+        "sha256": hashlib.sha256(data).hexdigest(),
+        "digest": text[:OUTPUT_DIGEST_CHARS],
+    }
+
+
+def resolve_output(value: str | OutputRef, s3_resource: s3 | None = None, limit: int | None = None) -> str:
+    """Return the text behind an output value, fetching it from S3 if it was offloaded.
+
+    Args:
+        value: Inline text or an OutputRef from offload_output
+        s3_resource: S3 resource to fetch from (without it, the digest is returned)
+        limit: Only the first `limit` characters are needed; fetched with a ranged GET
+
+    Returns:
+        Output text (truncated to limit if given)
+    """
+    if isinstance(value, str):
+        return value[:limit] if limit is not None else value
+
+    digest = value["digest"]
+    if limit is not None and limit <= len(digest):
+        return digest[:limit]
+    if not s3_resource:
+        return digest
+
+    client = create_s3_client(s3_resource)
+    request = {"Bucket": s3_resource["bucket"], "Key": value["s3_key"]}
+    if limit is not None:
+        # UTF-8 needs at most 4 bytes per character; deflate adds only small per-block overhead
+        request["Range"] = f"bytes=0-{limit * 4 + 64}"
+
+    try:
+        body = client.get_object(**request)["Body"].read()
+    except s3_errors() as e:
+        raise RuntimeError(f"[S3 Download Error] Failed to fetch output from S3: {e}\n  Key: {value['s3_key']}\n  Bucket: {s3_resource['bucket']}") from e
+
+    if limit is not None:
+        # Decompress whatever prefix we received; a truncated stream is expected here
+        text = zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(body).decode(errors="ignore")
+        return text[:limit]
+
+    data = gzip.decompress(body)
+    if hashlib.sha256(data).hexdigest() != value["sha256"]:
+        raise RuntimeError(f"Output checksum mismatch for {value['s3_key']}")
+    return data.decode()
@@ -0,0 +1,197 @@
+"""Speculative plans: plan ahead of a deploy and reuse the plan if state is unchanged."""
+# requirements:
+# boto3
+
+import json
+import subprocess
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+
+from f.terraform.checkpoint import file_sha256
+from f.terraform.module_graph import build_graph, external_files
+from f.terraform.s3_artifacts import repo_relative_path, s3, s3_errors, sanitize_module_path
+from f.terraform.state_summary import backend_location, module_state_summary, read_state_summary
+
+# Older speculative plans are ignored even if state is unchanged, so real
+# infrastructure changed outside Terraform is refreshed again
+DEFAULT_MAX_AGE_MINUTES = 360
+
+
+def module_tree(module_dir: str) -> str:
+    """Return the git tree SHA of the module directory at HEAD.
+
+    Keying by tree instead of commit lets a plan made for a PR head be reused
+    for the merge commit when the merge did not change the module.
+    """
+    module_path = Path(module_dir)
+    result = subprocess.run(
+        ["git", "rev-parse", f"HEAD:{repo_relative_path(module_dir)}"],
+        cwd=str(module_path),
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Failed to resolve module tree for {module_dir}:\n{result.stderr}")
+    return result.stdout.strip()
+
+
+def state_version(module_dir: str, env: dict, terraform_bin: str = "terraform", s3_client=None) -> dict:
+    """Return the current state's lineage and serial ({"", 0} for empty state).
+
+    With an s3_client, S3-backend state is read directly (see state_summary);
+    otherwise, or if that fails, via `terraform state pull`.
+
+    Raises:
+        RuntimeError: If the state cannot be read
+    """
+    if s3_client and backend_location(module_dir):
+        try:
+            summary = module_state_summary(module_dir, s3_client)
+            return {"lineage": summary["lineage"], "serial": summary["serial"]} if summary else {"lineage": "", "serial": 0}
+        except RuntimeError as e:
+            print(f"[State Warning] Direct state read failed, using terraform state pull (non-fatal): {e}")
+    result = subprocess.run([terraform_bin, "state", "pull"], cwd=module_dir, capture_output=True, text=True, env=env)
+    if result.returncode != 0:
+        raise RuntimeError(f"Terraform state pull failed (exit {result.returncode}):\n{result.stderr}")
+    state = json.loads(result.stdout) if result.stdout.strip() else {}
+    return {"lineage": state.get("lineage", ""), "serial": state.get("serial", 0)}
+
+
+def plan_inputs(module_dir: str, s3_client) -> dict | None:
+    """Inputs from outside the module's tree that a saved plan bakes in.
+
+    Returns the lineage and serial of each upstream module's state (module_graph
+    edges: remote state outputs, Vault KV secrets, declared dependencies) and
+    the SHA-256 of each file the module reads through ../ paths. Upstream
+    states are read next to the module's own in its S3 backend.
+
+    Returns:
+        {"upstreams": {module: {lineage, serial}}, "files": {path: sha256}},
+        or None if the upstreams cannot be checked (no S3 backend, or an
+        upstream without state)
+
+    Raises:
+        RuntimeError: If a state cannot be read
+        ValueError: If tf/dependencies.yaml is invalid
+    """
+    module = repo_relative_path(module_dir)
+    checkout = Path(module_dir).resolve().parents[len(Path(module).parts) - 1]
+    files = {path.relative_to(checkout).as_posix(): file_sha256(path) for path in external_files(Path(module_dir), checkout)}
+    upstreams = sorted(build_graph(str(checkout)).get(module, ()))
+    if not upstreams:
+        return {"upstreams": {}, "files": files}
+
+    location = backend_location(module_dir) if s3_client else None
+    suffix = f"terraform/{module}/terraform.tfstate"
+    if not location or not location[1].endswith(suffix):
+        return None
+    bucket, key = location
+    versions = {}
+    for upstream in upstreams:
+        summary = read_state_summary(s3_client, bucket, f"{key.removesuffix(suffix)}terraform/{upstream}/terraform.tfstate")
+        if not summary:
+            return None
+        versions[upstream] = {"lineage": summary["lineage"], "serial": summary["serial"]}
+    return {"upstreams": versions, "files": files}
+
+
+def speculative_prefix(module_dir: str, tree: str) -> str:
+    """S3 prefix of the speculative plan for a module tree."""
+    return f"terraform-speculative/{sanitize_module_path(module_dir)}/{tree}/"
+
+
+def store_speculative(module_dir: str, plan_file: Path, metadata: dict, s3_client, s3_resource: s3) -> str:
+    """Upload a speculative plan and its metadata (state version, summary, details).
+
+    Returns:
+        S3 prefix the plan was stored under
+
+    Raises:
+        RuntimeError: If the upload fails
+    """
+    prefix = speculative_prefix(module_dir, metadata["tree"])
+    try:
+        s3_client.upload_file(str(plan_file), s3_resource["bucket"], f"{prefix}tfplan")
+        # Metadata last: its presence marks a complete speculative plan
+        s3_client.put_object(
+            Bucket=s3_resource["bucket"],
+            Key=f"{prefix}metadata.json",
+            Body=json.dumps(metadata).encode(),
+            ContentType="application/json",
+        )
+    except s3_errors() as e:
+        raise RuntimeError(f"[S3 Upload Error] Failed to upload speculative plan: {e}\n  Prefix: {prefix}\n  Bucket: {s3_resource['bucket']}") from e
+    return prefix
+
+
+def load_speculative(
+    module_dir: str,
+    env: dict,
+    plan_file: Path,
+    s3_client,
+    s3_resource: s3,
+    terraform: tuple[str, str] = ("terraform", ""),
+    max_age_minutes: int = DEFAULT_MAX_AGE_MINUTES,
+) -> dict | None:
+    """Fetch a speculative plan for the module's current tree into plan_file if still valid.
+
+    A plan is valid when it is younger than max_age_minutes, was made by the
+    same Terraform version (terraform is the (binary, version) pair about to
+    apply it), and the state lineage and serial, the upstream module states
+    and the files read from outside the tree (plan_inputs) all match those
+    recorded before it was planned.
+
+    Returns:
+        The speculative plan's metadata, or None if there is no valid plan
+        (lookup failures are logged and treated as a miss)
+    """
+    try:
+        prefix = speculative_prefix(module_dir, module_tree(module_dir))
+        response = s3_client.get_object(Bucket=s3_resource["bucket"], Key=f"{prefix}metadata.json")
+    except (*s3_errors(), RuntimeError) as e:
+        # A missing plan (NoSuchKey/404) is the normal miss; anything else is worth a warning
+        if getattr(e, "response", {}).get("Error", {}).get("Code") not in ("NoSuchKey", "404"):
+            print(f"[Speculative Warning] Lookup failed, planning normally (non-fatal): {e}")
+        return None
+
+    metadata = json.loads(response["Body"].read())
+    if datetime.now(UTC) - response["LastModified"] > timedelta(minutes=max_age_minutes):
+        print(f"[Speculative] Plan at {prefix} is older than {max_age_minutes} minutes, planning normally")
+        return None
+    if metadata.get("terraform_version", "") != terraform[1]:
+        print(f"[Speculative] Plan at {prefix} was made by Terraform {metadata.get('terraform_version') or 'unknown'}, not {terraform[1]}, planning normally")
+        return None
+
+    try:
+        current = state_version(module_dir, env, terraform[0], s3_client)
+    except RuntimeError as e:
+        print(f"[Speculative Warning] Could not read state, planning normally (non-fatal): {e}")
+        return None
+    if current != metadata["state"]:
+        print(f"[Speculative] State changed since {prefix} was planned ({metadata['state']} -> {current}), planning normally")
+        return None
+
+    if metadata.get("inputs") is None:
+        print(f"[Speculative] Plan at {prefix} has no checkable upstream states and outside files, planning normally")
+        return None
+    try:
+        inputs = plan_inputs(module_dir, s3_client)
+    except (RuntimeError, ValueError, OSError) as e:
+        print(f"[Speculative Warning] Could not read upstream states or outside files, planning normally (non-fatal): {e}")
+        return None
+    if inputs != metadata["inputs"]:
+        print(f"[Speculative] Upstream states or outside files changed since {prefix} was planned, planning normally")
+        return None
+
+    try:
+        s3_client.download_file(s3_resource["bucket"], f"{prefix}tfplan", str(plan_file))
+    except s3_errors() as e:
+        print(f"[Speculative Warning] Failed to download plan, planning normally (non-fatal): {e}")
+        return None
+    if file_sha256(plan_file) != metadata["plan_sha256"]:
+        print(f"[Speculative Warning] Plan at {prefix} failed hash verification, planning normally")
+        plan_file.unlink(missing_ok=True)
+        return None
+
+    print(f"[Speculative] Reusing plan from {prefix}")
+    return metadata
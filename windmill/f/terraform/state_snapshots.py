@@ -0,0 +1,216 @@
+"""Deduplicated, chunked archive of S3-backend state serials."""
+# requirements:
+# boto3
+
+import gzip
+import hashlib
+import json
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import UTC, datetime
+from typing import TypedDict
+
+from f.terraform.s3_artifacts import s3, s3_errors, sanitize_module_path
+from f.terraform.state_summary import backend_location
+
+# Layout per module:
+#   terraform-state-snapshots/<module--path>/chunks/<sha256>.gz               content-addressed, shared by all serials
+#   terraform-state-snapshots/<module--path>/manifests/<lineage>/<serial>.json ordered chunk list of one serial
+#   terraform-state-snapshots/<module--path>/latest.json                      copy of the newest manifest
+SNAPSHOT_PREFIX = "terraform-state-snapshots/"
+
+# Chunk boundaries fall after a line whose CRC matches BOUNDARY_MASK (about one
+# line in 1024), so an edit only changes the chunks around it. State JSON is
+# indented, one value per line; a minified state falls back to one chunk.
+MIN_CHUNK_BYTES = 16 * 1024
+MAX_CHUNK_BYTES = 256 * 1024
+BOUNDARY_MASK = 0x3FF
+TRANSFER_WORKERS = 8
+
+
+class Manifest(TypedDict):
+    """Chunks that reassemble one state serial."""
+
+    module: str
+    lineage: str
+    serial: int
+    size: int
+    sha256: str
+    chunks: list[str]
+    created_at: str
+
+
+class SnapshotResult(TypedDict):
+    """Outcome of archiving a state serial."""
+
+    key: str
+    lineage: str
+    serial: int
+    chunks: int
+    new_chunks: int
+    new_bytes: int  # Compressed bytes uploaded
+    skipped: bool  # Serial was already archived
+
+
+def chunk_state(data: bytes) -> list[bytes]:
+    """Split state bytes at content-defined line boundaries."""
+    chunks = []
+    start = end = 0
+    for line in data.splitlines(keepends=True):
+        end += len(line)
+        size = end - start
+        if size >= MAX_CHUNK_BYTES or (size >= MIN_CHUNK_BYTES and zlib.crc32(line) & BOUNDARY_MASK == 0):
+            chunks.append(data[start:end])
+            start = end
+    if start < len(data):
+        chunks.append(data[start:])
+    return chunks
+
+
+def snapshot_prefix(module_path: str) -> str:
+    """S3 prefix of a module's snapshot archive."""
+    return f"{SNAPSHOT_PREFIX}{sanitize_module_path(module_path)}/"
+
+
+def manifest_key(module_path: str, lineage: str, serial: int) -> str:
+    """S3 key of a serial's manifest (zero-padded so listing returns serials in order)."""
+    return f"{snapshot_prefix(module_path)}manifests/{lineage}/{serial:010d}.json"
+
+
+def _chunk_key(module_path: str, digest: str) -> str:
+    return f"{snapshot_prefix(module_path)}chunks/{digest}.gz"
+
+
+def _get_json(s3_client, bucket: str, key: str) -> dict | None:
+    try:
+        return json.loads(s3_client.get_object(Bucket=bucket, Key=key)["Body"].read())
+    except s3_errors() as e:
+        if getattr(e, "response", {}).get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+            return None
+        raise RuntimeError(f"[S3 Download Error] Failed to read {key}: {e}") from e
+
+
+def snapshot_state(s3_client, bucket: str, module_path: str, state: bytes) -> SnapshotResult:
+    """Archive one state serial, uploading only chunks the previous snapshot lacks.
+
+    Raises:
+        RuntimeError: If the state is not valid JSON or an upload fails
+    """
+    try:
+        parsed = json.loads(state)
+    except json.JSONDecodeError as e:
+        raise RuntimeError(f"State for {module_path} is not valid JSON: {e}") from e
+    lineage, serial = parsed.get("lineage", ""), parsed.get("serial", 0)
+    key = manifest_key(module_path, lineage, serial)
+
+    latest = _get_json(s3_client, bucket, f"{snapshot_prefix(module_path)}latest.json")
+    if latest and (latest["lineage"], latest["serial"]) == (lineage, serial):
+        return {"key": key, "lineage": lineage, "serial": serial, "chunks": len(latest["chunks"]), "new_chunks": 0, "new_bytes": 0, "skipped": True}
+
+    pieces = chunk_state(state)
+    order = [hashlib.sha256(piece).hexdigest() for piece in pieces]
+    chunks = dict(zip(order, pieces, strict=True))
+    known = set(latest["chunks"]) if latest else set()
+    new = {digest: chunk for digest, chunk in chunks.items() if digest not in known}
+
+    def upload(item: tuple[str, bytes]) -> int:
+        digest, chunk = item
+        body = gzip.compress(chunk, compresslevel=6)
+        s3_client.put_object(Bucket=bucket, Key=_chunk_key(module_path, digest), Body=body, ContentType="application/gzip")
+        return len(body)
+
+    manifest: Manifest = {
+        "module": module_path,
+        "lineage": lineage,
+        "serial": serial,
+        "size": len(state),
+        "sha256": hashlib.sha256(state).hexdigest(),
+        "chunks": order,
+        "created_at": datetime.now(UTC).isoformat(timespec="seconds"),
+    }
+    try:
+        with ThreadPoolExecutor(max_workers=TRANSFER_WORKERS) as pool:
+            new_bytes = sum(pool.map(upload, new.items()))
+        # Manifest after its chunks: a listed serial is always restorable
+        body = json.dumps(manifest).encode()
+        s3_client.put_object(Bucket=bucket, Key=key, Body=body, ContentType="application/json")
+        s3_client.put_object(Bucket=bucket, Key=f"{snapshot_prefix(module_path)}latest.json", Body=body, ContentType="application/json")
+    except s3_errors() as e:
+        raise RuntimeError(f"[S3 Upload Error] Failed to archive state snapshot: {e}\n  Key: {key}\n  Bucket: {bucket}") from e
+
+    return {"key": key, "lineage": lineage, "serial": serial, "chunks": len(order), "new_chunks": len(new), "new_bytes": new_bytes, "skipped": False}
+
+
+def archive_module_state(module_dir: str, module_path: str, s3_client, s3_resource: s3) -> SnapshotResult | None:
+    """Archive the current state of an initialized S3-backend module into the artifacts bucket.
+
+    Returns:
+        None for modules without an S3 backend (e.g. Terraform Cloud) or without state
+
+    Raises:
+        RuntimeError: If the state cannot be read or archived
+    """
+    location = backend_location(module_dir)
+    if not location:
+        return None
+    state_bucket, state_key = location
+    try:
+        state = s3_client.get_object(Bucket=state_bucket, Key=state_key)["Body"].read()
+    except s3_errors() as e:
+        if getattr(e, "response", {}).get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+            return None
+        raise RuntimeError(f"[S3 Download Error] Failed to read state: {e}\n  Key: {state_key}\n  Bucket: {state_bucket}") from e
+    return snapshot_state(s3_client, s3_resource["bucket"], module_path, state)
+
+
+def list_snapshots(s3_client, bucket: str, module_path: str) -> list[dict]:
+    """Archived serials of a module as {lineage, serial, key, last_modified}, oldest first per lineage.
+
+    Raises:
+        RuntimeError: If listing fails
+    """
+    prefix = f"{snapshot_prefix(module_path)}manifests/"
+    snapshots = []
+    try:
+        for page in s3_client.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=prefix):
+            for obj in page.get("Contents", []):
+                lineage, name = obj["Key"].removeprefix(prefix).split("/", 1)
+                snapshots.append({"lineage": lineage, "serial": int(name.removesuffix(".json")), "key": obj["Key"], "last_modified": obj["LastModified"].isoformat()})
+    except s3_errors() as e:
+        raise RuntimeError(f"[S3 List Error] Failed to list state snapshots: {e}\n  Prefix: {prefix}\n  Bucket: {bucket}") from e
+    return snapshots
+
+
+def restore_state(s3_client, bucket: str, module_path: str, serial: int, lineage: str = "") -> bytes:
+    """Reassemble an archived serial (of the latest lineage unless given) and verify its hash.
+
+    Raises:
+        RuntimeError: If the serial is not archived or a chunk is missing or corrupt
+    """
+    if not lineage:
+        latest = _get_json(s3_client, bucket, f"{snapshot_prefix(module_path)}latest.json")
+        if not latest:
+            raise RuntimeError(f"No state snapshots for {module_path}")
+        lineage = latest["lineage"]
+    manifest = _get_json(s3_client, bucket, manifest_key(module_path, lineage, serial))
+    if not manifest:
+        raise RuntimeError(f"Serial {serial} of lineage {lineage} is not archived for {module_path}")
+
+    def download(digest: str) -> bytes:
+        body = s3_client.get_object(Bucket=bucket, Key=_chunk_key(module_path, digest))["Body"].read()
+        chunk = gzip.decompress(body)
+        if hashlib.sha256(chunk).hexdigest() != digest:
+            raise RuntimeError(f"Chunk {digest} of {module_path} failed hash verification")
+        return chunk
+
+    try:
+        with ThreadPoolExecutor(max_workers=TRANSFER_WORKERS) as pool:
+            digests = list(dict.fromkeys(manifest["chunks"]))
+            chunks = dict(zip(digests, pool.map(download, digests), strict=True))
+    except s3_errors() as e:
+        raise RuntimeError(f"[S3 Download Error] Failed to download state snapshot chunks: {e}\n  Manifest: {manifest_key(module_path, lineage, serial)}") from e
+
+    state = b"".join(chunks[digest] for digest in manifest["chunks"])
+    if hashlib.sha256(state).hexdigest() != manifest["sha256"]:
+        raise RuntimeError(f"Restored serial {serial} of {module_path} failed hash verification")
+    return state
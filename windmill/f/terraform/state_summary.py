@@ -0,0 +1,118 @@
+"""Summarize a module's S3-backend state without running terraform."""
+# requirements:
+# boto3
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import TypedDict
+
+from f.terraform.s3_artifacts import s3_errors
+
+# Summaries (never the state itself) are cached per state object with its ETag
+CACHE_DIR_ENV = "TF_STATE_CACHE_DIR"
+DEFAULT_CACHE_DIR = "/tmp/terraform-state-cache"
+# Written by `terraform init` next to the providers; records the backend it configured
+BACKEND_FILE = ".terraform/terraform.tfstate"
+
+
+class StateSummary(TypedDict):
+    """Serial, lineage, resource counts and outputs of a state."""
+
+    lineage: str
+    serial: int
+    terraform_version: str
+    resources: int  # Managed resource instances
+    resource_types: dict[str, int]
+    outputs: dict[str, object]  # Sensitive values replaced by "(sensitive)"
+    etag: str
+
+
+def state_key(module_path: str, s3_bucket_prefix: str = "") -> str:
+    """S3 backend state key of a module (as configured by terraform_init)."""
+    prefix = s3_bucket_prefix.strip("/") if s3_bucket_prefix else ""
+    return f"{prefix}/terraform/{module_path}/terraform.tfstate" if prefix else f"terraform/{module_path}/terraform.tfstate"
+
+
+def backend_location(module_dir: str) -> tuple[str, str] | None:
+    """(bucket, key) of an initialized module's S3 backend, or None (Terraform Cloud, not initialized)."""
+    try:
+        backend = json.loads((Path(module_dir) / BACKEND_FILE).read_text()).get("backend") or {}
+    except (OSError, json.JSONDecodeError):
+        return None
+    config = backend.get("config") or {}
+    if backend.get("type") != "s3" or not config.get("bucket") or not config.get("key"):
+        return None
+    return config["bucket"], config["key"]
+
+
+def summarize(state: dict, etag: str = "") -> StateSummary:
+    """Reduce a parsed state to its summary."""
+    resource_types: dict[str, int] = {}
+    for resource in state.get("resources", []):
+        if resource.get("mode") == "managed":
+            resource_types[resource["type"]] = resource_types.get(resource["type"], 0) + len(resource.get("instances", []))
+    return {
+        "lineage": state.get("lineage", ""),
+        "serial": state.get("serial", 0),
+        "terraform_version": state.get("terraform_version", ""),
+        "resources": sum(resource_types.values()),
+        "resource_types": dict(sorted(resource_types.items())),
+        "outputs": {name: "(sensitive)" if output.get("sensitive") else output.get("value") for name, output in state.get("outputs", {}).items()},
+        "etag": etag,
+    }
+
+
+def _cache_path(bucket: str, key: str) -> Path:
+    name = hashlib.sha256(f"{bucket}/{key}".encode()).hexdigest()
+    return Path(os.environ.get(CACHE_DIR_ENV, DEFAULT_CACHE_DIR)) / f"{name}.json"
+
+
+def read_state_summary(s3_client, bucket: str, key: str) -> StateSummary | None:
+    """Summarize the state object at bucket/key, or None if there is no state yet.
+
+    A cached summary is revalidated with a conditional GET (If-None-Match on
+    its ETag), so an unchanged state costs one request and no download.
+
+    Raises:
+        RuntimeError: If the state cannot be read
+    """
+    cache_path = _cache_path(bucket, key)
+    try:
+        cached = json.loads(cache_path.read_text())
+    except (OSError, json.JSONDecodeError):
+        cached = None
+
+    try:
+        condition = {"IfNoneMatch": cached["etag"]} if cached else {}
+        response = s3_client.get_object(Bucket=bucket, Key=key, **condition)
+    except s3_errors() as e:
+        code = getattr(e, "response", {}).get("Error", {}).get("Code", "")
+        if code in ("304", "NotModified"):
+            return cached
+        if code in ("NoSuchKey", "404"):
+            return None
+        raise RuntimeError(f"[S3 Download Error] Failed to read state: {e}\n  Key: {key}\n  Bucket: {bucket}") from e
+
+    summary = summarize(json.load(response["Body"]), response["ETag"])
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = cache_path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(summary))
+        tmp.replace(cache_path)
+    except OSError as e:
+        print(f"[State Cache Warning] Failed to cache state summary (non-fatal): {e}")
+    return summary
+
+
+def module_state_summary(module_dir: str, s3_client) -> StateSummary | None:
+    """Summary of an initialized module's S3-backend state.
+
+    Raises:
+        RuntimeError: If the module has no S3 backend (e.g. Terraform Cloud) or the state cannot be read
+    """
+    location = backend_location(module_dir)
+    if not location:
+        raise RuntimeError(f"No S3 backend configured in {Path(module_dir) / BACKEND_FILE}")
+    return read_state_summary(s3_client, *location)
@@ -3,13 +3,20 @@
 # boto3
 
 import os
-import subprocess
+import re
 from pathlib import Path
 from typing import TypedDict
 
-import boto3
-from botocore.config import Config
-from botocore.exceptions import BotoCoreError, ClientError
+from f.terraform.checkpoint import Checkpoint, file_sha256, install_providers, restore_checkpoint
+from f.terraform.history import new_record, record_run
+from f.terraform.instrumentation import Timings
+from f.terraform.retry import APPLY_STARTED_RE, DEFAULT_LOCK_TIMEOUT, DEFAULT_MAX_ATTEMPTS, run_with_retry
+from f.terraform.s3_artifacts import create_s3_client, offload_output, repo_relative_path, s3_errors
+from f.terraform.state_snapshots import archive_module_state
+from f.terraform.terraform_versions import resolve_terraform
+from f.terraform.workspace_pool import release_workspace
+
+APPLY_SUMMARY_RE = re.compile(r"Resources: (\d+) added, (\d+) changed, (\d+) destroyed")
 
 
 class s3(TypedDict):
@@ -22,18 +29,13 @@ class s3(TypedDict):
     pathStyle: bool
 
 
-def _create_s3_client(s3_resource: s3):
-    """Create boto3 S3 client with proper configuration from Windmill resource."""
-    addressing_style = "path" if s3_resource.get("pathStyle", True) else "virtual"
-    return boto3.client(
-        "s3",
-        endpoint_url=s3_resource["endPoint"],
-        aws_access_key_id=s3_resource["accessKey"],
-        aws_secret_access_key=s3_resource["secretKey"],
-        region_name=s3_resource.get("region", "auto"),
-        use_ssl=s3_resource.get("useSSL", True),
-        config=Config(s3={"addressing_style": addressing_style}),
-    )
+def _stored_plan_sha256(s3_client, bucket: str, key: str) -> str:
+    """Return the SHA-256 recorded on the plan artifact (HEAD only), or "" if unavailable."""
+    try:
+        return s3_client.head_object(Bucket=bucket, Key=key).get("Metadata", {}).get("sha256", "")
+    except s3_errors() as e:
+        print(f"[S3 Head Warning] Could not read plan checksum, downloading instead (non-fatal): {e}")
+        return ""
 
 
 def main(
@@ -43,10 +45,24 @@ def main(
     tfc_token: str | None = None,
     s3_resource: s3 | None = None,
     plan_s3_key: str = "",
+    plan_sha256: str = "",
+    checkpoint: Checkpoint | None = None,
+    lock_timeout: str = DEFAULT_LOCK_TIMEOUT,
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS,
 ):
     """
     Apply Terraform plan, downloading from S3 if key provided.
 
+    If module_dir is missing on this worker (e.g. the flow resumed after the
+    approval suspend on a different worker), the module workspace is restored
+    from the checkpoint terraform_plan stored in S3, and its providers are
+    installed again from the lock file.
+
+    Transient apply failures are retried with jittered backoff, but only
+    before terraform starts on any resource (a held state lock, an
+    unreachable backend). Once changes start, the saved plan is spent, so the
+    failure is raised as is.
+
     Args:
         module_dir: Path to Terraform module directory
         vault_addr: Vault server address
@@ -54,50 +70,84 @@ def main(
         tfc_token: Terraform Cloud API token (optional)
         s3_resource: S3 resource for retrieving plan artifacts
         plan_s3_key: S3 key where plan file is stored
+        plan_sha256: Expected SHA-256 of the plan file (verified before apply if set)
+        checkpoint: Workspace checkpoint reference from terraform_plan (optional)
+        lock_timeout: How long terraform waits for a held state lock (-lock-timeout)
+        max_attempts: Apply attempts when failures are transient
 
     Returns:
         dict with keys:
             - module_dir: Original module directory path
             - applied: Always True (function raises on failure)
-            - output: Terraform apply stdout
+            - output: Terraform apply stdout, or an S3 output reference when large
+            - restored_checkpoint: Whether the workspace was restored from S3
+            - plan_source: "local" if the on-disk plan matched the stored artifact, else "s3"
+            - terraform_version: Terraform version selected for the module's required_version
+            - attempts: Apply attempts made
+            - snapshot: State snapshot archived after the apply (None for Terraform
+              Cloud modules, without S3, or if archiving failed)
+            - timings: Seconds spent per phase (restore, s3_head, s3_download, resolve, providers, apply, s3_cleanup, snapshot, history)
+            - resource_usage: Wall and user/system CPU seconds, largest process RSS
+              and combined cgroup memory peak (MiB) of terraform and its providers for resolve, providers (after a restore) and apply
 
     Note:
-        S3 plan cleanup failures are logged but do not fail the apply.
+        S3 plan and checkpoint cleanup failures are logged but do not fail the apply.
     """
+    timings = Timings()
     module_path = Path(module_dir)
+    s3_client = create_s3_client(s3_resource) if s3_resource else None
 
+    restored = False
     if not module_path.exists():
-        raise ValueError(f"Module directory does not exist: {module_dir}")
+        if not (s3_client and checkpoint):
+            raise ValueError(f"Module directory does not exist: {module_dir}")
+        with timings.span("restore"):
+            restore_checkpoint(module_dir, s3_client, s3_resource, checkpoint)
+        restored = True
 
     plan_file = module_path / "tfplan"
 
-    # Download plan from S3 if key provided
-    s3_client = None
-    if s3_resource and plan_s3_key:
-        s3_client = _create_s3_client(s3_resource)
-
+    # Reuse the local plan when it is the stored artifact (usual on the planning worker)
+    local_sha256 = file_sha256(plan_file) if plan_file.exists() else ""
+    plan_source = "local"
+    if s3_client and plan_s3_key:
+        expected_sha256 = plan_sha256
+        if local_sha256 and not expected_sha256:
+            with timings.span("s3_head"):
+                expected_sha256 = _stored_plan_sha256(s3_client, s3_resource["bucket"], plan_s3_key)
+        if not local_sha256 or local_sha256 != expected_sha256:
+            plan_source = "s3"
+
+    # Download plan from S3 if key provided and no matching local copy
+    if plan_source == "s3":
         try:
-            s3_client.download_file(
-                s3_resource["bucket"],
-                plan_s3_key,
-                str(plan_file),
-            )
-        except (ClientError, BotoCoreError) as e:
+            with timings.span("s3_download"):
+                s3_client.download_file(
+                    s3_resource["bucket"],
+                    plan_s3_key,
+                    str(plan_file),
+                )
+        except s3_errors() as e:
             raise RuntimeError(
                 f"[S3 Download Error] Failed to download plan from S3: {e}\n"
                 f"  Key: {plan_s3_key}\n"
                 f"  Bucket: {s3_resource['bucket']}"
-            )
+            ) from e
         except OSError as e:
             raise RuntimeError(
                 f"[Filesystem Error] Failed to write plan file: {e}\n"
                 f"  Path: {plan_file}"
-            )
+            ) from e
 
     # Verify plan file exists
     if not plan_file.exists():
         raise ValueError(f"Plan file not found: {plan_file}")
 
+    if plan_source == "s3":
+        local_sha256 = file_sha256(plan_file)
+    if plan_sha256 and local_sha256 != plan_sha256:
+        raise RuntimeError(f"Plan file hash mismatch: {plan_file} does not match the plan produced by terraform_plan")
+
     # Build environment with Vault config
     env = os.environ.copy()
     env["VAULT_ADDR"] = vault_addr
@@ -107,31 +157,94 @@ def main(
     if tfc_token:
         env["TF_TOKEN_app_terraform_io"] = tfc_token
 
+    # Same selection as plan, so the plan file is applied by the version that wrote it
+    with timings.process_span("resolve"):
+        terraform_bin, terraform_version = resolve_terraform(module_dir)
+
+    if restored:
+        with timings.process_span("providers"):
+            install_providers(module_dir, terraform_bin, env)
+
     # Apply the plan
-    result = subprocess.run(
-        ["terraform", "apply", "-no-color", "tfplan"],
-        cwd=str(module_path),
-        capture_output=True,
-        text=True,
-        env=env,
-    )
+    with timings.process_span("apply"):
+        result, attempts = run_with_retry(
+            [terraform_bin, "apply", "-no-color", f"-lock-timeout={lock_timeout}", "tfplan"],
+            str(module_path),
+            env,
+            max_attempts=max_attempts,
+            started=APPLY_STARTED_RE,
+        )
 
     if result.returncode != 0:
-        raise RuntimeError(f"Terraform apply failed (exit {result.returncode}):\n{result.stderr}")
-
-    # Clean up plan from S3 after successful apply
-    if s3_client and plan_s3_key:
+        raise RuntimeError(f"Terraform apply failed (exit {result.returncode}, attempt {attempts}/{max_attempts}):\n{result.stderr}")
+
+    # Clean up plan and workspace checkpoint from S3 after successful apply
+    cleanup_keys = [key for key in (plan_s3_key, checkpoint["s3_key"] if checkpoint else "") if key]
+    if s3_client:
+        for key in cleanup_keys:
+            try:
+                with timings.span("s3_cleanup"):
+                    s3_client.delete_object(
+                        Bucket=s3_resource["bucket"],
+                        Key=key,
+                    )
+            except s3_errors() as e:
+                # Non-fatal: plan cleanup failure shouldn't fail the apply
+                print(
+                    f"[S3 Cleanup Warning] Failed to clean up plan artifact from S3 (non-fatal): {e}\n"
+                    f"  Key: {key}\n"
+                    f"  Consider setting S3 lifecycle policy to auto-expire old plans."
+                )
+
+    with timings.span("s3_offload"):
+        output = offload_output(result.stdout, s3_resource, module_dir, "apply_output", s3_client=s3_client)
+
+    # Restored workspaces have no git checkout to derive the repo-relative path from
+    repo_path = checkpoint["module_path"] if checkpoint else repo_relative_path(module_dir)
+    snapshot = None
+    if s3_client:
         try:
-            s3_client.delete_object(
-                Bucket=s3_resource["bucket"],
-                Key=plan_s3_key,
-            )
-        except (ClientError, BotoCoreError) as e:
-            # Non-fatal: plan cleanup failure shouldn't fail the apply
-            print(
-                f"[S3 Cleanup Warning] Failed to clean up plan from S3 (non-fatal): {e}\n"
-                f"  Key: {plan_s3_key}\n"
-                f"  Consider setting S3 lifecycle policy to auto-expire old plans."
-            )
-
-    return {"module_dir": str(module_dir), "applied": True, "output": result.stdout}
+            with timings.span("snapshot"):
+                snapshot = archive_module_state(module_dir, repo_path, s3_client, s3_resource)
+        except RuntimeError as e:
+            print(f"[Snapshot Warning] Failed to archive state snapshot (non-fatal): {e}")
+
+    job_id = os.environ.get("WM_JOB_ID", "")
+    if s3_client and job_id:
+        # Resources are recorded with the plan (plan_job_id)
+        summary = APPLY_SUMMARY_RE.search(result.stdout)
+        adds, changes, destroys = (int(n) for n in summary.groups()) if summary else (0, 0, 0)
+        try:
+            with timings.span("history"):
+                record = new_record(
+                    "apply",
+                    repo_path,
+                    job_id,
+                    sum(timings.as_dict().values()),
+                    plan_job_id=plan_s3_key.split("/")[-2] if plan_s3_key else "",
+                    adds=adds,
+                    changes=changes,
+                    destroys=destroys,
+                    terraform_version=terraform_version,
+                    peak_memory_mb=timings.peak_memory_mb(),
+                )
+                record_run(s3_client, s3_resource, record, [])
+        except RuntimeError as e:
+            print(f"[History Warning] Failed to record apply history (non-fatal): {e}")
+
+    release_workspace(module_dir)
+
+    timings.export("terraform_apply", module=module_dir)
+
+    return {
+        "module_dir": str(module_dir),
+        "applied": True,
+        "output": output,
+        "restored_checkpoint": restored,
+        "plan_source": plan_source,
+        "terraform_version": terraform_version,
+        "attempts": attempts,
+        "snapshot": snapshot,
+        "timings": timings.as_dict(),
+        "resource_usage": timings.usage_as_dict(),
+    }
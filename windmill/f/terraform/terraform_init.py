@@ -6,6 +6,17 @@ import subprocess
 from pathlib import Path
 from typing import TypedDict
 
+from f.terraform.instrumentation import Timings
+from f.terraform.provider_mirror import MIRROR_URL_ENV, write_cli_config
+from f.terraform.s3_artifacts import offload_output
+from f.terraform.state_summary import state_key
+from f.terraform.terraform_versions import resolve_terraform
+from f.terraform.workspace_pool import plugin_cache_lock
+
+# Path-style addressing for the S3 state backend ("true"/"false", default false);
+# only local stand-ins such as moto or MinIO without wildcard DNS need it
+BACKEND_PATH_STYLE_ENV = "TF_BACKEND_USE_PATH_STYLE"
+
 
 class s3(TypedDict):
     bucket: str
@@ -37,6 +48,7 @@ def main(
     s3: s3 | None = None,
     s3_bucket_prefix: str = "",
     tfc_token: str | None = None,
+    provider_mirror_url: str = "",
 ):
     """
     Initialize Terraform module.
@@ -50,15 +62,24 @@ def main(
         s3: S3 resource for state storage (optional, for S3 backend)
         s3_bucket_prefix: Optional prefix path within the bucket
         tfc_token: Terraform Cloud API token (optional, for TFC backend)
+        provider_mirror_url: Provider network mirror to install registry providers from
+            (defaults to the worker's TF_PROVIDER_MIRROR_URL; empty installs from the registry)
 
     Returns:
-        dict with init status and module info
+        dict with init status, module info, the Terraform version selected for the
+        module's required_version, per-phase timings and resource_usage of
+        resolve and terraform init (wall and CPU seconds, largest process RSS
+        and, where cgroup stats are available, combined memory peak in MiB)
     """
+    timings = Timings()
     module_dir = Path(workspace_path) / module_path
 
     if not module_dir.exists():
         raise ValueError(f"Module directory does not exist: {module_dir}")
 
+    with timings.process_span("resolve"):
+        terraform_bin, terraform_version = resolve_terraform(str(module_dir))
+
     uses_tfc = _uses_terraform_cloud(module_dir)
     env = os.environ.copy()
 
@@ -67,19 +88,16 @@ def main(
         if not tfc_token:
             raise ValueError(f"Terraform Cloud token required for module {module_path}. Set the tfc_token parameter or g/all/tfc_token variable.")
         env["TF_TOKEN_app_terraform_io"] = tfc_token
-        cmd = ["terraform", "init"]
+        cmd = [terraform_bin, "init"]
         backend_type = "terraform_cloud"
     else:
         # S3 backend configuration
         if not s3:
             raise ValueError("S3 configuration required for non-Terraform Cloud modules")
 
-        prefix = s3_bucket_prefix.strip("/") if s3_bucket_prefix else ""
-        state_key = f"{prefix}/terraform/{module_path}/terraform.tfstate" if prefix else f"terraform/{module_path}/terraform.tfstate"
-
         backend_config = [
             f"-backend-config=bucket={s3['bucket']}",
-            f"-backend-config=key={state_key}",
+            f"-backend-config=key={state_key(module_path, s3_bucket_prefix)}",
             f"-backend-config=region={s3['region']}",
             f"-backend-config=endpoint={s3['endPoint']}",
             f"-backend-config=access_key={s3['accessKey']}",
@@ -87,21 +105,37 @@ def main(
             "-backend-config=skip_credentials_validation=true",
             "-backend-config=skip_metadata_api_check=true",
             "-backend-config=skip_region_validation=true",
-            "-backend-config=use_path_style=false",
+            f"-backend-config=use_path_style={str(os.environ.get(BACKEND_PATH_STYLE_ENV, 'false').lower() == 'true').lower()}",
         ]
-        cmd = ["terraform", "init"] + backend_config
+        cmd = [terraform_bin, "init"] + backend_config
         backend_type = "s3"
 
-    result = subprocess.run(cmd, cwd=str(module_dir), capture_output=True, text=True, env=env)
+    mirror = provider_mirror_url or os.environ.get(MIRROR_URL_ENV, "")
+    if mirror:
+        env["TF_CLI_CONFIG_FILE"] = write_cli_config(mirror)
+
+    try:
+        # Inits sharing a worker's provider plugin cache (TF_PLUGIN_CACHE_DIR) run one at a time
+        with plugin_cache_lock(env), timings.process_span("init"):
+            result = subprocess.run(cmd, cwd=str(module_dir), capture_output=True, text=True, env=env)
+    finally:
+        if mirror:
+            os.unlink(env["TF_CLI_CONFIG_FILE"])
 
     if result.returncode != 0:
         # Raise exception to trigger failure_module - stderr is safe (no tokens)
         raise RuntimeError(f"Terraform init failed (exit {result.returncode}):\n{result.stderr}")
 
+    timings.export("terraform_init", module=module_path)
+
     return {
         "module_path": module_path,
         "module_dir": str(module_dir),
         "initialized": True,
         "backend_type": backend_type,
-        "output": result.stdout,
+        "provider_mirror": mirror or None,
+        "terraform_version": terraform_version,
+        "output": offload_output(result.stdout, s3, module_path, "init_output"),
+        "timings": timings.as_dict(),
+        "resource_usage": timings.usage_as_dict(),
     }
@@ -1,6 +1,7 @@
 """Run Terraform plan and store plan artifact in S3."""
 # requirements:
 # boto3
+# pyyaml
 
 import json
 import os
@@ -8,9 +9,15 @@ import subprocess
 from pathlib import Path
 from typing import TypedDict
 
-import boto3
-from botocore.config import Config
-from botocore.exceptions import BotoCoreError, ClientError
+from f.terraform.checkpoint import create_checkpoint, file_sha256
+from f.terraform.history import head_commit, new_record, record_run
+from f.terraform.instrumentation import Timings
+from f.terraform.plan_risk import assess, digest, load_rules, read_plan, resource_actions
+from f.terraform.retry import DEFAULT_LOCK_TIMEOUT, DEFAULT_MAX_ATTEMPTS, diagnostics, run_with_retry
+from f.terraform.s3_artifacts import create_s3_client, offload_output, repo_relative_path, s3_errors, sanitize_module_path
+from f.terraform.speculative import load_speculative, module_tree, plan_inputs, state_version, store_speculative
+from f.terraform.terraform_versions import resolve_terraform
+from f.terraform.workspace_pool import release_workspace
 
 
 class s3(TypedDict):
@@ -23,27 +30,71 @@ class s3(TypedDict):
     pathStyle: bool
 
 
-def _create_s3_client(s3_resource: s3):
-    """Create boto3 S3 client with proper configuration from Windmill resource."""
-    addressing_style = "path" if s3_resource.get("pathStyle", True) else "virtual"
-    return boto3.client(
-        "s3",
-        endpoint_url=s3_resource["endPoint"],
-        aws_access_key_id=s3_resource["accessKey"],
-        aws_secret_access_key=s3_resource["secretKey"],
-        region_name=s3_resource.get("region", "auto"),
-        use_ssl=s3_resource.get("useSSL", True),
-        config=Config(s3={"addressing_style": addressing_style}),
-    )
+def _run_plan(
+    module_path: Path,
+    env: dict,
+    refresh_only: bool,
+    terraform_bin: str,
+    lock_timeout: str,
+    max_attempts: int,
+    timings: Timings,
+) -> tuple[dict, list, bool, str, int]:
+    """Run terraform plan (retrying transient failures) and show.
 
+    Returns:
+        Tuple of (change counts, drifted resources, whether anything changes, show output, plan attempts)
+    """
+    cmd = [terraform_bin, "plan", "-out=tfplan", "-json"]
+    if refresh_only:
+        # Read-only check: don't block deploys holding or waiting for the state lock
+        cmd += ["-refresh-only", "-detailed-exitcode", "-lock=false"]
+    else:
+        cmd.append(f"-lock-timeout={lock_timeout}")
+    with timings.process_span("plan"):
+        # -detailed-exitcode: 2 means succeeded with changes
+        result, attempts = run_with_retry(cmd, str(module_path), env, ok_codes=(0, 2) if refresh_only else (0,), max_attempts=max_attempts)
 
-def _sanitize_module_path(module_dir: str) -> str:
-    """Sanitize module path for S3 key to prevent collisions.
+    if result.returncode != 0 and not (refresh_only and result.returncode == 2):
+        # With -json, error diagnostics are on stdout rather than stderr
+        errors = "\n".join(diagnostics(result.stdout)) or result.stderr
+        raise RuntimeError(f"Terraform plan failed (exit {result.returncode}, attempt {attempts}/{max_attempts}):\n{errors}")
 
-    Uses '--' as separator to distinguish from literal hyphens in paths.
-    Example: 'tf/vault' -> 'tf--vault', 'tf-core/services' -> 'tf-core--services'
-    """
-    return module_dir.replace("/", "--").strip("-")
+    # Parse plan output
+    plan_lines = result.stdout.strip().split("\n")
+    changes = {"add": 0, "change": 0, "destroy": 0}
+    drift = []
+
+    for line in plan_lines:
+        try:
+            data = json.loads(line)
+            if data.get("type") == "change_summary":
+                raw_changes = data.get("changes", {})
+                changes = {
+                    "add": int(raw_changes.get("add", 0)),
+                    "change": int(raw_changes.get("change", 0)),
+                    "destroy": int(raw_changes.get("destroy", 0)),
+                }
+            elif data.get("type") == "resource_drift":
+                change = data.get("change", {})
+                drift.append({"address": change.get("resource", {}).get("addr", ""), "action": change.get("action", "")})
+        except json.JSONDecodeError:
+            continue
+
+    # Get human-readable plan
+    with timings.process_span("show"):
+        show_result = subprocess.run(
+            [terraform_bin, "show", "-no-color", "tfplan"],
+            cwd=str(module_path),
+            capture_output=True,
+            text=True,
+            env=env,
+        )
+
+    if show_result.returncode != 0:
+        raise RuntimeError(f"Terraform show failed (exit {show_result.returncode}):\n{show_result.stderr}")
+
+    has_changes = result.returncode == 2 if refresh_only else sum(changes.values()) > 0
+    return changes, drift, has_changes, show_result.stdout, attempts
 
 
 def main(
@@ -52,6 +103,10 @@ def main(
     vault_token: str = "",
     tfc_token: str | None = None,
     s3_resource: s3 | None = None,
+    refresh_only: bool = False,
+    speculative: bool = False,
+    lock_timeout: str = DEFAULT_LOCK_TIMEOUT,
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS,
 ):
     """
     Run Terraform plan and optionally store plan in S3.
@@ -59,22 +114,62 @@ def main(
     Uses Windmill's WM_JOB_ID environment variable for unique plan storage.
     S3 storage is skipped if s3_resource is not provided or WM_JOB_ID is not set.
 
+    With refresh_only, runs a drift check instead (`-refresh-only
+    -detailed-exitcode`, without taking the state lock). The plan is not meant
+    to be applied, so it is neither uploaded nor checkpointed, and the caller
+    keeps ownership of the workspace.
+
+    With speculative, the plan is stored under the module's git tree SHA with
+    the state serial it was planned against, instead of per job. A later
+    regular plan of the same tree reuses it (skipping plan and show) if the
+    state lineage and serial, the upstream modules' states and the files read
+    from outside the tree are unchanged.
+
+    Transient plan failures (state lock held past lock_timeout, provider
+    429/5xx, network errors) are retried with jittered backoff up to
+    max_attempts times, so the flow doesn't repeat clone and init.
+
     Args:
         module_dir: Path to Terraform module directory
         vault_addr: Vault server address
         vault_token: Vault authentication token
         tfc_token: Terraform Cloud API token (optional)
         s3_resource: S3 resource for storing plan artifacts
+        refresh_only: Detect drift between state and real infrastructure only
+        speculative: Plan ahead of a deploy (stored for reuse, never applied)
+        lock_timeout: How long terraform waits for a held state lock (-lock-timeout)
+        max_attempts: Plan attempts when failures are transient
 
     Returns:
         dict with keys:
             - module_dir: Original module directory path
             - plan_summary: Human-readable summary (e.g., "Plan: 1 to add, 0 to change, 0 to destroy")
-            - plan_details: Full terraform show output
+            - plan_details: Full terraform show output, or an S3 output reference
+              (key, size, sha256, digest) when larger than the output size budget
             - changes: dict with add/change/destroy counts
-            - has_changes: bool indicating if any resources will change
+            - has_changes: bool indicating if any resources will change (drifted, with refresh_only)
+            - drift: Resources changed outside Terraform, as {address, action} (refresh_only)
             - plan_s3_key: S3 key where plan is stored (None if S3 not configured)
+            - plan_sha256: SHA-256 of the plan file, verified by terraform_apply
+            - checkpoint: Workspace archive reference in S3 so apply can run on any
+              worker (None if S3 not configured or no changes)
+            - speculative_key: S3 prefix of the stored speculative plan (speculative)
+            - reused_speculative: Whether a speculative plan was reused instead of planning
+            - terraform_version: Terraform version selected for the module's required_version
+            - attempts: Plan attempts made (0 when a speculative plan was reused)
+            - risk: Score of the changes against the module's approval.yaml, with
+              auto_approve set when only allow-listed additions are planned
+              (None without changes or if the plan could not be assessed)
+            - digest: Changes grouped by resource type and action, with example
+              addresses, changed attribute names for updates and a rendered
+              `text` for notifications (None without changes or if the plan could not be read)
+            - timings: Seconds spent per phase (resolve, speculative_lookup, state, inputs, plan, show, s3_upload, risk, checkpoint, history)
+            - resource_usage: Wall and user/system CPU seconds, largest process RSS
+              and combined cgroup memory peak (MiB) of terraform and its providers for each phase that runs terraform
+              (resolve, speculative_lookup, state, plan, show, risk), with
+              aggregate set when concurrent phases in the job were counted too
     """
+    timings = Timings()
     module_path = Path(module_dir)
 
     if not module_path.exists():
@@ -89,76 +184,145 @@ def main(
     if tfc_token:
         env["TF_TOKEN_app_terraform_io"] = tfc_token
 
-    # Run terraform plan with JSON output
-    plan_file = module_path / "tfplan"
-    result = subprocess.run(
-        ["terraform", "plan", "-out=tfplan", "-json"],
-        cwd=str(module_path),
-        capture_output=True,
-        text=True,
-        env=env,
-    )
-
-    if result.returncode != 0:
-        raise RuntimeError(f"Terraform plan failed (exit {result.returncode}):\n{result.stderr}")
+    # May probe `terraform version` of the binary on PATH
+    with timings.process_span("resolve"):
+        terraform_bin, terraform_version = resolve_terraform(module_dir)
 
-    # Parse plan output
-    plan_lines = result.stdout.strip().split("\n")
-    changes = {"add": 0, "change": 0, "destroy": 0}
-
-    for line in plan_lines:
-        try:
-            data = json.loads(line)
-            if data.get("type") == "change_summary":
-                raw_changes = data.get("changes", {})
-                changes = {
-                    "add": int(raw_changes.get("add", 0)),
-                    "change": int(raw_changes.get("change", 0)),
-                    "destroy": int(raw_changes.get("destroy", 0)),
-                }
-        except json.JSONDecodeError:
-            continue
+    plan_file = module_path / "tfplan"
+    s3_client = create_s3_client(s3_resource) if s3_resource else None
+    job_id = os.environ.get("WM_JOB_ID", "")
 
-    # Get human-readable plan
-    show_result = subprocess.run(
-        ["terraform", "show", "-no-color", "tfplan"],
-        cwd=str(module_path),
-        capture_output=True,
-        text=True,
-        env=env,
-    )
+    speculative_plan = None
+    if s3_client and not (refresh_only or speculative):
+        # May run `terraform state pull` when state cannot be read from S3 directly
+        with timings.process_span("speculative_lookup"):
+            speculative_plan = load_speculative(module_dir, env, plan_file, s3_client, s3_resource, (terraform_bin, terraform_version))
 
-    if show_result.returncode != 0:
-        raise RuntimeError(f"Terraform show failed (exit {show_result.returncode}):\n{show_result.stderr}")
+    if speculative_plan:
+        changes, drift, has_changes, show_output = speculative_plan["changes"], [], speculative_plan["has_changes"], speculative_plan["plan_details"]
+        attempts = 0
+    else:
+        # Read before planning: any state change after this makes the plan stale
+        state = inputs = None
+        if speculative:
+            with timings.process_span("state"):
+                state = state_version(module_dir, env, terraform_bin, s3_client)
+            with timings.span("inputs"):
+                try:
+                    inputs = plan_inputs(module_dir, s3_client)
+                except (RuntimeError, ValueError, OSError) as e:
+                    print(f"[Speculative Warning] Could not read upstream states or outside files, plan will not be reused (non-fatal): {e}")
+        changes, drift, has_changes, show_output, attempts = _run_plan(module_path, env, refresh_only, terraform_bin, lock_timeout, max_attempts, timings)
 
     plan_summary = f"Plan: {changes.get('add', 0)} to add, {changes.get('change', 0)} to change, {changes.get('destroy', 0)} to destroy"
+    if refresh_only:
+        plan_summary = f"Drift: {len(drift)} resources changed outside Terraform"
 
-    # Upload plan to S3 if resource provided and WM_JOB_ID is set
+    plan_sha256 = file_sha256(plan_file)
     plan_s3_key = None
-    job_id = os.environ.get("WM_JOB_ID", "")
-    if s3_resource and job_id:
-        module_key = _sanitize_module_path(module_dir)
+    speculative_key = None
+    if speculative:
+        if not s3_client:
+            raise ValueError("S3 resource required for speculative plans")
+        metadata = {
+            "tree": module_tree(module_dir),
+            "state": state,
+            "inputs": inputs,
+            "terraform_version": terraform_version,
+            "plan_sha256": plan_sha256,
+            "changes": changes,
+            "has_changes": has_changes,
+            "plan_details": show_output,
+            "job_id": job_id,
+        }
+        with timings.span("s3_upload"):
+            speculative_key = store_speculative(module_dir, plan_file, metadata, s3_client, s3_resource)
+    elif s3_client and job_id and not refresh_only:
+        # Upload plan to S3 if resource provided and WM_JOB_ID is set
+        module_key = sanitize_module_path(module_dir)
         plan_s3_key = f"terraform-plans/{module_key}/{job_id}/tfplan"
-        s3_client = _create_s3_client(s3_resource)
 
         try:
-            s3_client.upload_file(
-                str(plan_file),
-                s3_resource["bucket"],
-                plan_s3_key,
-            )
-        except (ClientError, BotoCoreError) as e:
+            with timings.span("s3_upload"):
+                s3_client.upload_file(
+                    str(plan_file),
+                    s3_resource["bucket"],
+                    plan_s3_key,
+                    # Lets apply verify a local plan with a HEAD request instead of downloading
+                    ExtraArgs={"Metadata": {"sha256": plan_sha256}},
+                )
+        except s3_errors() as e:
             raise RuntimeError(
                 f"[S3 Upload Error] Terraform plan succeeded but failed to upload to S3: {e}\n"
                 f"  Key: {plan_s3_key}\n"
                 f"  Bucket: {s3_resource['bucket']}"
-            )
+            ) from e
+
+    with timings.span("s3_offload"):
+        plan_details = offload_output(show_output, s3_resource, module_dir, "plan_details", s3_client=s3_client)
+
+    risk = None
+    plan_digest = None
+    resources = []
+    if has_changes and not refresh_only:
+        try:
+            with timings.process_span("risk"):
+                plan_json = read_plan(module_dir, env, terraform_bin)
+                plan_digest = digest(plan_json)
+                risk = assess(plan_json, load_rules(module_dir))
+            resources = resource_actions(plan_json)
+        except (RuntimeError, ValueError) as e:
+            # Without an assessment the plan simply goes through approval
+            print(f"[Risk Warning] Could not assess plan, approval required (non-fatal): {e}")
+
+    checkpoint = None
+    if has_changes and plan_s3_key:
+        # Apply may resume on another worker after the approval suspend
+        with timings.span("checkpoint"):
+            checkpoint = create_checkpoint(module_dir, s3_client, s3_resource, job_id)
+
+    if plan_s3_key:
+        # Searchable history (see query_history); resources are recorded here, applies link back by job
+        try:
+            with timings.span("history"):
+                record = new_record(
+                    "plan",
+                    repo_relative_path(module_dir),
+                    job_id,
+                    sum(timings.as_dict().values()),
+                    commit_sha=head_commit(module_dir),
+                    adds=changes.get("add", 0),
+                    changes=changes.get("change", 0),
+                    destroys=changes.get("destroy", 0),
+                    terraform_version=terraform_version,
+                    peak_memory_mb=timings.peak_memory_mb(),
+                )
+                record_run(s3_client, s3_resource, record, resources)
+        except RuntimeError as e:
+            print(f"[History Warning] Failed to record plan history (non-fatal): {e}")
+
+    if speculative or (not has_changes and not refresh_only):
+        # Flow ends here without apply - hand the workspace back to the pool
+        release_workspace(module_dir)
+
+    timings.export("terraform_plan", module=module_dir)
 
     return {
         "module_dir": str(module_dir),
         "plan_summary": plan_summary,
-        "plan_details": show_result.stdout,
+        "plan_details": plan_details,
         "changes": changes,
-        "has_changes": sum(changes.values()) > 0,
+        "has_changes": has_changes,
+        "drift": drift,
         "plan_s3_key": plan_s3_key,
+        "plan_sha256": plan_sha256,
+        "checkpoint": checkpoint,
+        "speculative_key": speculative_key,
+        "reused_speculative": speculative_plan is not None,
+        "terraform_version": terraform_version,
+        "attempts": attempts,
+        "risk": risk,
+        "digest": plan_digest,
+        "timings": timings.as_dict(),
+        "resource_usage": timings.usage_as_dict(),
     }
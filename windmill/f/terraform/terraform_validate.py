@@ -0,0 +1,161 @@
+"""Fast-fail static checks (fmt, validate) before the backend init and plan."""
+# requirements:
+# boto3
+
+import json
+import os
+import subprocess
+from pathlib import Path
+
+from f.terraform.instrumentation import Timings
+from f.terraform.provider_mirror import MIRROR_URL_ENV, write_cli_config
+from f.terraform.s3_artifacts import create_s3_client, s3, s3_errors, sanitize_module_path
+from f.terraform.speculative import module_tree
+from f.terraform.terraform_versions import resolve_terraform
+from f.terraform.workspace_pool import DEFAULT_POOL_DIR, PLUGIN_CACHE_DIR, plugin_cache_lock, release_workspace
+
+# Results keyed by module tree and Terraform version: terraform-validate/<module--path>/<tree>-<version>.json
+VALIDATE_PREFIX = "terraform-validate/"
+
+
+def validate_key(module_dir: str, tree: str, terraform_version: str) -> str:
+    """S3 key of the cached result for a module tree checked with a Terraform version."""
+    return f"{VALIDATE_PREFIX}{sanitize_module_path(module_dir)}/{tree}-{terraform_version}.json"
+
+
+def _format_diagnostic(diagnostic: dict) -> str:
+    """One line per `terraform validate -json` diagnostic: file:line: summary: detail."""
+    source = diagnostic.get("range", {})
+    location = f"{source['filename']}:{source['start']['line']}: " if source else ""
+    detail = f": {diagnostic['detail']}" if diagnostic.get("detail") else ""
+    return f"{location}{diagnostic.get('summary', '')}{detail}"
+
+
+def _check(module_dir: Path, terraform_bin: str, env: dict, timings: Timings) -> dict:
+    """Run fmt -check and validate against a backend-less init.
+
+    fmt always runs so a cached result serves callers with and without check_fmt.
+
+    Raises:
+        RuntimeError: If the backend-less init fails (not cached: usually a provider download problem)
+    """
+    with timings.process_span("fmt"):
+        result = subprocess.run([terraform_bin, "fmt", "-check", "-recursive", "-list=true"], cwd=module_dir, capture_output=True, text=True, env=env)
+    unformatted = result.stdout.split()
+
+    # Installs providers (from the plugin cache) into .terraform/, which the backend init then reuses
+    with plugin_cache_lock(env), timings.process_span("init"):
+        result = subprocess.run([terraform_bin, "init", "-backend=false", "-input=false"], cwd=module_dir, capture_output=True, text=True, env=env)
+    if result.returncode != 0:
+        raise RuntimeError(f"Terraform init -backend=false failed (exit {result.returncode}):\n{result.stderr}")
+
+    with timings.process_span("validate"):
+        result = subprocess.run([terraform_bin, "validate", "-json"], cwd=module_dir, capture_output=True, text=True, env=env)
+    try:
+        report = json.loads(result.stdout)
+    except json.JSONDecodeError:
+        report = {"valid": False, "diagnostics": [{"severity": "error", "summary": result.stderr.strip()}]}
+    errors = [_format_diagnostic(d) for d in report.get("diagnostics", []) if d.get("severity") == "error"]
+    warnings = [_format_diagnostic(d) for d in report.get("diagnostics", []) if d.get("severity") == "warning"]
+
+    return {"valid": report.get("valid", False), "unformatted": unformatted, "errors": errors, "warnings": warnings}
+
+
+def main(
+    workspace_path: str,
+    module_path: str,
+    s3: s3 | None = None,
+    check_fmt: bool = True,
+    provider_mirror_url: str = "",
+):
+    """
+    Check a module with `terraform fmt -check` and `terraform validate` before init and plan.
+
+    Needs neither backend credentials nor Vault, so a broken commit fails in
+    seconds without taking the state lock. Providers come from the worker's
+    plugin cache (and the provider mirror). Results are cached in S3 per
+    module tree and Terraform version, so re-running an unchanged module skips
+    the checks.
+
+    Args:
+        workspace_path: Path to cloned repository
+        module_path: Relative path to Terraform module (e.g., "tf/vault")
+        s3: S3 resource for the result cache (optional; without it every run checks)
+        check_fmt: Fail on files `terraform fmt` would change
+        provider_mirror_url: Provider network mirror to install registry providers from
+            (defaults to the worker's TF_PROVIDER_MIRROR_URL; empty installs from the registry)
+
+    Returns:
+        dict with valid, cached, unformatted files, warnings, the Terraform
+        version, the module tree, per-phase timings (resolve, cache_lookup,
+        fmt, init, validate, cache_store) and resource_usage of the phases that
+        run terraform (wall and CPU seconds, largest process RSS and, where
+        cgroup stats are available, combined memory peak in MiB)
+
+    Raises:
+        RuntimeError: If the module is unformatted or invalid (the pooled
+            workspace is released, since no plan or apply follows)
+    """
+    timings = Timings()
+    module_dir = Path(workspace_path) / module_path
+
+    if not module_dir.exists():
+        raise ValueError(f"Module directory does not exist: {module_dir}")
+
+    with timings.process_span("resolve"):
+        terraform_bin, terraform_version = resolve_terraform(str(module_dir))
+    tree = module_tree(str(module_dir))
+    key = validate_key(str(module_dir), tree, terraform_version)
+    s3_client = create_s3_client(s3) if s3 else None
+
+    report = None
+    if s3_client:
+        try:
+            with timings.span("cache_lookup"):
+                response = s3_client.get_object(Bucket=s3["bucket"], Key=key)
+                report = json.loads(response["Body"].read())
+        except s3_errors() as e:
+            # A missing result (NoSuchKey/404) is the normal miss; anything else is worth a warning
+            if getattr(e, "response", {}).get("Error", {}).get("Code") not in ("NoSuchKey", "404"):
+                print(f"[Validate Warning] Cache lookup failed, checking normally (non-fatal): {e}")
+
+    cached = report is not None
+    if not cached:
+        env = os.environ.copy()
+        env.setdefault("TF_PLUGIN_CACHE_DIR", str(Path(DEFAULT_POOL_DIR) / PLUGIN_CACHE_DIR))
+        Path(env["TF_PLUGIN_CACHE_DIR"]).mkdir(parents=True, exist_ok=True)
+        mirror = provider_mirror_url or os.environ.get(MIRROR_URL_ENV, "")
+        if mirror:
+            env["TF_CLI_CONFIG_FILE"] = write_cli_config(mirror)
+        try:
+            report = _check(module_dir, terraform_bin, env, timings)
+        finally:
+            if mirror:
+                os.unlink(env["TF_CLI_CONFIG_FILE"])
+
+        if s3_client:
+            try:
+                with timings.span("cache_store"):
+                    s3_client.put_object(Bucket=s3["bucket"], Key=key, Body=json.dumps(report).encode(), ContentType="application/json")
+            except s3_errors() as e:
+                print(f"[Validate Warning] Failed to cache result (non-fatal): {e}")
+
+    timings.export("terraform_validate", module=module_path)
+
+    unformatted = report["unformatted"] if check_fmt else []
+    if unformatted or not report["valid"]:
+        release_workspace(str(module_dir))
+        problems = [f"not formatted (run terraform fmt): {path}" for path in unformatted] + report["errors"]
+        raise RuntimeError(f"Terraform validation failed for {module_path}{' (cached result)' if cached else ''}:\n" + "\n".join(problems))
+
+    return {
+        "module_path": module_path,
+        "valid": True,
+        "cached": cached,
+        "unformatted": report["unformatted"],
+        "warnings": report["warnings"],
+        "terraform_version": terraform_version,
+        "tree": tree,
+        "timings": timings.as_dict(),
+        "resource_usage": timings.usage_as_dict(),
+    }
@@ -0,0 +1,191 @@
+"""Select a Terraform binary matching each module's required_version."""
+
+import fcntl
+import functools
+import hashlib
+import json
+import os
+import platform
+import re
+import shutil
+import subprocess
+import tempfile
+from pathlib import Path
+
+# Extracted binaries: <versions_dir>/<version>/terraform
+VERSIONS_DIR_ENV = "TF_VERSIONS_DIR"
+DEFAULT_VERSIONS_DIR = "/tmp/terraform-versions"
+# Releases mirror in releases.hashicorp.com layout:
+#   <url>/index.json, <url>/<version>/terraform_<version>_<os>_<arch>.zip, <url>/<version>/terraform_<version>_SHA256SUMS
+# (scripts/sync-provider-mirror.py --terraform fills RELEASES_PREFIX in the artifacts bucket)
+RELEASES_PREFIX = "terraform-releases/"
+RELEASES_URL_ENV = "TF_RELEASES_MIRROR_URL"
+DEFAULT_RELEASES_URL = "https://releases.hashicorp.com/terraform"
+DOWNLOAD_TIMEOUT = 120  # seconds
+
+REQUIRED_VERSION_RE = re.compile(r'^\s*required_version\s*=\s*"([^"]+)"', re.MULTILINE)
+CONSTRAINT_RE = re.compile(r"^\s*(=|!=|>=|<=|>|<|~>)?\s*v?(\d+(?:\.\d+){0,2})\s*$")
+ARCHITECTURES = {"x86_64": "amd64", "amd64": "amd64", "aarch64": "arm64", "arm64": "arm64"}
+
+
+def parse_version(text: str) -> tuple[int, int, int] | None:
+    """Parse 'X.Y.Z' into a tuple; pre-releases and other formats return None."""
+    match = re.fullmatch(r"v?(\d+)\.(\d+)\.(\d+)", text.strip())
+    return tuple(int(part) for part in match.groups()) if match else None
+
+
+def parse_constraints(text: str) -> list[tuple[str, tuple[int, ...]]]:
+    """Parse a comma-separated constraint string (e.g. '>= 1.5, ~> 1.14.0').
+
+    Raises:
+        ValueError: If a constraint is not understood
+    """
+    constraints = []
+    for part in filter(None, (item.strip() for item in text.split(","))):
+        match = CONSTRAINT_RE.match(part)
+        if not match:
+            raise ValueError(f"Unsupported Terraform version constraint: {part!r}")
+        constraints.append((match.group(1) or "=", tuple(int(n) for n in match.group(2).split("."))))
+    return constraints
+
+
+def satisfies(version: tuple[int, int, int], constraints: list[tuple[str, tuple[int, ...]]]) -> bool:
+    """Check a version against parsed constraints, following Terraform's semantics."""
+    for op, bound in constraints:
+        padded = bound + (0,) * (3 - len(bound))
+        if op == "~>":
+            # Only the rightmost specified component may increase: ~> 1.14.0 is >= 1.14.0, < 1.15.0
+            prefix = bound[:-1] if len(bound) > 1 else bound
+            ok = version >= padded and version[: len(prefix)] == prefix
+        else:
+            ok = {
+                "=": version == padded,
+                "!=": version != padded,
+                ">": version > padded,
+                ">=": version >= padded,
+                "<": version < padded,
+                "<=": version <= padded,
+            }[op]
+        if not ok:
+            return False
+    return True
+
+
+def newest_matching(versions, constraint: str) -> str | None:
+    """Return the newest of the given version strings satisfying a constraint string."""
+    constraints = parse_constraints(constraint)
+    matching = [version for version in map(parse_version, versions) if version and satisfies(version, constraints)]
+    return ".".join(map(str, max(matching))) if matching else None
+
+
+def required_version(module_dir: str) -> str:
+    """Return the module's combined required_version constraints ('' if unconstrained)."""
+    found = []
+    for tf_file in sorted(Path(module_dir).glob("*.tf")):
+        found.extend(REQUIRED_VERSION_RE.findall(tf_file.read_text()))
+    return ", ".join(found)
+
+
+def _platform() -> str:
+    return f"{platform.system().lower()}_{ARCHITECTURES.get(platform.machine().lower(), platform.machine().lower())}"
+
+
+@functools.cache
+def _path_terraform() -> tuple[tuple[int, int, int], str] | None:
+    """Version and path of the terraform on PATH, if any."""
+    binary = shutil.which("terraform")
+    if not binary:
+        return None
+    result = subprocess.run([binary, "version", "-json"], capture_output=True, text=True)
+    if result.returncode != 0:
+        return None
+    version = parse_version(json.loads(result.stdout).get("terraform_version", ""))
+    return (version, binary) if version else None
+
+
+def _cached(versions_dir: Path) -> dict[tuple[int, int, int], str]:
+    """Versions already extracted into the cache."""
+    cached = {}
+    if versions_dir.exists():
+        for entry in versions_dir.iterdir():
+            version = parse_version(entry.name)
+            if version and (entry / "terraform").is_file():
+                cached[version] = str(entry / "terraform")
+    return cached
+
+
+def _fetch(url: str) -> bytes:
+    import urllib.request  # Only needed on a cache miss
+
+    with urllib.request.urlopen(url, timeout=DOWNLOAD_TIMEOUT) as response:
+        return response.read()
+
+
+def _install(version: str, versions_dir: Path, releases_url: str) -> str:
+    """Download, verify and extract one release into the cache; return the binary path."""
+    import zipfile
+
+    target = versions_dir / version
+    filename = f"terraform_{version}_{_platform()}.zip"
+    versions_dir.mkdir(parents=True, exist_ok=True)
+
+    # Serialize installs across concurrent jobs on the worker
+    with open(versions_dir / ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if (target / "terraform").is_file():
+            return str(target / "terraform")
+
+        sums = _fetch(f"{releases_url}/{version}/terraform_{version}_SHA256SUMS").decode()
+        expected = next((line.split()[0] for line in sums.splitlines() if line.endswith(f" {filename}")), None)
+        if not expected:
+            raise RuntimeError(f"No checksum for {filename} in the Terraform releases mirror")
+        archive = _fetch(f"{releases_url}/{version}/{filename}")
+        if hashlib.sha256(archive).hexdigest() != expected:
+            raise RuntimeError(f"Checksum mismatch for {filename} from {releases_url}")
+
+        with tempfile.TemporaryDirectory(dir=versions_dir) as tmp_dir:
+            zip_path = Path(tmp_dir) / filename
+            zip_path.write_bytes(archive)
+            extracted = Path(tmp_dir) / version
+            with zipfile.ZipFile(zip_path) as zf:
+                zf.extract("terraform", extracted)
+            (extracted / "terraform").chmod(0o755)
+            extracted.rename(target)
+    return str(target / "terraform")
+
+
+def resolve_terraform(module_dir: str) -> tuple[str, str]:
+    """Pick the Terraform binary for a module.
+
+    Preference: the terraform on PATH if it satisfies required_version, then
+    the newest matching version in the local cache, then the newest matching
+    release from the releases mirror (downloaded into the cache once).
+
+    Returns:
+        Tuple of (binary path, version)
+
+    Raises:
+        RuntimeError: If no available version satisfies the constraints
+    """
+    constraint = required_version(module_dir)
+    constraints = parse_constraints(constraint)
+
+    on_path = _path_terraform()
+    if on_path and satisfies(on_path[0], constraints):
+        return on_path[1], ".".join(map(str, on_path[0]))
+
+    versions_dir = Path(os.environ.get(VERSIONS_DIR_ENV, DEFAULT_VERSIONS_DIR))
+    cached = {version: path for version, path in _cached(versions_dir).items() if satisfies(version, constraints)}
+    if cached:
+        best = max(cached)
+        return cached[best], ".".join(map(str, best))
+
+    releases_url = os.environ.get(RELEASES_URL_ENV, DEFAULT_RELEASES_URL).rstrip("/")
+    try:
+        index = json.loads(_fetch(f"{releases_url}/index.json"))
+    except OSError as e:
+        raise RuntimeError(f"No cached Terraform matches {constraint!r} and the releases mirror is unreachable: {e}") from e
+    best = newest_matching(index.get("versions", {}), constraint)
+    if not best:
+        raise RuntimeError(f"No Terraform release matches required_version {constraint!r} in {releases_url}")
+    return _install(best, versions_dir, releases_url), best
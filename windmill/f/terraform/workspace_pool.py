@@ -0,0 +1,217 @@
+"""Worker-local pool of isolated Terraform workspaces."""
+
+import fcntl
+import json
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+DEFAULT_POOL_DIR = "/tmp/terraform-workspaces"
+META_DIR = ".meta"
+LOCK_FILE = ".lock"
+# Provider plugin cache shared across runs on a worker; pool maintenance skips dot-directories
+PLUGIN_CACHE_DIR = ".plugin-cache"
+
+# A workspace stays leased across the approval suspend (up to 86400s) plus slack
+DEFAULT_LEASE_SECONDS = 26 * 3600
+# Released workspaces idle longer than this are removed even under quota
+DEFAULT_MAX_IDLE_SECONDS = 7 * 86400
+# Total pool size cap, overridable per worker
+MAX_BYTES_ENV = "TF_WORKSPACE_POOL_MAX_BYTES"
+DEFAULT_MAX_BYTES = 20 * 1024**3
+
+
+def _dir_size(path: Path) -> int:
+    """Return total size in bytes of regular files under path (symlinks not followed)."""
+    total = 0
+    stack = [path]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(Path(entry.path))
+                    elif entry.is_file(follow_symlinks=False):
+                        total += entry.stat(follow_symlinks=False).st_size
+                except OSError:
+                    continue
+    return total
+
+
+class WorkspacePool:
+    """Per-job workspaces carved from a shared directory on the worker.
+
+    Layout:
+        <pool_dir>/<job_id>/            checkout used by one flow run
+        <pool_dir>/.meta/<job_id>.json  lease metadata (repository, ref, state, last_used)
+        <pool_dir>/.lock                flock guarding metadata changes
+
+    Workspaces are leased on acquire and returned to the pool on release (or
+    when the lease expires). Released checkouts are handed to later runs of
+    the same repository - preferring the same ref - so clones and provider
+    downloads in .terraform/ are reused. Idle and least-recently-used
+    checkouts are evicted to keep the pool under its disk quota.
+    """
+
+    def __init__(
+        self,
+        pool_dir: str = DEFAULT_POOL_DIR,
+        max_bytes: int | None = None,
+        lease_seconds: int = DEFAULT_LEASE_SECONDS,
+        max_idle_seconds: int = DEFAULT_MAX_IDLE_SECONDS,
+    ) -> None:
+        self.pool_dir = Path(pool_dir)
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.environ.get(MAX_BYTES_ENV, DEFAULT_MAX_BYTES))
+        self.lease_seconds = lease_seconds
+        self.max_idle_seconds = max_idle_seconds
+
+    @contextmanager
+    def _locked(self):
+        """Hold the pool lock, serializing metadata changes across concurrent jobs."""
+        (self.pool_dir / META_DIR).mkdir(parents=True, exist_ok=True)
+        with open(self.pool_dir / LOCK_FILE, "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _meta_path(self, name: str) -> Path:
+        return self.pool_dir / META_DIR / f"{name}.json"
+
+    def _read_meta(self, name: str) -> dict | None:
+        try:
+            return json.loads(self._meta_path(name).read_text())
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def _write_meta(self, name: str, meta: dict) -> None:
+        tmp = self._meta_path(name).with_suffix(".tmp")
+        tmp.write_text(json.dumps(meta))
+        tmp.replace(self._meta_path(name))
+
+    def _workspaces(self) -> dict[str, dict]:
+        """Return metadata for every workspace directory, synthesizing it for orphans."""
+        workspaces = {}
+        for path in self.pool_dir.iterdir():
+            if not path.is_dir() or path.name.startswith("."):
+                continue
+            meta = self._read_meta(path.name)
+            if meta is None:
+                # Directory without metadata (e.g. crashed mid-acquire): treat as leased since its mtime
+                meta = {"state": "in_use", "last_used": path.stat().st_mtime}
+            workspaces[path.name] = meta
+        return workspaces
+
+    def _is_free(self, meta: dict, now: float) -> bool:
+        """A workspace is free once released or when its lease has expired."""
+        return meta.get("state") == "released" or now - meta.get("last_used", 0) > self.lease_seconds
+
+    def _remove(self, name: str) -> None:
+        shutil.rmtree(self.pool_dir / name, ignore_errors=True)
+        self._meta_path(name).unlink(missing_ok=True)
+
+    def _enforce_quota(self, now: float) -> int:
+        """Evict idle and least-recently-used free workspaces; return bytes reclaimed.
+
+        Raises:
+            RuntimeError: If leased workspaces alone exceed the quota
+        """
+        workspaces = self._workspaces()
+        sizes = {name: _dir_size(self.pool_dir / name) for name in workspaces}
+        total = sum(sizes.values())
+        reclaimed = 0
+
+        free = sorted((name for name, meta in workspaces.items() if self._is_free(meta, now)), key=lambda name: workspaces[name].get("last_used", 0))
+        for name in free:
+            idle = now - workspaces[name].get("last_used", 0) > self.max_idle_seconds
+            if not idle and total <= self.max_bytes:
+                continue
+            self._remove(name)
+            total -= sizes[name]
+            reclaimed += sizes[name]
+
+        if total > self.max_bytes:
+            msg = f"Workspace pool {self.pool_dir} is over quota ({total} > {self.max_bytes} bytes) with only leased workspaces left. Raise {MAX_BYTES_ENV} or lower worker concurrency."
+            raise RuntimeError(msg)
+        return reclaimed
+
+    def acquire(self, job_id: str, repository: str, ref: str) -> tuple[Path, bool]:
+        """Lease a workspace for job_id.
+
+        Reuses a free checkout of the same repository (same ref preferred) if
+        one exists, otherwise returns a fresh, not-yet-existing path to clone into.
+
+        Returns:
+            Tuple of (workspace path, whether an existing checkout was reused)
+        """
+        with self._locked():
+            now = time.time()
+            self._enforce_quota(now)
+
+            target = self.pool_dir / job_id
+            reused = target.exists()
+            if not reused:
+                candidates = [
+                    (meta.get("ref") == ref, meta.get("last_used", 0), name) for name, meta in self._workspaces().items() if meta.get("repository") == repository and self._is_free(meta, now)
+                ]
+                if candidates:
+                    _, _, name = max(candidates)
+                    (self.pool_dir / name).rename(target)
+                    self._meta_path(name).unlink(missing_ok=True)
+                    reused = True
+
+            self._write_meta(job_id, {"repository": repository, "ref": ref, "state": "in_use", "last_used": now})
+            return target, reused
+
+    def release(self, job_id: str) -> None:
+        """Return a workspace to the pool so later runs can reuse it."""
+        with self._locked():
+            meta = self._read_meta(job_id)
+            if meta is None:
+                return
+            meta.update(state="released", last_used=time.time())
+            self._write_meta(job_id, meta)
+
+
+@contextmanager
+def plugin_cache_lock(env: dict):
+    """Hold an exclusive lock on the provider plugin cache in env["TF_PLUGIN_CACHE_DIR"], if one is set.
+
+    Terraform does not guard the cache against concurrent writers, so inits
+    using it run one at a time per worker. flock on a file next to the cache
+    serializes jobs (processes) and threads alike, since each caller opens
+    its own descriptor. Not reentrant: do not nest.
+    """
+    cache_dir = env.get("TF_PLUGIN_CACHE_DIR")
+    if not cache_dir:
+        yield
+        return
+    with open(f"{cache_dir.rstrip('/')}.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def release_workspace(path: str) -> bool:
+    """Release the pooled workspace containing path (e.g. a module_dir).
+
+    No-op for paths outside a workspace pool, such as a fixed workspace_dir.
+
+    Returns:
+        True if a pooled workspace was released
+    """
+    resolved = Path(path).resolve()
+    for workspace in [resolved, *resolved.parents]:
+        if (workspace.parent / META_DIR / f"{workspace.name}.json").exists():
+            WorkspacePool(str(workspace.parent)).release(workspace.name)
+            return True
+    return False